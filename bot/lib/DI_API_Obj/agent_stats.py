@@ -35,6 +35,7 @@ class ItemSlot(StrEnum):
 
 class AgentTimelineStats:
     '''Wraps both lifetime and seasonal statistics for an agent, as well as their progression data.'''
+    __slots__ = ("agent_name", "playtime_seconds", "pick_count", "win_count", "weapon_pick_count", "passive_pick_count", "active_pick_count")
     agent_name: str
     playtime_seconds: Optional[int]
     pick_count: Optional[GamemodeCounter]
@@ -123,6 +124,7 @@ class AgentTimelineStats:
         return None
 
 class AgentStats:
+    __slots__ = ("agent_name", "mastery_level", "echelon_level", "lifetime_stats", "seasonal_stats")
     agent_name: str
     mastery_level: Optional[int]
     echelon_level: Optional[int]
@@ -4,6 +4,7 @@ from typing import Union, Dict, Optional
 
 
 class GadgetTimelineStats:
+    __slots__ = ("gadget_name", "pick_count")
     gadget_name: str
     pick_count: GamemodeCounter
 
@@ -25,6 +26,7 @@ class GadgetTimelineStats:
         return self.pick_count.get_gamemode(gamemode)
 
 class GadgetStats:
+    __slots__ = ("gadget_name", "lifetime_stats", "seasonal_stats")
     gadget_name: str
     lifetime_stats: Optional[GadgetTimelineStats]
     seasonal_stats: Optional[Dict[int, GadgetTimelineStats]]
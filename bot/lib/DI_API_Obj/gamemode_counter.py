@@ -2,6 +2,7 @@ from typing import Union
 from lib.DI_API_Obj.gamemode import GameMode
 
 class GamemodeCounter:
+    __slots__ = ("solo", "duo", "trio")
     solo: Union[int, None]
     duo: Union[int, None]
     trio: Union[int, None]
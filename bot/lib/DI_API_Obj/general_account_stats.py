@@ -1,6 +1,7 @@
 from lib.DI_API_Obj.gamemode_counter import GamemodeCounter
 
 class GeneralAccountStats:
+    __slots__ = ("eliminations", "deaths", "matches_played", "matches_won", "time_played")
     eliminations: GamemodeCounter
     deaths: GamemodeCounter
     matches_played: GamemodeCounter
@@ -1,6 +1,7 @@
-from typing import List, Union, Dict, Optional
+from typing import List, Union, Dict, Optional, Tuple, Any, Callable, Hashable
+from collections.abc import MutableMapping
 from enum import Enum
-import re, json, copy
+import re, json, zlib, functools, itertools
 from json import JSONDecodeError
 from lib.DI_API_Obj.account_progression import AccountProgression
 from lib.DI_API_Obj.account_statistics import AccountStats
@@ -12,10 +13,118 @@ from lib.DI_API_Obj.gamemode import GameMode
 from word2number import w2n
 from datetime import datetime, timezone
 
+compact_format_magic: bytes = b"SWU"
+compact_format_version: int = 1
+compact_compression_level: int = 6
+_item_slots = (ItemSlot.DEFAULT, ItemSlot.MOD1, ItemSlot.MOD2) # Fixed order of the slots in the compact format.
 
+# The compact format stores every object as a positional array instead of a dict with named keys, then zlib-compresses the JSON text.
+# Changing the layout of any of these arrays requires bumping compact_format_version and keeping a decoder for the old version.
+
+def _season_key(key: Union[int, str]) -> Union[int, str]:
+    '''Seasons are int keys, but rows written through `dump_json` come back with them as strings.'''
+    return int(key) if isinstance(key, str) and key.isdigit() else key
+
+def _pack_counter(counter: Optional[GamemodeCounter]) -> Optional[list]:
+    return None if counter is None else [counter.solo, counter.duo, counter.trio]
+
+def _unpack_counter(packed: Optional[list]) -> Optional[GamemodeCounter]:
+    return None if packed is None else GamemodeCounter(packed[0], packed[1], packed[2])
+
+def _pack_slots(slots: Optional[Dict[ItemSlot, GamemodeCounter]]) -> Optional[list]:
+    return None if slots is None else [_pack_counter(slots.get(slot)) for slot in _item_slots]
+
+def _unpack_slots(packed: Optional[list]) -> Optional[Dict[ItemSlot, GamemodeCounter]]:
+    return None if packed is None else {slot: _unpack_counter(counter) for slot, counter in zip(_item_slots, packed)}
+
+def _pack_agent_timeline(stats: Optional[AgentTimelineStats]) -> Optional[list]:
+    if stats is None:
+        return None
+    return [stats.playtime_seconds, _pack_counter(stats.pick_count), _pack_counter(stats.win_count), _pack_slots(stats.weapon_pick_count), _pack_slots(stats.passive_pick_count), _pack_slots(stats.active_pick_count)]
+
+def _unpack_agent_timeline(agent_name: str, packed: Optional[list]) -> Optional[AgentTimelineStats]:
+    if packed is None:
+        return None
+    return AgentTimelineStats(agent_name, packed[0], _unpack_counter(packed[1]), _unpack_counter(packed[2]), _unpack_slots(packed[3]), _unpack_slots(packed[4]), _unpack_slots(packed[5]))
+
+class _Packed:
+    '''Marks a value of a `_LazyStatsDict` that is still in its packed compact form.'''
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+class _LazyStatsDict(MutableMapping):
+    '''A dict of stats read from the compact format. Each value stays packed until it is first read, so commands that only need one agent or season don't pay for the rest.
+    Decoding is idempotent, so two threads reading the same key at once at worst decode it twice.'''
+    __slots__ = ("_items", "_decode")
+    _items: Dict[Hashable, Any]
+    _decode: Callable[[Hashable, Any], Any]
+
+    def __init__(self, packed: Dict[Hashable, Any], decode: Callable[[Hashable, Any], Any]):
+        self._items = {key: _Packed(value) for key, value in packed.items()}
+        self._decode = decode
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._items[key]
+        if type(value) is _Packed:
+            value = self._decode(key, value.value)
+            self._items[key] = value
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._items[key] = value
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: object) -> bool: # The default implementation would decode the value just to test membership.
+        return key in self._items
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+def _unpack_general_stats(season: Union[int, str], packed: list) -> GeneralAccountStats:
+    return GeneralAccountStats(*[_unpack_counter(counter) for counter in packed[1:]])
+
+def _unpack_agent_stats(agent_name: str, packed: list) -> AgentStats:
+    _, mastery_level, echelon_level, lifetime, seasonal = packed
+    return AgentStats(agent_name, mastery_level, echelon_level, _unpack_agent_timeline(agent_name, lifetime),
+                      _LazyStatsDict(dict(seasonal), lambda season, timeline: _unpack_agent_timeline(agent_name, timeline)))
+
+def _unpack_gadget_stats(gadget_name: str, packed: list) -> GadgetStats:
+    _, lifetime, seasonal = packed
+    gadget_stats = GadgetStats(gadget_name, GadgetTimelineStats(gadget_name, _unpack_counter(lifetime)) if lifetime is not None else None)
+    gadget_stats.seasonal_stats = _LazyStatsDict(dict(seasonal), lambda season, counter: GadgetTimelineStats(gadget_name, _unpack_counter(counter)))
+    return gadget_stats
+
+# Lookup tables for the API response parser. API stat keys are the stat name followed by the gamemode, e.g. "eliminationsSolo".
+_gamemode_suffixes = ("Solo", "Duo", "Trio")
+_general_stat_keys = tuple(tuple(f"{stat}{suffix}" for suffix in _gamemode_suffixes) for stat in ("eliminations", "deaths", "matchesPlayed", "matchesWon", "timePlayed")) # In GeneralAccountStats argument order.
+_per_item_stat_keys = {stat: tuple(f"{stat}{suffix}" for suffix in _gamemode_suffixes) for stat in ("agentPick", "agentWin", "weaponPick", "passivePick", "activePick", "gadgetPick")}
+_season_name_pattern = re.compile(r'season([A-Za-z]+)')
+_no_stats: dict = {} # Stands in for sections missing from the API response. Never written to.
+
+def _gamemode_tables(stats: dict, stat: str) -> Tuple[dict, dict, dict]:
+    '''Gets the solo, duo and trio tables of a per-item stat such as "agentPick", with missing tables left empty.'''
+    solo_key, duo_key, trio_key = _per_item_stat_keys[stat]
+    return stats.get(solo_key, _no_stats), stats.get(duo_key, _no_stats), stats.get(trio_key, _no_stats)
+
+def _counter_from_tables(tables: Tuple[dict, dict, dict], key: str) -> GamemodeCounter:
+    return GamemodeCounter(tables[0].get(key, 0), tables[1].get(key, 0), tables[2].get(key, 0))
+
+def _slot_counters(tables: Tuple[dict, dict, dict], slot_keys: List[str]) -> Dict[ItemSlot, GamemodeCounter]:
+    return {slot: _counter_from_tables(tables, key) for slot, key in zip(_item_slots, slot_keys)}
 
 class SweetUserPartial:
     '''Returned by search results. Contains only the Sweet ID and Display Name.'''
+    __slots__ = ("sweet_id", "display_name")
     sweet_id: str
     display_name: Optional[str]
 
@@ -30,6 +139,7 @@ class SweetUserPartial:
         return self.__str__()
 
 class SweetUser(SweetUserPartial):
+    __slots__ = ("not_a_skill_rank", "account_level", "general_stats", "agent_stats", "gadget_stats")
     sweet_id: str
     display_name: Optional[str]
     not_a_skill_rank: Optional[int]
@@ -55,110 +165,42 @@ class SweetUser(SweetUserPartial):
 
 
     @staticmethod
-    def _get_general_timeline_stats(response: dict, stat_key: str) -> GeneralAccountStats:
-        eliminations: GamemodeCounter = GamemodeCounter(response["stats"][stat_key]["eliminationsSolo"] if "stats" in response and stat_key in response["stats"] and "eliminationsSolo" in response["stats"][stat_key] else 0,
-                                                        response["stats"][stat_key]["eliminationsDuo"] if "stats" in response and stat_key in response["stats"] and "eliminationsDuo" in response["stats"][stat_key] else 0,
-                                                        response["stats"][stat_key]["eliminationsTrio"] if "stats" in response and stat_key in response["stats"] and "eliminationsTrio" in response["stats"][stat_key] else 0)
-        deaths: GamemodeCounter = GamemodeCounter(response["stats"][stat_key]["deathsSolo"] if "stats" in response and stat_key in response["stats"] and "deathsSolo" in response["stats"][stat_key] else 0,
-                                                  response["stats"][stat_key]["deathsDuo"] if "stats" in response and stat_key in response["stats"] and "deathsDuo" in response["stats"][stat_key] else 0,
-                                                  response["stats"][stat_key]["deathsTrio"] if "stats" in response and stat_key in response["stats"] and "deathsTrio" in response["stats"][stat_key] else 0)
-        matches_played: GamemodeCounter = GamemodeCounter(response["stats"][stat_key]["matchesPlayedSolo"] if "stats" in response and stat_key in response["stats"] and "matchesPlayedSolo" in response["stats"][stat_key] else 0,
-                                                          response["stats"][stat_key]["matchesPlayedDuo"] if "stats" in response and stat_key in response["stats"] and "matchesPlayedDuo" in response["stats"][stat_key] else 0,
-                                                          response["stats"][stat_key]["matchesPlayedTrio"] if "stats" in response and stat_key in response["stats"] and "matchesPlayedTrio" in response["stats"][stat_key] else 0)
-        matches_won: GamemodeCounter = GamemodeCounter(response["stats"][stat_key]["matchesWonSolo"] if "stats" in response and stat_key in response["stats"] and "matchesWonSolo" in response["stats"][stat_key] else 0,
-                                                       response["stats"][stat_key]["matchesWonDuo"] if "stats" in response and stat_key in response["stats"] and "matchesWonDuo" in response["stats"][stat_key] else 0,
-                                                       response["stats"][stat_key]["matchesWonTrio"] if "stats" in response and stat_key in response["stats"] and "matchesWonTrio" in response["stats"][stat_key] else 0)
-        time_played: GamemodeCounter = GamemodeCounter(response["stats"][stat_key]["timePlayedSolo"] if "stats" in response and stat_key in response["stats"] and "timePlayedSolo" in response["stats"][stat_key] else 0,
-                                                       response["stats"][stat_key]["timePlayedDuo"] if "stats" in response and stat_key in response["stats"] and "timePlayedDuo" in response["stats"][stat_key] else 0,
-                                                       response["stats"][stat_key]["timePlayedTrio"] if "stats" in response and stat_key in response["stats"] and "timePlayedTrio" in response["stats"][stat_key] else 0)
-        return GeneralAccountStats(eliminations, deaths, matches_played, matches_won, time_played)
+    def _get_general_timeline_stats(stats: dict) -> GeneralAccountStats:
+        return GeneralAccountStats(*[GamemodeCounter(stats.get(solo_key, 0), stats.get(duo_key, 0), stats.get(trio_key, 0)) for solo_key, duo_key, trio_key in _general_stat_keys])
 
     @staticmethod
-    def _get_agent_timeline_stats(response: dict, stat_key: str) -> Dict[str, AgentTimelineStats]:
+    def _get_agent_timeline_stats(stats: dict) -> Dict[str, AgentTimelineStats]:
+        pick_tables = _gamemode_tables(stats, "agentPick")
+        win_tables = _gamemode_tables(stats, "agentWin")
+        weapon_tables = _gamemode_tables(stats, "weaponPick")
+        passive_tables = _gamemode_tables(stats, "passivePick")
+        active_tables = _gamemode_tables(stats, "activePick")
         agent_stats = {}
-        agent_keys = response["stats"][stat_key]["agentPlayTime"].keys() if "stats" in response and stat_key in response["stats"] and "agentPlayTime" in response["stats"][stat_key] else []
-        for agent_key in agent_keys:
+        for agent_key, playtime_seconds in stats.get("agentPlayTime", _no_stats).items():
             if agent_key == "None":
                 continue
-            agent_stats[agent_key] = {} # Create empty dict for every agent
-            agent_stats[agent_key]["playtime_seconds"] = response["stats"][stat_key]["agentPlayTime"][agent_key] if "stats" in response and stat_key in response["stats"] and "agentPlayTime" in response["stats"][stat_key] and agent_key in response["stats"][stat_key]["agentPlayTime"] else 0
-            agent_stats[agent_key]["pick_count"] = GamemodeCounter(response["stats"][stat_key]["agentPickSolo"][agent_key] if "stats" in response and stat_key in response["stats"] and "agentPickSolo" in response["stats"][stat_key] and agent_key in response["stats"][stat_key]["agentPickSolo"] else 0,
-                                                                   response["stats"][stat_key]["agentPickDuo"][agent_key] if "stats" in response and stat_key in response["stats"] and "agentPickDuo" in response["stats"][stat_key] and agent_key in response["stats"][stat_key]["agentPickDuo"] else 0,
-                                                                   response["stats"][stat_key]["agentPickTrio"][agent_key] if "stats" in response and stat_key in response["stats"] and "agentPickTrio" in response["stats"][stat_key] and agent_key in response["stats"][stat_key]["agentPickTrio"] else 0)
-            agent_stats[agent_key]["win_count"] = GamemodeCounter(response["stats"][stat_key]["agentWinSolo"][agent_key] if "stats" in response and stat_key in response["stats"] and "agentWinSolo" in response["stats"][stat_key] and agent_key in response["stats"][stat_key]["agentWinSolo"] else 0,
-                                                                  response["stats"][stat_key]["agentWinDuo"][agent_key] if "stats" in response and stat_key in response["stats"] and "agentWinDuo" in response["stats"][stat_key] and agent_key in response["stats"][stat_key]["agentWinDuo"] else 0,
-                                                                  response["stats"][stat_key]["agentWinTrio"][agent_key] if "stats" in response and stat_key in response["stats"] and "agentWinTrio" in response["stats"][stat_key] and agent_key in response["stats"][stat_key]["agentWinTrio"] else 0)
-            agent_default_key = f"{agent_key}_Default"
-            agent_mod1_key = f"{agent_key}_Mod1"
-            agent_mod2_key = f"{agent_key}_Mod2"
-            agent_stats[agent_key]["weapon_pick_count"] = {}
-            agent_stats[agent_key]["weapon_pick_count"][ItemSlot.DEFAULT] = GamemodeCounter(response["stats"][stat_key]["weaponPickSolo"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "weaponPickSolo" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["weaponPickSolo"] else 0,
-                                                                                     response["stats"][stat_key]["weaponPickDuo"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "weaponPickDuo" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["weaponPickDuo"] else 0,
-                                                                                     response["stats"][stat_key]["weaponPickTrio"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "weaponPickTrio" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["weaponPickTrio"] else 0)
-            agent_stats[agent_key]["weapon_pick_count"][ItemSlot.MOD1] = GamemodeCounter(response["stats"][stat_key]["weaponPickSolo"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "weaponPickSolo" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["weaponPickSolo"] else 0,
-                                                                                  response["stats"][stat_key]["weaponPickDuo"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "weaponPickDuo" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["weaponPickDuo"] else 0,
-                                                                                  response["stats"][stat_key]["weaponPickTrio"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "weaponPickTrio" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["weaponPickTrio"] else 0)
-            agent_stats[agent_key]["weapon_pick_count"][ItemSlot.MOD2] = GamemodeCounter(response["stats"][stat_key]["weaponPickSolo"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "weaponPickSolo" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["weaponPickSolo"] else 0,
-                                                                                  response["stats"][stat_key]["weaponPickDuo"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "weaponPickDuo" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["weaponPickDuo"] else 0,
-                                                                                  response["stats"][stat_key]["weaponPickTrio"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "weaponPickTrio" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["weaponPickTrio"] else 0)
-            agent_stats[agent_key]["passive_pick_count"] = {}
-            agent_stats[agent_key]["passive_pick_count"][ItemSlot.DEFAULT] = GamemodeCounter(response["stats"][stat_key]["passivePickSolo"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "passivePickSolo" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["passivePickSolo"] else 0,
-                                                                                      response["stats"][stat_key]["passivePickDuo"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "passivePickDuo" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["passivePickDuo"] else 0,
-                                                                                      response["stats"][stat_key]["passivePickTrio"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "passivePickTrio" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["passivePickTrio"] else 0)
-            agent_stats[agent_key]["passive_pick_count"][ItemSlot.MOD1] = GamemodeCounter(response["stats"][stat_key]["passivePickSolo"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "passivePickSolo" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["passivePickSolo"] else 0,
-                                                                                   response["stats"][stat_key]["passivePickDuo"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "passivePickDuo" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["passivePickDuo"] else 0,
-                                                                                   response["stats"][stat_key]["passivePickTrio"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "passivePickTrio" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["passivePickTrio"] else 0)
-            agent_stats[agent_key]["passive_pick_count"][ItemSlot.MOD2] = GamemodeCounter(response["stats"][stat_key]["passivePickSolo"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "passivePickSolo" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["passivePickSolo"] else 0,
-                                                                                   response["stats"][stat_key]["passivePickDuo"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "passivePickDuo" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["passivePickDuo"] else 0,
-                                                                                   response["stats"][stat_key]["passivePickTrio"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "passivePickTrio" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["passivePickTrio"] else 0)
-            agent_stats[agent_key]["active_pick_count"] = {}
-            agent_stats[agent_key]["active_pick_count"][ItemSlot.DEFAULT] = GamemodeCounter(response["stats"][stat_key]["activePickSolo"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "activePickSolo" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["activePickSolo"] else 0,
-                                                                                     response["stats"][stat_key]["activePickDuo"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "activePickDuo" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["activePickDuo"] else 0,
-                                                                                     response["stats"][stat_key]["activePickTrio"][agent_default_key] if "stats" in response and stat_key in response["stats"] and "activePickTrio" in response["stats"][stat_key] and agent_default_key in response["stats"][stat_key]["activePickTrio"] else 0)
-            agent_stats[agent_key]["active_pick_count"][ItemSlot.MOD1] = GamemodeCounter(response["stats"][stat_key]["activePickSolo"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "activePickSolo" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["activePickSolo"] else 0,
-                                                                                  response["stats"][stat_key]["activePickDuo"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "activePickDuo" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["activePickDuo"] else 0,
-                                                                                  response["stats"][stat_key]["activePickTrio"][agent_mod1_key] if "stats" in response and stat_key in response["stats"] and "activePickTrio" in response["stats"][stat_key] and agent_mod1_key in response["stats"][stat_key]["activePickTrio"] else 0)
-            agent_stats[agent_key]["active_pick_count"][ItemSlot.MOD2] = GamemodeCounter(response["stats"][stat_key]["activePickSolo"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "activePickSolo" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["activePickSolo"] else 0,
-                                                                                  response["stats"][stat_key]["activePickDuo"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "activePickDuo" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["activePickDuo"] else 0,
-                                                                                  response["stats"][stat_key]["activePickTrio"][agent_mod2_key] if "stats" in response and stat_key in response["stats"] and "activePickTrio" in response["stats"][stat_key] and agent_mod2_key in response["stats"][stat_key]["activePickTrio"] else 0)
+            slot_keys = [f"{agent_key}_{slot}" for slot in _item_slots] # Items follow the pattern of "<agent_name>_<item_slot>"
             agent_stats[agent_key] = AgentTimelineStats(agent_key,
-                                     agent_stats[agent_key]["playtime_seconds"],
-                                     agent_stats[agent_key]["pick_count"],
-                                     agent_stats[agent_key]["win_count"],
-                                     agent_stats[agent_key]["weapon_pick_count"],
-                                     agent_stats[agent_key]["passive_pick_count"],
-                                     agent_stats[agent_key]["active_pick_count"])
+                                                        playtime_seconds,
+                                                        _counter_from_tables(pick_tables, agent_key),
+                                                        _counter_from_tables(win_tables, agent_key),
+                                                        _slot_counters(weapon_tables, slot_keys),
+                                                        _slot_counters(passive_tables, slot_keys),
+                                                        _slot_counters(active_tables, slot_keys))
         return agent_stats
         
     @staticmethod
-    def _get_gadget_stats(response: dict, stat_key: str) -> Dict[str, GadgetTimelineStats]:
-        gadget_keys_solo: Union[List[str], None] = response["stats"][stat_key]["gadgetPickSolo"].keys() if "stats" in response and stat_key in response["stats"] and "gadgetPickSolo" in response["stats"][stat_key] else None
-        gadget_keys_duo: Union[List[str], None] = response["stats"][stat_key]["gadgetPickDuo"].keys() if "stats" in response and stat_key in response["stats"] and "gadgetPickDuo" in response["stats"][stat_key] else None
-        gadget_keys_trio: Union[List[str], None] = response["stats"][stat_key]["gadgetPickTrio"].keys() if "stats" in response and stat_key in response["stats"] and "gadgetPickTrio" in response["stats"][stat_key] else None
-        
-        # Make a union of all the keys
-        gadget_keys = []
-        if gadget_keys_solo is not None:
-            gadget_keys += gadget_keys_solo
-        if gadget_keys_duo is not None:
-            gadget_keys += gadget_keys_duo
-        if gadget_keys_trio is not None:
-            gadget_keys += gadget_keys_trio
-        gadget_keys = list(set(gadget_keys)) # Remove duplicates
-        gadget_stats = {}
-        for gadget_key in gadget_keys:
-            gadget_stats[gadget_key] = GadgetTimelineStats(gadget_key,
-                                                   GamemodeCounter(response["stats"][stat_key]["gadgetPickSolo"][gadget_key] if "stats" in response and stat_key in response["stats"] and "gadgetPickSolo" in response["stats"][stat_key] and gadget_key in response["stats"][stat_key]["gadgetPickSolo"] else 0,
-                                                                   response["stats"][stat_key]["gadgetPickDuo"][gadget_key] if "stats" in response and stat_key in response["stats"] and "gadgetPickDuo" in response["stats"][stat_key] and gadget_key in response["stats"][stat_key]["gadgetPickDuo"] else 0,
-                                                                   response["stats"][stat_key]["gadgetPickTrio"][gadget_key] if "stats" in response and stat_key in response["stats"] and "gadgetPickTrio" in response["stats"][stat_key] and gadget_key in response["stats"][stat_key]["gadgetPickTrio"] else 0))
-        return gadget_stats
+    def _get_gadget_stats(stats: dict) -> Dict[str, GadgetTimelineStats]:
+        pick_tables = _gamemode_tables(stats, "gadgetPick")
+        gadget_keys = dict.fromkeys(itertools.chain(*pick_tables)) # Union of the keys of every gamemode, without duplicates
+        return {gadget_key: GadgetTimelineStats(gadget_key, _counter_from_tables(pick_tables, gadget_key)) for gadget_key in gadget_keys}
 
     @staticmethod
+    @functools.lru_cache(maxsize=64)
     def _determine_season_number(season: str) -> Optional[int]:
-        '''Determines the season number from the season name.'''
-        season_search = re.compile(r'season([A-Za-z]+)')
+        '''Determines the season number from the season name. Memoised, since every profile repeats the same few names.'''
         season_number = None
-        season_num = season_search.match(season)
+        season_num = _season_name_pattern.match(season)
         if season_num is not None:
             season_number = w2n.word_to_num(season_num.group(1).lower())
         return int(season_number) if season_number is not None else None
@@ -170,52 +212,45 @@ class SweetUser(SweetUserPartial):
             return None
         
         # Basic information
-        display_name: Optional[str] = str(response["displayName"]) if "displayName" in response else None
+        display_name: Optional[str] = str(response["displayName"])
         not_a_skill_rank = int(response["notASkillRank"]) if "notASkillRank" in response else None
         
         # Account progression
-        account_level = response["progression"]["Account"]["level"] if "progression" in response and "Account" in response["progression"] and "level" in response["progression"]["Account"] else None
-        agent_stats: dict = {}
-        for key in response["progression"].keys():
-            if key == "Account":
-                continue
-            agent_stats[key] = AgentStats(key,
-                                          response["progression"][key]["mastery"] if "mastery" in response["progression"][key] else None,
-                                          response["progression"][key]["echelon"] if "echelon" in response["progression"][key] else None,
-                                          None, {})
-
-        general_lifetime_account_stats: GeneralAccountStats = SweetUser._get_general_timeline_stats(response, "lifetime")
-        agent_lifetime_stats: Dict[str, AgentTimelineStats] = SweetUser._get_agent_timeline_stats(response, "lifetime")
-        for i in agent_lifetime_stats.items(): # Agent lifetime stats
-            if i[0] not in agent_stats:
-                agent_stats[i[0]] = AgentStats(i[0], 0, 0, i[1], None)
+        progression: dict = response.get("progression", _no_stats)
+        account_level = progression.get("Account", _no_stats).get("level")
+        agent_stats: dict = {key: AgentStats(key, agent_progression.get("mastery"), agent_progression.get("echelon"), None, {})
+                             for key, agent_progression in progression.items() if key != "Account"}
+
+        # Lifetime stats
+        all_stats: dict = response.get("stats", _no_stats)
+        lifetime_stats: dict = all_stats.get("lifetime", _no_stats)
+        general_season_account_stats: Dict[Union[int, str], GeneralAccountStats] = {"lifetime": SweetUser._get_general_timeline_stats(lifetime_stats)}
+        for key, agent_lifetime_stats in SweetUser._get_agent_timeline_stats(lifetime_stats).items():
+            if key not in agent_stats:
+                agent_stats[key] = AgentStats(key, 0, 0, agent_lifetime_stats, None)
                 continue
-            agent_stats[i[0]].lifetime_stats = i[1]
-        gadget_stats: dict = {}
-        gadget_lifetime_stats: Dict[str, GadgetTimelineStats] = SweetUser._get_gadget_stats(response, "lifetime")
-        for key in gadget_lifetime_stats.keys():
-            gadget_stats[key] = GadgetStats(key, gadget_lifetime_stats[key])
-        general_season_account_stats: Dict[Union[int, str], GeneralAccountStats] = {"lifetime": general_lifetime_account_stats}
-        for season in response["stats"]:
+            agent_stats[key].lifetime_stats = agent_lifetime_stats
+        gadget_stats: dict = {key: GadgetStats(key, gadget_lifetime_stats) for key, gadget_lifetime_stats in SweetUser._get_gadget_stats(lifetime_stats).items()}
+
+        # Seasonal stats. Every season builds its own stat objects, so they can be stored without copying.
+        for season, season_stats in all_stats.items():
             if season == "lifetime":
                 continue
             season_number: Union[int, None] = SweetUser._determine_season_number(season)
             if season_number is None:
                 continue
-            general_seasonal_account_stats = SweetUser._get_general_timeline_stats(response, season)
-            general_season_account_stats[season_number] = general_seasonal_account_stats
-            agent_seasonal_stats: Dict[str, AgentTimelineStats] = SweetUser._get_agent_timeline_stats(response, season)
-            gadget_seasonal_stats: Dict[str, GadgetTimelineStats] = SweetUser._get_gadget_stats(response, season)
-            for key in agent_seasonal_stats.keys():
-                # if key not in agent_stats:
-                #     agent_stats[key] = AgentStats(key, 0, 0, None, {season_number: agent_seasonal_stats[key]})
-                #     continue
-                agent_stats[key].seasonal_stats[season_number] = copy.deepcopy(agent_seasonal_stats[key])
-            for key in gadget_seasonal_stats.keys():
+            general_season_account_stats[season_number] = SweetUser._get_general_timeline_stats(season_stats)
+            for key, agent_seasonal_stats in SweetUser._get_agent_timeline_stats(season_stats).items():
+                if key not in agent_stats:
+                    agent_stats[key] = AgentStats(key, 0, 0, None, {})
+                elif agent_stats[key].seasonal_stats is None:
+                    agent_stats[key].seasonal_stats = {}
+                agent_stats[key].seasonal_stats[season_number] = agent_seasonal_stats
+            for key, gadget_seasonal_stats in SweetUser._get_gadget_stats(season_stats).items():
                 if key not in gadget_stats:
-                    gadget_stats[key] = GadgetStats(key, None, {season_number: gadget_seasonal_stats[key]})
+                    gadget_stats[key] = GadgetStats(key, None, {season_number: gadget_seasonal_stats})
                     continue
-                gadget_stats[key].seasonal_stats[season_number] = gadget_seasonal_stats[key]
+                gadget_stats[key].seasonal_stats[season_number] = gadget_seasonal_stats
         
         return SweetUser(sweet_id,
                          display_name,
@@ -392,6 +427,38 @@ class SweetUser(SweetUserPartial):
         out_dict["data_creation_time"] = datetime.now(tz=timezone.utc).isoformat()
         return json.dumps(out_dict)
     
+    def dump_compact(self) -> bytes:
+        '''Dumps the SweetUser object to the compact storage format: a magic number and format version, followed by the zlib-compressed profile.'''
+        general_stats = [[_season_key(season), _pack_counter(stats.eliminations), _pack_counter(stats.deaths), _pack_counter(stats.matches_played), _pack_counter(stats.matches_won), _pack_counter(stats.time_played)]
+                         for season, stats in self.general_stats.items()]
+        agent_stats = [[name, stats.mastery_level, stats.echelon_level, _pack_agent_timeline(stats.lifetime_stats),
+                        [[_season_key(season), _pack_agent_timeline(seasonal)] for season, seasonal in (stats.seasonal_stats or {}).items()]]
+                       for name, stats in self.agent_stats.items()]
+        gadget_stats = [[name, _pack_counter(stats.lifetime_stats.pick_count) if stats.lifetime_stats is not None else None,
+                         [[_season_key(season), _pack_counter(seasonal.pick_count)] for season, seasonal in (stats.seasonal_stats or {}).items()]]
+                        for name, stats in self.gadget_stats.items()]
+        payload = [self.sweet_id, self.display_name, self.not_a_skill_rank, self.account_level, general_stats, agent_stats, gadget_stats]
+        return compact_format_magic + bytes([compact_format_version]) + zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), compact_compression_level)
+
+    @staticmethod
+    def from_compact(data: bytes) -> 'SweetUser':
+        '''Constructs a SweetUser object from the compact storage format written by `dump_compact`.
+        Only the header and the top level of the profile are read here. Each season of `general_stats`, each agent and gadget, and each of their seasons are built the first time they are accessed.'''
+        header_length = len(compact_format_magic) + 1
+        if len(data) < header_length or data[:len(compact_format_magic)] != compact_format_magic:
+            raise ValueError("Could not create SweetUser from compact data: not in the compact format.")
+        version = data[len(compact_format_magic)]
+        if version != compact_format_version:
+            raise ValueError(f"Could not create SweetUser from compact data: unsupported format version {version}.")
+        try:
+            sweet_id, display_name, not_a_skill_rank, account_level, packed_general, packed_agents, packed_gadgets = json.loads(zlib.decompress(data[header_length:]))
+            general_stats = _LazyStatsDict({packed[0]: packed for packed in packed_general}, _unpack_general_stats)
+            agent_stats = _LazyStatsDict({packed[0]: packed for packed in packed_agents}, _unpack_agent_stats)
+            gadget_stats = _LazyStatsDict({packed[0]: packed for packed in packed_gadgets}, _unpack_gadget_stats)
+        except (zlib.error, JSONDecodeError, ValueError, TypeError, IndexError) as e:
+            raise ValueError(f"Could not create SweetUser from compact data: {e}")
+        return SweetUser(sweet_id, display_name, not_a_skill_rank, account_level, general_stats, agent_stats, gadget_stats)
+
     @staticmethod
     def from_json(json_str: Union[dict, str]) -> 'SweetUser':
         try:
@@ -1,4 +1,4 @@
-import argparse
+import argparse, multiprocessing
 from enum import StrEnum
 
 class ScrimArgs:
@@ -6,15 +6,43 @@ class ScrimArgs:
     log_level: str = None
     disable_reader: bool = None
     num_reader_threads: int = None
+    min_reader_threads: int = None
+    reader_idle_seconds: int = None
+    reader_target_wait_seconds: int = None
+    reader_queue_size: int = None
+    reader_queue_per_guild: int = None
     reader_cpu_only: bool = None
+    db_pool_size: int = None
+    db_journal_mode: str = None
+    reader_start_method: str = None
+    reader_batch_size: int = None
+    reader_batch_wait_ms: int = None
+    disable_reader_dedup: bool = None
+    reader_dedup_max_distance: int = None
+    disable_reader_results: bool = None
+    reader_results_flush_seconds: int = None
 
     @staticmethod
     def parse_args() -> argparse.Namespace:
         parser = argparse.ArgumentParser(description="ScrimBot")
         parser.add_argument("--log-level", type=str, default="INFO", help="The logging level to use. Options are: DEBUG, INFO, WARNING, ERROR, CRITICAL.")
         parser.add_argument("--disable-reader", action="store_true", help="Disables OCR reader functionality. Useful for systems that can not run the reader.")
-        parser.add_argument("--num-reader-threads", type=int, default=8, help="The number of OCR reader threads to use for reading images. Lower this if performance is poor.")
+        parser.add_argument("--num-reader-threads", type=int, default=8, help="The most OCR reader processes to run at once. The pool grows towards this when screenshots queue up. Lower this if performance is poor.")
+        parser.add_argument("--min-reader-threads", type=int, default=1, help="The number of OCR reader processes kept running when there is nothing to read. 0 frees every model while idle, at the cost of a slow first read.")
+        parser.add_argument("--reader-idle-seconds", type=int, default=300, help="How long an OCR reader process above the minimum may sit idle before it is stopped to free its memory.")
+        parser.add_argument("--reader-target-wait-seconds", type=int, default=15, help="More OCR reader processes are started when the queued screenshots would take longer than this to read.")
         parser.add_argument("--reader-cpu-only", action="store_true", help="Disables the use of the GPU for OCR reading. Useful for systems that can not run the reader.")
+        parser.add_argument("--reader-start-method", type=str, default="forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn", choices=["spawn", "forkserver", "fork"], help="How OCR reader processes are started. forkserver (the default where available) loads the model once and shares it between CPU readers; spawn loads one copy per reader; fork is unsafe once a GPU has been initialised.")
+        parser.add_argument("--reader-queue-size", type=int, default=50, help="The most screenshots waiting to be read at once. Screenshots beyond this are turned away with a message instead of being held in memory.")
+        parser.add_argument("--reader-queue-per-guild", type=int, default=20, help="The most screenshots one server may have waiting to be read at once, so one server can't fill the whole queue.")
+        parser.add_argument("--reader-batch-size", type=int, default=4, help="The most screenshots one OCR reader process reads in a single batched call. 1 disables batching.")
+        parser.add_argument("--reader-batch-wait-ms", type=int, default=50, help="How long an OCR reader process waits for more screenshots to fill a batch before reading what it has.")
+        parser.add_argument("--disable-reader-dedup", action="store_true", help="Reads every screenshot, even ones that have been read before.")
+        parser.add_argument("--reader-dedup-max-distance", type=int, default=-1, help="How many bits (out of 64) a screenshot's perceptual hash may differ from a cached one and still reuse its score. -1 only reuses scores for identical images. Scoreboards that differ by one digit can be 0-2 bits apart, so anything but -1 risks wrong scores.")
+        parser.add_argument("--disable-reader-results", action="store_true", help="Stops saving read scores and their screenshots to the database.")
+        parser.add_argument("--reader-results-flush-seconds", type=int, default=5, help="How often read scores are written to the database, in one transaction per write.")
+        parser.add_argument("--db-pool-size", type=int, default=8, help="The maximum number of pooled read connections to the database.")
+        parser.add_argument("--db-journal-mode", type=str, default="WAL", choices=["WAL", "DELETE"], help="The SQLite journal mode. WAL lets reads run alongside writes; DELETE is the SQLite default.")
         return parser.parse_args()
     
     def __init__(self):
@@ -22,4 +50,18 @@ class ScrimArgs:
         self.log_level = self._args.log_level
         self.disable_reader = self._args.disable_reader
         self.num_reader_threads = self._args.num_reader_threads
-        self.reader_cpu_only = self._args.reader_cpu_only
\ No newline at end of file
+        self.min_reader_threads = self._args.min_reader_threads
+        self.reader_idle_seconds = max(0, self._args.reader_idle_seconds)
+        self.reader_target_wait_seconds = max(1, self._args.reader_target_wait_seconds)
+        self.reader_queue_size = max(1, self._args.reader_queue_size)
+        self.reader_queue_per_guild = max(1, self._args.reader_queue_per_guild)
+        self.reader_cpu_only = self._args.reader_cpu_only
+        self.db_pool_size = self._args.db_pool_size
+        self.db_journal_mode = self._args.db_journal_mode
+        self.reader_start_method = self._args.reader_start_method
+        self.reader_batch_size = max(1, self._args.reader_batch_size)
+        self.reader_batch_wait_ms = max(0, self._args.reader_batch_wait_ms)
+        self.disable_reader_dedup = self._args.disable_reader_dedup
+        self.reader_dedup_max_distance = self._args.reader_dedup_max_distance
+        self.disable_reader_results = self._args.disable_reader_results
+        self.reader_results_flush_seconds = max(1, self._args.reader_results_flush_seconds)
\ No newline at end of file
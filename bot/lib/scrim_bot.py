@@ -0,0 +1,69 @@
+import os, sys, random
+import discord, asyncio, logging
+from typing import Optional
+from discord.ext import commands
+from PIL import Image
+from datetime import datetime, timedelta, timezone
+from discord.commands import Option
+import lib.scrim_reader as scrim_reader
+import lib.scrim_sysinfo as scrim_sysinfo
+import lib.scrim_di_api as scrim_di_api
+from lib.scrim_sqlite import ScrimUserData, open_scrim_db
+from lib.obj.scrim_user import ScrimUser
+from lib.scrim_logging import scrim_logger
+from lib.scrim_playerstats import ScrimPieCharts, ScrimPlots
+from lib.obj.scrim_format import ScrimFormat
+from lib.scrim_userupdatelistener import ScrimUserUpdateListener
+from lib.scrim_teammanagement import ScrimTeamManager
+from lib.obj.scrim_matchgroups import ScrimMatchGroups
+from lib.scrim_matchmaking import ScrimMatchmaking
+from lib.scrim_args import ScrimArgs
+from lib.obj.scrim_user import ScrimUser
+from lib.scrim_mmr_calculation import ScrimMMR
+from lib.scrim_debugcommands import ScrimDebugCommands
+from lib.scrim_metrics import event_loop_lag_monitor
+from lib.scrim_sqlite_async import AsyncSweetUserCache, start_db_executor
+from lib.scrim_statsstore import scrim_stats_store
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+scrims_version: str = "1.0.6"
+
+intents = discord.Intents.all()
+
+bot = commands.Bot(command_prefix="$", intents=intents)
+args = ScrimArgs()
+
+@bot.event
+async def on_ready():
+    scrim_logger.info(f'Logged in as {bot.user} (ID: {bot.user.id})') #type: ignore
+    event_loop_lag_monitor.start()
+    if scrim_stats_store.get_stats()["players"] == 0: # on_ready fires again on reconnect, the store is kept current by the cache after the first load.
+        await AsyncSweetUserCache.load_stats_store()
+    api = await scrim_di_api.DeceiveIncAPIClient.initialize(os.getenv("DI_CLIENT_ID"), os.getenv("DI_CLIENT_SECRET")) #type: ignore
+    # im = ScrimPlots.calculate_agent_pickrates_over_seasons(sw)
+    # im.save("test.png")
+
+def run_bot() -> None:
+    '''Adds the cogs and runs the bot until it is stopped. Called by main.py.'''
+    scrim_logger.info(f"Starting Scrim Helper v{scrims_version}")
+    open_scrim_db(journal_mode=args.db_journal_mode, pool_size=args.db_pool_size)
+    start_db_executor(args.db_pool_size)
+    # Initialize the ScrimReader cog
+    if not args.disable_reader:
+        if scrim_sysinfo.cpu_is_x86() and not scrim_sysinfo.cpu_supports_avx2():
+            scrim_logger.warning("You are using an x86_64 CPU does not support AVX2 instructions, which are required for EasyOCR. OCR Readers will not work.")
+        else:
+            scrim_logger.info("Initializing Reader modules, this may take several minutes...")
+            scrim_logger.debug("Initializing ScrimReader Cog...")
+            bot.add_cog(scrim_reader.ScrimReader(bot))
+    scrim_logger.info("Initializing User Update Listeners...")
+    bot.add_cog(ScrimUserUpdateListener(bot))
+    scrim_logger.info("Initializing Team Management Cog...")
+    bot.add_cog(ScrimTeamManager(bot))
+    scrim_logger.info("Initializing Scrim Debug Commands...")
+    bot.add_cog(ScrimDebugCommands(bot))
+
+    scrim_logger.debug("Starting bot...")
+    bot.run(os.getenv('DISCORD_BOT_TOKEN')) # Get the token from the .env file
@@ -0,0 +1,104 @@
+import threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Union
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+class CacheEntry:
+    value: Any
+    size_bytes: int
+    expires_at: float # time.monotonic() timestamp
+
+    def __init__(self, value: Any, size_bytes: int, expires_at: float):
+        self.value = value
+        self.size_bytes = size_bytes
+        self.expires_at = expires_at
+
+class ScrimLRUCache:
+    '''A thread-safe, in-process LRU cache bounded both by entry count and by an approximate byte budget. Every entry carries its own expiry.'''
+    max_entries: int
+    max_bytes: int
+    ttl_seconds: float
+    _entries: "OrderedDict[Hashable, CacheEntry]"
+    _lock: threading.Lock
+    _total_bytes: int
+    _stats: Dict[str, int]
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size_bytes
+
+    def get(self, key: Hashable) -> Union[Any, None]:
+        '''Gets a value from the cache, or `None` if it is missing or has expired.'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def put(self, key: Hashable, value: Any, size_bytes: int, ttl_seconds: Union[float, None] = None, replace_if: Union[Callable[[Any], bool], None] = None) -> None:
+        '''Adds a value to the cache, evicting the least recently used entries until it fits.
+        ### Parameters
+        * `key` - The key to store the value under.
+        * `value` - The value to store.
+        * `size_bytes` - The approximate size of the value, counted against `max_bytes`.
+        * `ttl_seconds` - How long the value stays valid. Defaults to the cache's TTL. Values that are already expired are not stored.
+        * `replace_if` - Called with the value already stored under `key`, if there is one that hasn't expired. The new value is only stored if this returns True.
+        It runs under the cache's lock, so no other value can be stored between the check and the put.'''
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and replace_if is not None and entry.expires_at > time.monotonic() and not replace_if(entry.value):
+                return
+            if ttl_seconds <= 0 or size_bytes > self.max_bytes:
+                if entry is not None:
+                    self._remove(key)
+                    self._stats["invalidations"] += 1
+                return
+            if entry is not None:
+                self._remove(key)
+            self._entries[key] = CacheEntry(value, size_bytes, time.monotonic() + ttl_seconds)
+            self._total_bytes += size_bytes
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        '''Removes a value from the cache if it is present.'''
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        '''Returns the cache's counters along with its current size and hit rate.'''
+        with self._lock:
+            out: Dict[str, Union[int, float]] = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["bytes"] = self._total_bytes
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups > 0 else 0.0
+        return out
@@ -0,0 +1,237 @@
+import sqlean, threading, time, queue, os
+from contextlib import contextmanager, closing
+from typing import Iterator, Optional, Dict, Union
+from lib.scrim_logging import scrim_logger
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+class ScrimConnectionPoolClosedError(Exception):
+    def __init__(self):
+        super().__init__("The database connection pool has been closed.")
+
+class ScrimConnectionPoolTimeoutError(Exception):
+    def __init__(self, timeout_seconds: float):
+        super().__init__(f"Timed out after {timeout_seconds} seconds waiting for a free database connection.")
+
+class PooledConnection:
+    '''A long-lived SQLite connection owned by the pool.'''
+    connection: sqlean.Connection
+    read_only: bool
+    last_health_check: float
+
+    def __init__(self, connection: sqlean.Connection, read_only: bool):
+        self.connection = connection
+        self.read_only = read_only
+        self.last_health_check = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.connection.close()
+        except sqlean.Error as e:
+            scrim_logger.warning(f"Failed to close pooled database connection: {e}")
+
+class ScrimConnectionPool:
+    '''Keeps a bounded set of long-lived reader connections and a single dedicated writer connection.
+
+    Reader connections are checked out for the length of a read and returned afterwards, so reads never pay connection setup and never wait on the writer lock.
+    Writes go through one connection guarded by a re-entrant lock. A decorated function that calls another decorated function on the same thread joins the
+    outer transaction instead of opening a new one.'''
+    db_path: str
+    max_readers: int
+    health_check_interval_seconds: float
+    acquire_timeout_seconds: float
+    busy_timeout_seconds: float
+    pragmas: Dict[str, Union[str, int]]
+
+    _idle_readers: queue.LifoQueue
+    _reader_count: int
+    _writer: Optional[PooledConnection]
+    _writer_lock: threading.RLock
+    _state_lock: threading.Lock
+    _local: threading.local
+    _closed: bool
+    _stats: Dict[str, int]
+
+    def __init__(self,
+                 db_path: str,
+                 max_readers: int = 8,
+                 health_check_interval_seconds: float = 60.0,
+                 acquire_timeout_seconds: float = 30.0,
+                 busy_timeout_seconds: float = 30.0,
+                 pragmas: Optional[Dict[str, Union[str, int]]] = None):
+        if max_readers < 1:
+            raise ValueError("A connection pool needs at least one reader connection.")
+        self.db_path = os.path.abspath(db_path) # Resolve now so a later chdir can't point the pool at another file.
+        self.max_readers = max_readers
+        self.health_check_interval_seconds = health_check_interval_seconds
+        self.acquire_timeout_seconds = acquire_timeout_seconds
+        self.busy_timeout_seconds = busy_timeout_seconds
+        self.pragmas = dict(pragmas) if pragmas is not None else {}
+        self._idle_readers = queue.LifoQueue() # LIFO keeps the most recently used connections warm.
+        self._reader_count = 0
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._state_lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self._stats = {"connections_opened": 0, "reconnects": 0, "reader_checkouts": 0, "writer_checkouts": 0}
+
+    ### CONNECTION MANAGEMENT ###
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ScrimConnectionPoolClosedError()
+
+    def _connect(self, read_only: bool) -> PooledConnection:
+        '''Opens a new connection to the database.
+        ### Parameters
+        * `read_only` - Whether the connection should refuse writes.
+        ### Returns
+        * `PooledConnection` - The wrapped connection.'''
+        conn = sqlean.connect(self.db_path, timeout=self.busy_timeout_seconds, check_same_thread=False)
+        for pragma, value in self.pragmas.items(): # Applied before query_only, as switching the journal mode needs write access.
+            conn.execute(f"PRAGMA {pragma} = {value};")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON;")
+        with self._state_lock:
+            self._stats["connections_opened"] += 1
+        scrim_logger.debug(f"Opened pooled {'reader' if read_only else 'writer'} connection to {self.db_path}.")
+        return PooledConnection(conn, read_only)
+
+    def _ensure_healthy(self, pooled: PooledConnection) -> PooledConnection:
+        '''Runs a cheap query on connections that have not been checked recently, replacing them if they fail.'''
+        now = time.monotonic()
+        if now - pooled.last_health_check < self.health_check_interval_seconds:
+            return pooled
+        try:
+            pooled.connection.execute("SELECT 1;").fetchone()
+            pooled.last_health_check = now
+            return pooled
+        except sqlean.Error as e:
+            scrim_logger.warning(f"Pooled database connection failed its health check, reconnecting: {e}")
+            pooled.close()
+            with self._state_lock:
+                self._stats["reconnects"] += 1
+            return self._connect(pooled.read_only)
+
+    def _checkout_reader(self) -> PooledConnection:
+        try:
+            return self._ensure_healthy(self._idle_readers.get_nowait())
+        except queue.Empty:
+            pass
+        with self._state_lock:
+            can_create = self._reader_count < self.max_readers
+            if can_create:
+                self._reader_count += 1
+        if can_create:
+            try:
+                return self._connect(read_only=True)
+            except Exception:
+                with self._state_lock:
+                    self._reader_count -= 1
+                raise
+        try:
+            return self._ensure_healthy(self._idle_readers.get(timeout=self.acquire_timeout_seconds))
+        except queue.Empty:
+            raise ScrimConnectionPoolTimeoutError(self.acquire_timeout_seconds)
+
+    def _checkin_reader(self, pooled: PooledConnection) -> None:
+        if pooled.connection.in_transaction:
+            pooled.connection.rollback()
+        if self._closed:
+            pooled.close()
+            return
+        self._idle_readers.put(pooled)
+
+    def _get_writer(self) -> PooledConnection:
+        '''Gets the writer connection. Must be called while holding the writer lock.'''
+        if self._writer is None:
+            self._writer = self._connect(read_only=False)
+        else:
+            self._writer = self._ensure_healthy(self._writer)
+        return self._writer
+
+    ### TRANSACTIONS ###
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlean.Cursor]:
+        '''Yields a cursor on a pooled reader connection. Inside an active transaction on this thread, the transaction's cursor is reused instead.'''
+        active_cursor = getattr(self._local, "write_cursor", None) or getattr(self._local, "read_cursor", None)
+        if active_cursor is not None:
+            yield active_cursor
+            return
+        self._check_open()
+        pooled = self._checkout_reader()
+        with self._state_lock:
+            self._stats["reader_checkouts"] += 1
+        try:
+            with closing(pooled.connection.cursor()) as cur:
+                self._local.read_cursor = cur
+                try:
+                    yield cur
+                finally:
+                    self._local.read_cursor = None
+        finally:
+            self._checkin_reader(pooled)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlean.Cursor]:
+        '''Yields a cursor on the writer connection, committing on success and rolling back on error. Nested calls on the same thread join the outer transaction.'''
+        active_cursor = getattr(self._local, "write_cursor", None)
+        if active_cursor is not None:
+            yield active_cursor
+            return
+        if getattr(self._local, "read_cursor", None) is not None:
+            raise RuntimeError("Can not open a write transaction from inside a read transaction.")
+        self._check_open()
+        if not self._writer_lock.acquire(timeout=self.acquire_timeout_seconds):
+            raise ScrimConnectionPoolTimeoutError(self.acquire_timeout_seconds)
+        try:
+            self._check_open()
+            pooled = self._get_writer()
+            with self._state_lock:
+                self._stats["writer_checkouts"] += 1
+            with closing(pooled.connection.cursor()) as cur:
+                self._local.write_cursor = cur
+                try:
+                    yield cur
+                    pooled.connection.commit()
+                except BaseException:
+                    pooled.connection.rollback()
+                    raise
+                finally:
+                    self._local.write_cursor = None
+        finally:
+            self._writer_lock.release()
+
+    ### LIFECYCLE ###
+
+    def get_stats(self) -> Dict[str, int]:
+        '''Returns a snapshot of the pool's counters.'''
+        with self._state_lock:
+            out = dict(self._stats)
+            out["readers_open"] = self._reader_count
+        out["readers_idle"] = self._idle_readers.qsize()
+        return out
+
+    def close(self) -> None:
+        '''Closes every idle connection and the writer. Connections that are checked out are closed when they are returned.'''
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                self._idle_readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                try: # Fold the WAL back into the main database file so the next start doesn't have to replay it.
+                    self._writer.connection.execute("PRAGMA optimize;")
+                    self._writer.connection.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+                except sqlean.Error as e:
+                    scrim_logger.warning(f"Failed to checkpoint the database on shutdown: {e}")
+                self._writer.close()
+                self._writer = None
+        scrim_logger.debug("Database connection pool closed.")
@@ -1,10 +1,12 @@
 import discord
 from typing import Union
 from discord.ext import commands
-from lib.scrim_sqlite import ScrimDebugChannels, ScrimUserData
+from lib.scrim_sqlite import ScrimDebugChannels
+from lib.scrim_sqlite_async import AsyncScrimUserData
 from lib.obj.scrim_user import ScrimUser
 from lib.obj.scrim_format import ScrimFormat
 from lib.scrim_datetime import DiscordDatestring
+from lib.scrim_metrics import ocr_throughput_monitor
 
 def is_owner(user: Union[discord.User, discord.Member, int]) -> bool:
     if isinstance(user, discord.User) or isinstance(user, discord.Member):
@@ -35,11 +37,11 @@ class ScrimDebugCommands(commands.Cog):
         if discord_user is None:
             await ctx.send(f"Could not find user with Discord ID: `{discord_id}`", reference=ctx.message)
             return
-        user: ScrimUser = ScrimUserData.get_user_by_discord_id(discord_id)
+        user: ScrimUser = await AsyncScrimUserData.get_user_by_discord_id(discord_id)
         if user is None:
-            ScrimUserData.insert_user_from_discord(discord_id)
-            user = ScrimUserData.get_user_by_discord_id(discord_id)
-        ScrimUserData.connect_sweet_to_id(user.scrim_id, sweet_id)
+            await AsyncScrimUserData.insert_user_from_discord(discord_id)
+            user = await AsyncScrimUserData.get_user_by_discord_id(discord_id)
+        await AsyncScrimUserData.connect_sweet_to_id(user.scrim_id, sweet_id)
         await ctx.send(f"Connected Sweet ID: `{sweet_id}` to Discord ID `{discord_id}`", reference=ctx.message)
 
     # Who is
@@ -48,7 +50,7 @@ class ScrimDebugCommands(commands.Cog):
         # If not in a debug channel, ignore
         if ctx.channel.id not in self.debug_channels:
             return
-        user: ScrimUser = ScrimUserData.get_user_by_discord_id(discord_id)
+        user: ScrimUser = await AsyncScrimUserData.get_user_by_discord_id(discord_id)
         if user is None:
             await ctx.send(f"Could not find user with Discord ID: `{discord_id}`", reference=ctx.message)
             return
@@ -72,3 +74,31 @@ class ScrimDebugCommands(commands.Cog):
             return
         
     
+
+    # OCR reader pool status
+    @commands.command(name="readerstats")
+    async def reader_stats(self, ctx: discord.ApplicationContext):
+        # If not in a debug channel, ignore
+        if ctx.channel.id not in self.debug_channels:
+            return
+        reader = self.bot.get_cog("ScrimReader")
+        if reader is None or reader.reader_pool is None:
+            await ctx.send("The OCR reader is not running.", reference=ctx.message)
+            return
+        pool_stats = reader.reader_pool.get_stats()
+        ocr_stats = ocr_throughput_monitor.get_stats()
+        emb = discord.Embed(title="OCR Readers", color=discord.Color.blue())
+        emb.add_field(name="Workers", value=f"{pool_stats['ready_workers']} ready, {pool_stats['busy_workers']} busy, {pool_stats['starting_workers']} starting, "
+                                            f"{pool_stats['retiring_workers']} stopping (min {pool_stats['min_workers']}, max {pool_stats['max_workers']})", inline=False)
+        emb.add_field(name="Queue", value=f"{pool_stats['queue_depth']} queued, {pool_stats['in_flight']} being read", inline=False)
+        ocr_ms_per_image = "-" if pool_stats["ocr_ms_per_image"] is None else f"{pool_stats['ocr_ms_per_image']:.0f}ms"
+        emb.add_field(name="Speed", value=f"{ocr_ms_per_image} OCR per image, {ocr_stats['average_latency_ms']:.0f}ms average latency, {ocr_stats['images_per_second']:.2f} images/s", inline=False)
+        if reader.result_writer is not None:
+            writer_stats = reader.result_writer.get_stats()
+            emb.add_field(name="Saved Results", value=f"{writer_stats['written']} saved, {writer_stats['pending']} waiting, {writer_stats['dropped']} dropped. "
+                                                      f"{writer_stats['images_stored']} screenshots stored at {writer_stats['image_size_ratio']:.0%} of their upload size", inline=False)
+        if reader.dedup_cache is not None:
+            dedup_stats = reader.dedup_cache.get_stats()
+            emb.add_field(name="Reused Scores", value=f"{dedup_stats['hit_rate']:.0%} hit rate: {dedup_stats['content_hits']} identical files, {dedup_stats['pixel_hits']} identical images, "
+                                                      f"{dedup_stats['perceptual_hits']} near matches, {dedup_stats['misses']} read", inline=False)
+        await ctx.send(content=None, embed=emb, reference=ctx.message)
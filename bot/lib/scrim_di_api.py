@@ -1,11 +1,24 @@
-import asyncio, json, aiohttp
+import asyncio, json, aiohttp, functools
 from datetime import datetime, timedelta, timezone
-from typing import Union, List, Optional
+from email.utils import parsedate_to_datetime
+from typing import Union, List, Optional, Dict, Tuple, Callable, Awaitable, Any
 from lib.DI_API_Obj.sweet_user import SweetUserPartial, SweetUser
-from lib.scrim_sqlite import DeceiveAPIAuthData, SweetUserCache
+from lib.scrim_logging import scrim_logger
+from lib.scrim_sqlite import DeceiveAPIAuthData, SweetUserCache, sweet_user_cache_expiration_seconds, sweet_user_cache_hard_expiration_seconds
+from lib.scrim_sqlite_async import AsyncDeceiveAPIAuthData, AsyncSweetUserCache
+from lib.scrim_ratelimit import TokenBucket, CircuitBreaker, get_backoff_delay
 
 oauth_url: str = "https://community-auth.auth.us-east-1.amazoncognito.com/oauth2/token"
 api_base_url: str = "https://1gy5zni8ll.execute-api.us-east-1.amazonaws.com/community/game/deceiveinc"
+api_batch_max_concurrency: int = 4
+api_rate_limit_per_second: float = 5.0 # Shared by every endpoint, including the token endpoint.
+api_rate_limit_burst: int = 10
+api_max_retries: int = 3
+api_backoff_base_seconds: float = 0.5
+api_backoff_max_seconds: float = 30.0 # Also the longest Retry-After that is waited out. Longer ones fail the request instead.
+api_retryable_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+api_circuit_failure_threshold: int = 5 # Failed requests in a row (after their retries) before the API is treated as down.
+api_circuit_reset_seconds: float = 30.0
 
 class DeceiveIncAPIResponseError(Exception):
     def __init__(self, status: int, message: str):
@@ -19,7 +32,11 @@ class DeceiveIncAPINotFoundError(Exception):
 
 class DeceiveIncInvalidAPICredentialsError(Exception):
     def __init__(self):
-        super().__init("Invalid API credentials were provided to the DeceiveInc API client.")
+        super().__init__("Invalid API credentials were provided to the DeceiveInc API client.")
+
+class DeceiveIncAPIUnavailableError(Exception):
+    def __init__(self, message: str):
+        super().__init__(f"DeceiveInc API is unavailable: {message}")
 
 class DeceiveIncAPIClient:
     _session: Optional[aiohttp.ClientSession]
@@ -27,6 +44,10 @@ class DeceiveIncAPIClient:
     _token_expiration_time: Optional[datetime]
     _client_id: str
     _client_secret: str
+    _in_flight: Dict[Tuple[str, str], asyncio.Task]
+    _rate_limiter: TokenBucket
+    _circuit_breaker: CircuitBreaker
+    _stats: Dict[str, int]
 
     def __init__(self,
                  client_id: str,
@@ -37,6 +58,10 @@ class DeceiveIncAPIClient:
         self._client_secret = client_secret
         self._access_token = None
         self._token_expiration_time = None
+        self._in_flight = {}
+        self._rate_limiter = TokenBucket(api_rate_limit_per_second, api_rate_limit_burst)
+        self._circuit_breaker = CircuitBreaker(api_circuit_failure_threshold, api_circuit_reset_seconds)
+        self._stats = {"requests": 0, "throttled": 0, "retried": 0, "rate_limited_responses": 0, "server_errors": 0, "network_errors": 0, "circuit_rejections": 0, "stale_served": 0}
 
     def __del__(self):
         if self._session is not None:
@@ -55,33 +80,121 @@ class DeceiveIncAPIClient:
         return self._get_token_expiration_time() is None or datetime.now(timezone.utc) >= self._token_expiration_time # type: ignore
     
     async def _refresh_access_token(self) -> None:
-        if self._session is None:
-            self._session = aiohttp.ClientSession()
-        async with self._session.post(oauth_url, data={
-            "grant_type": "client_credentials",
-            "client_id": self._client_id,
-            "client_secret": self._client_secret
-        }) as response:
-            try:
-                response.raise_for_status()
-            except aiohttp.ClientResponseError as e:
-                if e.status == 401:
-                    raise DeceiveIncInvalidAPICredentialsError()
-                else:
-                    raise DeceiveIncAPIResponseError(e.status, "An error occurred while refreshing the access token.")
-            data = await response.json()
-            self._access_token = data["access_token"]
-            self._token_expiration_time = datetime.now(timezone.utc) + timedelta(seconds=data["expires_in"])
-            DeceiveAPIAuthData.set_auth_token(self._access_token, self._token_expiration_time)
+        '''Gets a new access token. Concurrent callers, such as several requests that were rejected with a 401 at once, share a single refresh.'''
+        await self._single_flight(("token", self._client_id), self._request_access_token)
+
+    async def _request_access_token(self) -> None:
+        try:
+            data = await self._request("POST", oauth_url, authorized=False, data={
+                "grant_type": "client_credentials",
+                "client_id": self._client_id,
+                "client_secret": self._client_secret
+            })
+        except DeceiveIncAPIResponseError as e:
+            if e.status == 401:
+                raise DeceiveIncInvalidAPICredentialsError()
+            raise DeceiveIncAPIResponseError(e.status, "An error occurred while refreshing the access token.")
+        self._access_token = data["access_token"]
+        self._token_expiration_time = datetime.now(timezone.utc) + timedelta(seconds=data["expires_in"])
+        await AsyncDeceiveAPIAuthData.set_auth_token(self._access_token, self._token_expiration_time)
 
     async def _get_access_token(self) -> Optional[str]:
-        db_token_data = DeceiveAPIAuthData.get_auth_token()
-        if db_token_data is not None and not DeceiveAPIAuthData.is_token_expired(db_token_data[1]):
+        db_token_data = await AsyncDeceiveAPIAuthData.get_auth_token()
+        if db_token_data is not None and not AsyncDeceiveAPIAuthData.is_token_expired(db_token_data[1]):
             return db_token_data[0]
         if self._access_token is None or self._is_token_expired():
             await self._refresh_access_token()
         return self._access_token
     
+    # Request functions
+
+    @staticmethod
+    def _get_retry_after_seconds(response: aiohttp.ClientResponse) -> Optional[float]:
+        '''Reads the `Retry-After` header, which is either a number of seconds or an HTTP date.'''
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is None:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    async def _request(self, method: str, url: str, authorized: bool = True, **kwargs) -> Any:
+        '''Sends a request to the API and returns its JSON body.
+
+        Every request waits its turn on the shared rate limiter. Throttled (429) and server error responses, as well as connection errors, are retried
+        with exponential backoff and jitter, honouring `Retry-After`. A 401 refreshes the access token and retries once. Requests that still fail count
+        towards the circuit breaker. While it is open, requests are refused straight away.
+        ### Parameters
+        * `method` - The HTTP method.
+        * `url` - The URL to request.
+        * `authorized` - Whether to send the access token.
+        * `**kwargs` - Passed on to `aiohttp.ClientSession.request`.
+        ### Returns
+        * `Any` - The parsed JSON body.
+        ### Raises
+        * `DeceiveIncAPIResponseError` - If the API answered with an error that is not worth retrying.
+        * `DeceiveIncInvalidAPICredentialsError` - If the API still refuses the access token after it has been refreshed.
+        * `DeceiveIncAPIUnavailableError` - If the circuit breaker is open, or the API kept failing or could not be reached.'''
+        if not self._circuit_breaker.allow_request():
+            self._stats["circuit_rejections"] += 1
+            raise DeceiveIncAPIUnavailableError(f"Too many failed requests, not retrying for another {self._circuit_breaker.get_retry_after_seconds():.0f} seconds.")
+        refreshed_token: bool = False
+        attempt: int = 0
+        while True:
+            if await self._rate_limiter.acquire() > 0:
+                self._stats["throttled"] += 1
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            headers = {"Authorization": f"Bearer {await self._get_access_token()}"} if authorized else {}
+            self._stats["requests"] += 1
+            retry_after: Optional[float] = None
+            try:
+                async with self._session.request(method, url, headers=headers, **kwargs) as response:
+                    if response.status < 400:
+                        data = await response.json()
+                        self._circuit_breaker.record_success()
+                        return data
+                    if response.status == 401 and authorized:
+                        if refreshed_token: # The token was just refreshed, so it's the credentials that are wrong.
+                            raise DeceiveIncInvalidAPICredentialsError()
+                        refreshed_token = True
+                        await self._refresh_access_token()
+                        continue
+                    if response.status not in api_retryable_statuses: # The API is up, the request was just bad.
+                        self._circuit_breaker.record_success()
+                        raise DeceiveIncAPIResponseError(response.status, await response.text())
+                    if response.status == 429:
+                        self._stats["rate_limited_responses"] += 1
+                    else:
+                        self._stats["server_errors"] += 1
+                    retry_after = self._get_retry_after_seconds(response)
+                    if retry_after is not None and response.status == 429:
+                        self._rate_limiter.pause(retry_after) # Holds back every other request too, not just this one.
+                    error: Exception = DeceiveIncAPIUnavailableError(f"{method} {url} returned status {response.status} after {attempt + 1} attempts.")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._stats["network_errors"] += 1
+                error = DeceiveIncAPIUnavailableError(f"{method} {url} failed after {attempt + 1} attempts: {e!r}")
+            delay = retry_after if retry_after is not None else get_backoff_delay(attempt, api_backoff_base_seconds, api_backoff_max_seconds)
+            if attempt >= api_max_retries or delay > api_backoff_max_seconds:
+                self._circuit_breaker.record_failure()
+                raise error
+            attempt += 1
+            self._stats["retried"] += 1
+            scrim_logger.debug(f"Retrying {method} {url} in {delay:.2f}s (attempt {attempt} of {api_max_retries}).")
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Union[int, float, str]]:
+        '''Returns the client's request counters along with the state of its rate limiter and circuit breaker.'''
+        out: Dict[str, Union[int, float, str]] = dict(self._stats)
+        out["available_tokens"] = self._rate_limiter.get_available_tokens()
+        out.update({f"circuit_{key}": value for key, value in self._circuit_breaker.get_stats().items()})
+        return out
+
     # API functions
 
     @staticmethod
@@ -90,72 +203,199 @@ class DeceiveIncAPIClient:
         await out._refresh_access_token()
         return out
     
-    async def search_users(self, query: str, retry: bool = False, force: bool = False) -> List[SweetUserPartial]:
+    async def close(self) -> None:
+        '''Cancels any pending requests and background refreshes, and closes the HTTP session.'''
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        self._in_flight.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # Cache functions
+
+    @staticmethod
+    def _get_cache_age_seconds(last_updated: datetime) -> float:
+        return (datetime.now(timezone.utc) - last_updated).total_seconds()
+
+    def _get_in_flight(self, key: Tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        '''Gets the running request for `key`, starting one with `fetch` if there is none.'''
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._on_in_flight_done, key))
+        return task
+
+    def _on_in_flight_done(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception() # Marks the exception as retrieved in case every caller has since given up waiting.
+
+    async def _single_flight(self, key: Tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        '''Runs `fetch` once for every concurrent caller asking for the same `key`, and gives them all its result.
+        ### Parameters
+        * `key` - Identifies the request, e.g. `("user", sweet_id)`.
+        * `fetch` - Creates the coroutine that makes the request.
+        ### Returns
+        * `Any` - Whatever `fetch` returns. Exceptions are raised to every caller.'''
+        # Shielded so that one caller being cancelled does not cancel the request for everyone else.
+        return await asyncio.shield(self._get_in_flight(key, fetch))
+
+    def _schedule_refresh(self, key: Tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> None:
+        '''Refreshes a stale cache entry in the background. Does nothing if a request for the same entry is already running.
+        ### Parameters
+        * `key` - Identifies the cache entry being refreshed.
+        * `fetch` - Creates the coroutine that fetches and stores fresh data.'''
+        if key in self._in_flight or not self._circuit_breaker.allow_request():
+            return
+        self._get_in_flight(key, fetch).add_done_callback(functools.partial(self._on_refresh_done, key))
+
+    def _on_refresh_done(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            scrim_logger.warning(f"Background refresh of {key[0]} {key[1]} failed, keeping the cached copy: {task.exception()}")
+
+    async def search_users(self, query: str, force: bool = False) -> List[SweetUserPartial]:
         '''Searches for users by name, returning a list of SweetUserPartial objects.
+
+        Cached results are returned right away. If any of them are older than the cache expiration, they are refreshed in the background.
+        Only when no results are cached, or they are older than the hard expiration, does this wait on the API. If the API is unavailable,
+        cached results are returned no matter how old they are.
         ### Parameters:
         * `query` (`str`): The username to search for.
-        * `retry` (`bool`, optional): Whether or not to retry the request if the access token is invalid. Defaults to `False`. By default, requests will retry once before failing.
         * `force` (`bool`, optional): Whether or not to force a refresh of the cache. Defaults to `False`.
         ### Returns:
         * `List[SweetUserPartial]`: A list of SweetUserPartial objects representing the users found.'''
-        potential_users: List[SweetUserPartial] = SweetUserCache.get_user_partials_by_name(query)
-        search_results_expired: bool = False
-        if len(potential_users) > 0:
-            for i in potential_users:
-                if SweetUserCache.has_user_partial_expired(i.sweet_id):
-                    search_results_expired = True
-                    break
-            if not search_results_expired and not force:
-                return potential_users
-        if self._session is None:
-            self._session = aiohttp.ClientSession()
-        search_url: str = f"{api_base_url}/search/user"
-        async with self._session.get(search_url, headers={
-            "Authorization": f"Bearer {await self._get_access_token()}"
-        }, params={
-            "query": query
-        }) as response:
-            try:
-                response.raise_for_status()
-            except aiohttp.ClientResponseError as e:
-                if e.status == 401: # The token needs to be refreshed and tried again
-                    if retry: # If we've already tried refreshing the token, raise the error
-                        raise DeceiveIncInvalidAPICredentialsError()
-                    await self._refresh_access_token()
-                    return await self.search_users(query, True)
-            data = await response.json()
-            out = [SweetUserPartial(user["sweetId"], user["displayName"]) for user in data]
-            for i in out:
-                SweetUserCache.set_user_partial(i)
-            return out
-    
-    async def get_user(self, sweet_id: str, retry: bool = False, force: bool = False) -> Optional[SweetUser]:
-        # Check to see if a version of the user is in the cache and not expired.
-        cached_user = SweetUserCache.get_user(sweet_id)
-        if cached_user is not None and force == False:
-            return cached_user
-        user_url: str = f"{api_base_url}/user/{sweet_id}/profile"
-        if self._session is None:
-            self._session = aiohttp.ClientSession()
-        async with self._session.get(user_url, headers={
-            "Authorization": f"Bearer {await self._get_access_token()}"
-        }) as response:
-            try:
-                response.raise_for_status()
-            except aiohttp.ClientResponseError as e:
-                if e.status == 400: # Invalid sweet ID
-                    raise DeceiveIncAPIResponseError(e.status, f"The provided Sweet ID {sweet_id} is invalid.")
-                elif e.status == 401: # The token needs to be refreshed and tried again
-                    if retry: # If we've already tried refreshing the token, throw error
-                        raise DeceiveIncAPIResponseError(e.status, "The access token is invalid.")
-                    await self._refresh_access_token()
-                    return await self.get_user(sweet_id, True)
-                elif e.status == 404: # User not found
-                    raise DeceiveIncAPIResponseError(e.status, f"The user with Sweet ID {sweet_id} was not found.")
-            data = await response.json()
-            sw = SweetUser.from_api_response(sweet_id, data)
-            SweetUserCache.set_user(sw)
-            return sw
-    
+        cached_entries: List[Tuple[SweetUserPartial, datetime]] = []
+        if not force:
+            cached_entries = await AsyncSweetUserCache.get_user_partial_entries_by_name(query)
+            if len(cached_entries) > 0:
+                oldest_age = max(self._get_cache_age_seconds(last_updated) for _, last_updated in cached_entries)
+                if oldest_age < sweet_user_cache_hard_expiration_seconds:
+                    if oldest_age >= sweet_user_cache_expiration_seconds:
+                        self._schedule_refresh(("search", query), lambda: self._fetch_search(query))
+                    return [user for user, _ in cached_entries]
+        try:
+            return await self._single_flight(("search", query), lambda: self._fetch_search(query))
+        except DeceiveIncAPIUnavailableError as e:
+            if len(cached_entries) == 0:
+                raise
+            self._stats["stale_served"] += 1
+            scrim_logger.warning(f"Serving expired search results for {query}: {e}")
+            return [user for user, _ in cached_entries]
+
+    async def _fetch_search(self, query: str) -> List[SweetUserPartial]:
+        '''Searches for users through the API and caches the results.'''
+        data = await self._request("GET", f"{api_base_url}/search/user", params={"query": query})
+        out = [SweetUserPartial(user["sweetId"], user["displayName"]) for user in data]
+        for i in out:
+            await AsyncSweetUserCache.set_user_partial(i)
+        return out
+
+    async def get_user(self, sweet_id: str, force: bool = False) -> Optional[SweetUser]:
+        '''Gets a user's profile and stats.
+
+        A cached user is returned right away. If it is older than the cache expiration, it is refreshed in the background.
+        Only when the user is not cached, or is older than the hard expiration, does this wait on the API. If the API is unavailable,
+        the cached user is returned no matter how old it is.
+        ### Parameters:
+        * `sweet_id` (`str`): The user's Sweet ID.
+        * `force` (`bool`, optional): Whether or not to skip the cache and fetch the user from the API. Defaults to `False`.
+        ### Returns:
+        * `Optional[SweetUser]`: The user.'''
+        cached_entry: Optional[Tuple[SweetUser, datetime]] = None
+        if not force:
+            cached_entry = AsyncSweetUserCache.peek_user_entry(sweet_id)
+            if cached_entry is None:
+                cached_entry = await AsyncSweetUserCache.get_user_entry(sweet_id)
+            if cached_entry is not None:
+                cached_user, last_updated = cached_entry
+                age_seconds = self._get_cache_age_seconds(last_updated)
+                if age_seconds < sweet_user_cache_hard_expiration_seconds:
+                    if age_seconds >= sweet_user_cache_expiration_seconds:
+                        self._schedule_refresh(("user", sweet_id), lambda: self._fetch_user(sweet_id))
+                    return cached_user
+        try:
+            return await self._single_flight(("user", sweet_id), lambda: self._fetch_user(sweet_id))
+        except DeceiveIncAPIUnavailableError as e:
+            if cached_entry is None:
+                raise
+            self._stats["stale_served"] += 1
+            scrim_logger.warning(f"Serving expired stats for Sweet ID {sweet_id}: {e}")
+            return cached_entry[0]
+
+    async def _fetch_user(self, sweet_id: str) -> Optional[SweetUser]:
+        '''Gets a user from the API and caches it.'''
+        sw = await self._request_user(sweet_id)
+        if sw is not None:
+            await AsyncSweetUserCache.set_user(sw)
+        return sw
+
+    async def _request_user(self, sweet_id: str) -> Optional[SweetUser]:
+        '''Gets a user from the API without caching it.'''
+        try:
+            data = await self._request("GET", f"{api_base_url}/user/{sweet_id}/profile")
+        except DeceiveIncAPIResponseError as e:
+            if e.status == 400: # Invalid sweet ID
+                raise DeceiveIncAPIResponseError(e.status, f"The provided Sweet ID {sweet_id} is invalid.")
+            elif e.status == 404: # User not found
+                raise DeceiveIncAPIResponseError(e.status, f"The user with Sweet ID {sweet_id} was not found.")
+            raise
+        return SweetUser.from_api_response(sweet_id, data)
+
+    async def get_users(self, sweet_ids: List[str], max_concurrency: int = api_batch_max_concurrency) -> Tuple[Dict[str, SweetUser], Dict[str, Exception]]:
+        '''Gets several users' profiles and stats at once, such as everyone in a scrim lobby.
+
+        Cached users are read in a single query and follow the same stale-while-revalidate rules as `get_user`, including falling back to
+        expired copies while the API is unavailable. The rest are fetched from the API
+        concurrently, at most `max_concurrency` at a time, and written back to the cache in a single transaction.
+        ### Parameters:
+        * `sweet_ids` (`List[str]`): The users' Sweet IDs. Duplicates are only fetched once.
+        * `max_concurrency` (`int`, optional): The maximum number of API requests in flight at once. Defaults to `api_batch_max_concurrency`.
+        ### Returns:
+        * `Tuple[Dict[str, SweetUser], Dict[str, Exception]]`: The users that were found, and the error for each user that could not be fetched. Both are keyed by Sweet ID.'''
+        sweet_ids = list(dict.fromkeys(sweet_ids))
+        users: Dict[str, SweetUser] = {}
+        errors: Dict[str, Exception] = {}
+        cached_entries = await AsyncSweetUserCache.get_user_entries(sweet_ids)
+        to_fetch: List[str] = []
+        for sweet_id in sweet_ids:
+            cached_entry = cached_entries.get(sweet_id)
+            if cached_entry is not None:
+                age_seconds = self._get_cache_age_seconds(cached_entry[1])
+                if age_seconds < sweet_user_cache_hard_expiration_seconds:
+                    if age_seconds >= sweet_user_cache_expiration_seconds:
+                        self._schedule_refresh(("user", sweet_id), functools.partial(self._fetch_user, sweet_id))
+                    users[sweet_id] = cached_entry[0]
+                    continue
+            to_fetch.append(sweet_id)
+        if len(to_fetch) > 0:
+            semaphore = asyncio.Semaphore(max_concurrency)
+            async def fetch(sweet_id: str) -> Optional[SweetUser]:
+                async with semaphore:
+                    return await self._single_flight(("user", sweet_id), functools.partial(self._request_user, sweet_id))
+            results = await asyncio.gather(*[fetch(sweet_id) for sweet_id in to_fetch], return_exceptions=True)
+            fetched: List[SweetUser] = []
+            for sweet_id, result in zip(to_fetch, results):
+                if isinstance(result, DeceiveIncAPIUnavailableError) and sweet_id in cached_entries:
+                    self._stats["stale_served"] += 1
+                    users[sweet_id] = cached_entries[sweet_id][0]
+                elif isinstance(result, Exception):
+                    errors[sweet_id] = result
+                elif isinstance(result, BaseException):
+                    raise result
+                elif result is None:
+                    errors[sweet_id] = DeceiveIncAPINotFoundError(sweet_id)
+                else:
+                    users[sweet_id] = result
+                    fetched.append(result)
+            if len(fetched) > 0:
+                try:
+                    await AsyncSweetUserCache.set_users(fetched)
+                except Exception as e:
+                    scrim_logger.warning(f"Failed to cache {len(fetched)} fetched users: {e}")
+        return {sweet_id: users[sweet_id] for sweet_id in sweet_ids if sweet_id in users}, errors
+
     async def upgrade_user_partial(self, user_partial: SweetUserPartial) -> Optional[SweetUser]:
-        return await self.get_user(user_partial.sweet_id)
\ No newline at end of file
+        return await self.get_user(user_partial.sweet_id)
@@ -1,25 +1,99 @@
+import os, functools
 import cv2
 import numpy as np
+from typing import Tuple, Union
 from PIL import Image
 
+# The "MISSION REPORT" title, cut from ocr_test/missionreport.png (1920x1080) at (672, 146).
+mission_report_template_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rsc", "mission_report_header.png")
+# Where the score rows sit relative to the top-left corner of the title, in template pixels: (left, top, right, bottom).
+# Measured on the same screenshot: the rows span x 515-1405 and start at y 255, and the account level labels start at y 890.
+_mission_report_panel_offsets: Tuple[int, int, int, int] = (-162, 104, 738, 739)
+_panel_search_scales: Tuple[float, ...] = (0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.4) # UI scale relative to the calibration screenshot, for other aspect ratios.
+_panel_search_height: int = 270 # Matching runs on the image shrunk to a quarter of 1080p, the title is still easy to find at that size.
+_panel_match_threshold: float = 0.6
+
 def greyscale_image(image: Image.Image) -> Image.Image:
     """
     Convert an image to greyscale.
     """
     return image.convert("L")
 
+@functools.lru_cache(maxsize=1)
+def _load_mission_report_template() -> np.ndarray:
+    return np.array(Image.open(mission_report_template_path).convert("L"))
+
+def find_mission_report_panel_in_array(grey: np.ndarray) -> Union[Tuple[int, int, int, int], None]:
+    """
+    Finds the panel of score rows on a greyscale mission report screenshot by matching the "MISSION REPORT" title.
+    Returns its box as (left, top, right, bottom) in image pixels, or None if the title can't be found.
+    """
+    template = _load_mission_report_template()
+    image_height, image_width = grey.shape[:2]
+    downscale = image_height / _panel_search_height # Screenshots are matched at the same height whatever their resolution.
+    small = cv2.resize(grey, (max(1, int(image_width / downscale)), _panel_search_height), interpolation=cv2.INTER_AREA)
+    best_score, best_location, best_scale = -1.0, (0, 0), 1.0
+    for scale in _panel_search_scales:
+        width = int(template.shape[1] * scale * _panel_search_height / 1080)
+        height = int(template.shape[0] * scale * _panel_search_height / 1080)
+        if width > small.shape[1] or height > small.shape[0] or width < 8 or height < 4:
+            continue
+        scaled_template = cv2.resize(template, (width, height), interpolation=cv2.INTER_AREA)
+        _, score, _, location = cv2.minMaxLoc(cv2.matchTemplate(small, scaled_template, cv2.TM_CCOEFF_NORMED))
+        if score > best_score:
+            best_score, best_location, best_scale = score, location, scale
+    if best_score < _panel_match_threshold:
+        return None
+    title_x, title_y = best_location[0] * downscale, best_location[1] * downscale
+    left, top, right, bottom = (offset * best_scale * image_height / 1080 for offset in _mission_report_panel_offsets)
+    box = (max(0, int(title_x + left)), max(0, int(title_y + top)), min(image_width, int(title_x + right)), min(image_height, int(title_y + bottom)))
+    if box[2] - box[0] < 16 or box[3] - box[1] < 16:
+        return None
+    return box
+
+def find_mission_report_panel(image: Image.Image) -> Union[Tuple[int, int, int, int], None]:
+    """
+    Finds the panel of score rows on a mission report screenshot. See find_mission_report_panel_in_array.
+    """
+    return find_mission_report_panel_in_array(np.asarray(greyscale_image(image)))
+
+def crop_array_to_mission_report(grey: np.ndarray) -> np.ndarray:
+    """
+    Crops a greyscale screenshot down to the score rows of the mission report. The result is a view into the same buffer, nothing is copied.
+    Returns the array unchanged if the panel can't be found.
+    """
+    box = find_mission_report_panel_in_array(grey)
+    return grey if box is None else grey[box[1]:box[3], box[0]:box[2]]
+
+def crop_to_mission_report(image: Image.Image) -> Image.Image:
+    """
+    Crops a screenshot down to the score rows of the mission report. Returns the image unchanged if the panel can't be found.
+    """
+    box = find_mission_report_panel(image)
+    return image if box is None else image.crop(box)
+
+def binarize_array(grey: np.ndarray) -> np.ndarray:
+    """
+    Otsu-thresholds a greyscale array in place and returns it.
+    """
+    cv2.threshold(grey, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=grey)
+    return grey
+
 def binarize_image(image: Image.Image) -> Image.Image:
-    image = greyscale_image(image)
-    image = np.array(image)
-    _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return Image.fromarray(image)
+    return Image.fromarray(binarize_array(np.array(greyscale_image(image))))
     
 def denoise_image(image: Image.Image) -> Image.Image:
     image = np.array(image)
     image = cv2.fastNlMeansDenoising(image, None, 10, 7, 21)
     return Image.fromarray(image)
 
+_sharpening_kernel: np.ndarray = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32)
+
+def sharpen_array(grey: np.ndarray) -> np.ndarray:
+    """
+    Sharpens a greyscale array into a new array.
+    """
+    return cv2.filter2D(grey, -1, _sharpening_kernel)
+
 def sharpen_image(image: Image.Image) -> Image.Image:
-    image = np.array(image.convert('L'))
-    sharpening_kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-    return Image.fromarray(cv2.filter2D(image, -1, sharpening_kernel))
\ No newline at end of file
+    return Image.fromarray(sharpen_array(np.array(image.convert('L'))))
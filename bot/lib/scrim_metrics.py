@@ -0,0 +1,202 @@
+import asyncio, time, threading
+from collections import deque
+from typing import Union, Dict, Deque, List, Tuple
+from lib.scrim_logging import scrim_logger
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+class EventLoopLagMonitor:
+    '''Measures how late the event loop wakes a sleeping task. Anything blocking the loop (disk I/O, CPU work) shows up as lag.'''
+    interval_seconds: float
+    warning_threshold_seconds: float
+    last_lag_seconds: float
+    max_lag_seconds: float
+    average_lag_seconds: float
+    samples: int
+    _task: Union[asyncio.Task, None]
+
+    def __init__(self, interval_seconds: float = 0.5, warning_threshold_seconds: float = 0.25):
+        self.interval_seconds = interval_seconds
+        self.warning_threshold_seconds = warning_threshold_seconds
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.average_lag_seconds = 0.0
+        self.samples = 0
+        self._task = None
+
+    def start(self) -> None:
+        '''Starts monitoring on the running event loop. Calling this again while already running does nothing.'''
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._monitor())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record(self, lag_seconds: float) -> None:
+        '''Records a single lag sample.'''
+        self.last_lag_seconds = lag_seconds
+        self.max_lag_seconds = max(self.max_lag_seconds, lag_seconds)
+        self.samples += 1
+        self.average_lag_seconds += (lag_seconds - self.average_lag_seconds) / min(self.samples, 100) # Moving average over roughly the last 100 samples
+        if lag_seconds >= self.warning_threshold_seconds:
+            scrim_logger.warning(f"Event loop was blocked for {lag_seconds * 1000:.0f}ms.")
+
+    def get_stats(self) -> Dict[str, float]:
+        return {"last_lag_ms": self.last_lag_seconds * 1000, "average_lag_ms": self.average_lag_seconds * 1000, "max_lag_ms": self.max_lag_seconds * 1000, "samples": self.samples}
+
+    async def _monitor(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval_seconds)
+            self.record(max(0.0, time.perf_counter() - start - self.interval_seconds))
+
+event_loop_lag_monitor: EventLoopLagMonitor = EventLoopLagMonitor()
+
+class OCRThroughputMonitor:
+    '''Tracks how quickly the OCR readers get through screenshots. Use it to tune `--reader-batch-size` against `--num-reader-threads`.
+
+    Latency is per image, from when the screenshot was queued to when its text came back. Throughput is measured two ways: wall-clock images per second
+    over the last `window_seconds`, and how many images per second one worker reads while it is busy (batch size over batch run time).
+    Workers also report how long each stage of the image pipeline took, which is averaged per stage.'''
+    window_seconds: float
+    report_every: int
+    images: int
+    batches: int
+    errors: int
+    last_latency_seconds: float
+    average_latency_seconds: float
+    max_latency_seconds: float
+    average_batch_size: float
+    average_worker_images_per_second: float
+    average_stage_seconds: Dict[str, float]
+    _stage_samples: Dict[str, int]
+    _completed_at: Deque[float]
+    _lock: threading.Lock
+
+    def __init__(self, window_seconds: float = 60.0, report_every: int = 50):
+        self.window_seconds = window_seconds
+        self.report_every = report_every
+        self.images = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_latency_seconds = 0.0
+        self.average_latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.average_batch_size = 0.0
+        self.average_worker_images_per_second = 0.0
+        self.average_stage_seconds = {}
+        self._stage_samples = {}
+        self._completed_at = deque()
+        self._lock = threading.Lock()
+
+    def record_batch(self, latencies_seconds: List[float], batch_seconds: float, errors: int = 0, stage_seconds: Union[List[Dict[str, float]], None] = None) -> None:
+        '''Records one batch that came back from a worker, with the end-to-end latency of each image in it and, optionally, each image's stage timings.'''
+        if len(latencies_seconds) == 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            self.errors += errors
+            self.average_batch_size += (len(latencies_seconds) - self.average_batch_size) / min(self.batches, 100)
+            if batch_seconds > 0:
+                self.average_worker_images_per_second += (len(latencies_seconds) / batch_seconds - self.average_worker_images_per_second) / min(self.batches, 100)
+            for latency_seconds in latencies_seconds:
+                self.images += 1
+                self.last_latency_seconds = latency_seconds
+                self.max_latency_seconds = max(self.max_latency_seconds, latency_seconds)
+                self.average_latency_seconds += (latency_seconds - self.average_latency_seconds) / min(self.images, 100) # Moving average over roughly the last 100 images
+                self._completed_at.append(now)
+            for image_stage_seconds in (stage_seconds or []):
+                for stage, seconds in image_stage_seconds.items():
+                    samples = self._stage_samples.get(stage, 0) + 1
+                    self._stage_samples[stage] = samples
+                    average = self.average_stage_seconds.get(stage, 0.0)
+                    self.average_stage_seconds[stage] = average + (seconds - average) / min(samples, 100)
+            should_report = self.images // self.report_every != (self.images - len(latencies_seconds)) // self.report_every
+        scrim_logger.debug(f"OCR batch of {len(latencies_seconds)} read in {batch_seconds * 1000:.0f}ms.")
+        if should_report:
+            stats = self.get_stats()
+            scrim_logger.info(f"OCR: {stats['images']} images read, {stats['images_per_second']:.2f} images/s over the last {self.window_seconds:.0f}s, "
+                              f"average latency {stats['average_latency_ms']:.0f}ms, average batch size {stats['average_batch_size']:.1f}, "
+                              f"{stats['worker_images_per_second']:.2f} images/s per busy worker. Stages: "
+                              + ", ".join(f"{stage} {stage_ms:.1f}ms" for stage, stage_ms in stats["stage_ms"].items()) + ".")
+
+    def get_images_per_second(self) -> float:
+        '''Images completed per second over the last `window_seconds`.'''
+        now = time.monotonic()
+        with self._lock:
+            while len(self._completed_at) > 0 and self._completed_at[0] < now - self.window_seconds:
+                self._completed_at.popleft()
+            return len(self._completed_at) / self.window_seconds
+
+    def get_stats(self) -> Dict[str, Union[int, float, Dict[str, float]]]:
+        images_per_second = self.get_images_per_second()
+        return {"images": self.images, "batches": self.batches, "errors": self.errors, "images_per_second": images_per_second,
+                "last_latency_ms": self.last_latency_seconds * 1000, "average_latency_ms": self.average_latency_seconds * 1000, "max_latency_ms": self.max_latency_seconds * 1000,
+                "average_batch_size": self.average_batch_size, "worker_images_per_second": self.average_worker_images_per_second,
+                "stage_ms": {stage: seconds * 1000 for stage, seconds in self.average_stage_seconds.items()}}
+
+ocr_throughput_monitor: OCRThroughputMonitor = OCRThroughputMonitor()
+
+class LatencyHistogram:
+    '''A fixed-bucket histogram of latencies. Percentiles are estimated from the buckets, so they are only as fine as the bucket bounds.'''
+    name: str
+    bucket_bounds_ms: Tuple[float, ...]
+    report_every: int
+    bucket_counts: List[int] # One per bound, plus the overflow bucket.
+    count: int
+    total_ms: float
+    max_ms: float
+    _lock: threading.Lock
+
+    def __init__(self, name: str, bucket_bounds_ms: Tuple[float, ...] = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000), report_every: int = 50):
+        self.name = name
+        self.bucket_bounds_ms = bucket_bounds_ms
+        self.report_every = report_every
+        self.bucket_counts = [0] * (len(bucket_bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency_seconds: float) -> None:
+        latency_ms = latency_seconds * 1000
+        with self._lock:
+            bucket = 0
+            while bucket < len(self.bucket_bounds_ms) and latency_ms > self.bucket_bounds_ms[bucket]:
+                bucket += 1
+            self.bucket_counts[bucket] += 1
+            self.count += 1
+            self.total_ms += latency_ms
+            self.max_ms = max(self.max_ms, latency_ms)
+            should_report = self.count % self.report_every == 0
+        if should_report:
+            stats = self.get_stats()
+            scrim_logger.info(f"{self.name}: {stats['count']} samples, p50 <= {stats['p50_ms']:.0f}ms, p90 <= {stats['p90_ms']:.0f}ms, p99 <= {stats['p99_ms']:.0f}ms, max {stats['max_ms']:.0f}ms.")
+
+    def get_percentile_ms(self, percentile: float) -> float:
+        '''Gets the upper bound of the bucket the given percentile (0-100) falls in. The overflow bucket reports the largest latency seen.'''
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            rank = percentile / 100 * self.count
+            seen = 0
+            for bucket, bucket_count in enumerate(self.bucket_counts):
+                seen += bucket_count
+                if seen >= rank and bucket_count > 0:
+                    return self.bucket_bounds_ms[bucket] if bucket < len(self.bucket_bounds_ms) else self.max_ms
+            return self.max_ms
+
+    def get_stats(self) -> Dict[str, Union[int, float, Dict[str, int]]]:
+        with self._lock:
+            buckets = {f"<={bound:g}ms": bucket_count for bound, bucket_count in zip(self.bucket_bounds_ms, self.bucket_counts)}
+            buckets[f">{self.bucket_bounds_ms[-1]:g}ms"] = self.bucket_counts[-1]
+            count, total_ms, max_ms = self.count, self.total_ms, self.max_ms
+        return {"count": count, "average_ms": total_ms / count if count > 0 else 0.0, "max_ms": max_ms,
+                "p50_ms": self.get_percentile_ms(50), "p90_ms": self.get_percentile_ms(90), "p99_ms": self.get_percentile_ms(99), "buckets": buckets}
+
+ocr_delivery_latency_histogram: LatencyHistogram = LatencyHistogram("OCR delivery latency (attachment received to embed edited)")
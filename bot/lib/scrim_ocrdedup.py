@@ -0,0 +1,115 @@
+import io, hashlib, threading
+import numpy as np
+from typing import Dict, Tuple, Union
+from PIL import Image
+from lib.scrim_logging import scrim_logger
+from lib.scrim_sqlite_async import AsyncDeceiveReaderScoreCache
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+class ImageHashes:
+    '''The hashes a screenshot is looked up by.
+    * `content_hash` - SHA-256 of the file. Matches the same upload.
+    * `pixel_hash` - SHA-256 of the decoded pixels. Also matches copies that were re-saved without loss or had their metadata stripped.
+    * `perceptual_hash` - 64-bit difference hash. Close values mean the images look alike, which is not the same as showing the same score.'''
+    __slots__ = ("content_hash", "pixel_hash", "perceptual_hash")
+    content_hash: str
+    pixel_hash: str
+    perceptual_hash: int
+
+    def __init__(self, content_hash: str, pixel_hash: str, perceptual_hash: int):
+        self.content_hash = content_hash
+        self.pixel_hash = pixel_hash
+        self.perceptual_hash = perceptual_hash
+
+def difference_hash(image: Image.Image) -> int:
+    '''64-bit difference hash: one bit per neighbouring pair of pixels on a 9x8 greyscale thumbnail, set when the right one is brighter.'''
+    thumbnail = np.asarray(image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    return int.from_bytes(np.packbits(thumbnail[:, 1:] > thumbnail[:, :-1]).tobytes(), "big")
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def hash_image(image_bytes: bytes) -> Union[ImageHashes, None]:
+    '''Hashes a screenshot. Returns `None` if it can't be decoded, the OCR reader reports those.'''
+    try:
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    except Exception:
+        return None
+    pixel_hash = hashlib.sha256(f"{image.width}x{image.height}".encode() + image.tobytes()).hexdigest()
+    return ImageHashes(hashlib.sha256(image_bytes).hexdigest(), pixel_hash, difference_hash(image))
+
+class OCRDedupCache:
+    '''Finds screenshots that have already been read, so reposts skip OCR.
+
+    Copies of the same file, or of the same pixels, always reuse the stored score. Matching by perceptual hash is off unless `max_distance` is 0 or more.
+    It is risky on mission reports: two reports that differ by a single digit hash within a couple of bits of each other, sometimes to the same value,
+    which is as close as a recompressed copy of one report. Leave it off unless you accept that risk.'''
+    max_distance: int
+    _perceptual_index: Union[Dict[int, str], None] # Perceptual hash -> content hash, loaded on first use.
+    _lock: threading.Lock
+    _stats: Dict[str, int]
+
+    def __init__(self, max_distance: int = -1):
+        self.max_distance = max_distance
+        self._perceptual_index = None
+        self._lock = threading.Lock()
+        self._stats = {"content_hits": 0, "pixel_hits": 0, "perceptual_hits": 0, "misses": 0}
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _find_similar(self, perceptual_hash: int) -> Union[str, None]:
+        '''Gets the content hash of the cached screenshot that looks most like this one, if any is within `max_distance`.'''
+        best_distance, best_content_hash = self.max_distance + 1, None
+        for other_hash, content_hash in self._perceptual_index.items():
+            distance = hamming_distance(perceptual_hash, other_hash)
+            if distance < best_distance:
+                best_distance, best_content_hash = distance, content_hash
+        return best_content_hash
+
+    async def lookup(self, hashes: ImageHashes) -> Union[Tuple[int, int, int, bool, bool, bool, int], None]:
+        '''Gets the stored score of a screenshot that has been read before, or `None` if it has to be read.'''
+        found = await AsyncDeceiveReaderScoreCache.get_score_by_hashes(hashes.content_hash, hashes.pixel_hash)
+        if found is not None:
+            score, cached_content_hash = found
+            same_file = cached_content_hash == hashes.content_hash
+            self._count("content_hits" if same_file else "pixel_hits")
+            await AsyncDeceiveReaderScoreCache.record_hit(cached_content_hash)
+            scrim_logger.debug(f"Reused the score of a screenshot with the same {'file' if same_file else 'pixels'}.")
+            return score
+        if self.max_distance >= 0:
+            if self._perceptual_index is None:
+                self._perceptual_index = await AsyncDeceiveReaderScoreCache.get_perceptual_hashes()
+            similar_content_hash = self._find_similar(hashes.perceptual_hash)
+            if similar_content_hash is not None:
+                score = await AsyncDeceiveReaderScoreCache.get_score_by_content_hash(similar_content_hash)
+                if score is not None:
+                    self._count("perceptual_hits")
+                    await AsyncDeceiveReaderScoreCache.record_hit(similar_content_hash)
+                    scrim_logger.debug("Reused the score of a similar looking screenshot.")
+                    return score
+        self._count("misses")
+        return None
+
+    async def store(self, hashes: ImageHashes, score: Tuple[int, int, int, bool, bool, bool, int]) -> None:
+        '''Remembers the score read from a screenshot.'''
+        await AsyncDeceiveReaderScoreCache.add_score(hashes.content_hash, hashes.pixel_hash, hashes.perceptual_hash, score)
+        if self._perceptual_index is not None:
+            self._perceptual_index.setdefault(hashes.perceptual_hash, hashes.content_hash)
+
+    async def invalidate(self, hashes: ImageHashes) -> None:
+        '''Forgets the stored score of a screenshot with the same file or pixels, so the next post of it is read again.'''
+        removed = set(await AsyncDeceiveReaderScoreCache.remove_scores(hashes.content_hash, hashes.pixel_hash))
+        if self._perceptual_index is not None and len(removed) > 0:
+            self._perceptual_index = {perceptual_hash: content_hash for perceptual_hash, content_hash in self._perceptual_index.items() if content_hash not in removed}
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        '''Returns the hit and miss counters along with the overall hit rate.'''
+        with self._lock:
+            out: Dict[str, Union[int, float]] = dict(self._stats)
+        hits = out["content_hits"] + out["pixel_hits"] + out["perceptual_hits"]
+        out["hit_rate"] = hits / (hits + out["misses"]) if hits + out["misses"] > 0 else 0.0
+        return out
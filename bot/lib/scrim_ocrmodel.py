@@ -0,0 +1,89 @@
+import os, gc, glob, hashlib, importlib.util
+from typing import Any, List, Tuple, Union
+
+# Loads the OCR models and checks their files. Imported by the OCR worker processes and by the forkserver they are forked from, so like scrim_ocrworker
+# it must stay light: the engines themselves are only imported when a reader is loaded.
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+PRELOAD_ENVIRONMENT_VARIABLE: str = "SCRIM_OCR_PRELOAD" # Tells lib.scrim_ocrpreload which engine to load, "easyocr" or "paddle".
+
+_preloaded_reader: Any = None
+_preloaded_use_paddle: Union[bool, None] = None
+preload_error: Union[str, None] = None # Why preloading failed, reported by the workers since the forkserver has nowhere to log it.
+
+def load_reader(use_paddle: bool, use_gpu: bool) -> Any:
+    '''Loads the OCR model, downloading any files that are missing. The engines are imported here so that only the processes that read pay for them.'''
+    if use_paddle:
+        import paddleocr
+        return paddleocr.PaddleOCR(use_angle_cls=True, lang="en", show_log=False, use_gpu=use_gpu)
+    import easyocr
+    return easyocr.Reader(['en'], verbose=False, gpu=use_gpu)
+
+def _load_easyocr_config() -> Any:
+    '''Loads EasyOCR's config module on its own. Importing it through the package would import torch, which the bot process should never load.'''
+    spec = importlib.util.find_spec("easyocr")
+    if spec is None or spec.submodule_search_locations is None:
+        raise ImportError("EasyOCR is not installed.")
+    config_spec = importlib.util.spec_from_file_location("_scrim_easyocr_config", os.path.join(list(spec.submodule_search_locations)[0], "config.py"))
+    config = importlib.util.module_from_spec(config_spec)
+    config_spec.loader.exec_module(config)
+    return config
+
+def _file_md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 22), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def _verify_easyocr_cache() -> List[str]:
+    try:
+        config = _load_easyocr_config()
+    except ImportError as e:
+        return [str(e)]
+    model_directory = os.path.join(config.MODULE_PATH, "model")
+    problems = []
+    for model in (config.detection_models["craft"], config.recognition_models["gen2"]["english_g2"]): # The models easyocr.Reader(['en']) uses.
+        path = os.path.join(model_directory, model["filename"])
+        if not os.path.isfile(path):
+            problems.append(f"{model['filename']} is missing")
+        elif _file_md5(path) != model["md5sum"]:
+            problems.append(f"{model['filename']} is corrupt")
+    return problems
+
+def _verify_paddle_cache() -> List[str]:
+    model_directory = os.path.join(os.path.expanduser("~"), ".paddleocr", "whl")
+    problems = []
+    for model_type in ("det", "rec", "cls"): # PaddleOCR names the model folders after their version, so only check that each kind has a complete one.
+        if len(glob.glob(os.path.join(model_directory, model_type, "**", "inference.pdiparams"), recursive=True)) == 0:
+            problems.append(f"the {model_type} model is missing")
+    return problems
+
+def verify_model_cache(use_paddle: bool) -> List[str]:
+    '''Checks the model files on disk without loading a reader. Returns what is wrong with them, which is empty if they are all there and intact.'''
+    return _verify_paddle_cache() if use_paddle else _verify_easyocr_cache()
+
+def download_models(use_paddle: bool) -> None:
+    '''Downloads the models by loading a reader on the CPU and throwing it away. Run this in its own process, the bot process must not load the engines.'''
+    load_reader(use_paddle, False)
+
+def preload(use_paddle: bool) -> None:
+    '''Loads a CPU reader into this process so that processes forked from it share the weights instead of each loading their own.
+    Never raises: the forkserver calls this and must keep running if it fails, the workers then load their own models.'''
+    global _preloaded_reader, _preloaded_use_paddle, preload_error
+    try:
+        _preloaded_reader = load_reader(use_paddle, False)
+        _preloaded_use_paddle = use_paddle
+    except Exception as e:
+        preload_error = f"{type(e).__name__}: {e}"
+        return
+    gc.freeze() # Keeps the garbage collector from writing to the model's objects in the forked workers, which would give each worker a private copy of those pages.
+
+def get_reader(use_paddle: bool, use_gpu: bool) -> Tuple[Any, bool]:
+    '''Gets a reader for a worker: the preloaded one if this process was forked after preloading that engine, otherwise a newly loaded one.
+    Returns the reader and whether it is the shared one.'''
+    if _preloaded_reader is not None and _preloaded_use_paddle == use_paddle and not use_gpu:
+        return _preloaded_reader, True
+    return load_reader(use_paddle, use_gpu), False
@@ -0,0 +1,10 @@
+import os
+import lib.scrim_ocrmodel as scrim_ocrmodel
+
+# Only the forkserver that the OCR worker processes are forked from imports this module (see OCRReaderPool._prepare_models).
+# Importing it loads the OCR model once, before any worker exists, so every worker starts with the model already in memory and shares its pages.
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+elif os.environ.get(scrim_ocrmodel.PRELOAD_ENVIRONMENT_VARIABLE) in ("easyocr", "paddle"):
+    scrim_ocrmodel.preload(os.environ[scrim_ocrmodel.PRELOAD_ENVIRONMENT_VARIABLE] == "paddle")
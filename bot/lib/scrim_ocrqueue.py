@@ -0,0 +1,126 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Tuple, Union
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+class OCRQueueFullError(Exception):
+    def __init__(self, queued: int, guild_queued: int, guild_full: bool):
+        self.queued = queued
+        self.guild_queued = guild_queued
+        self.guild_full = guild_full # True if it was the guild's own limit that was reached rather than the whole queue's.
+        super().__init__(f"The OCR queue is full ({queued} queued, {guild_queued} from this guild).")
+
+class OCRTaskScheduler:
+    '''A bounded queue of OCR tasks that hands them out fairly instead of first come, first served.
+
+    Tasks are kept per guild and, within a guild, per channel. `get` takes one task from the next guild in turn, and from that guild the next channel in turn,
+    so a guild that posts 50 screenshots only delays another guild's screenshot by one task per round, not by 50. Tasks within a channel stay in order.
+    Priority tasks (from guilds with an active scrim) always go before the rest, with the same fairness among themselves.
+
+    At most `max_size` tasks are queued in total and at most `max_per_guild` from one guild. `put` raises `OCRQueueFullError` beyond that,
+    so callers can tell the user right away instead of buffering screenshots without limit. Thread-safe; `get` blocks until there is a task.'''
+    max_size: int
+    max_per_guild: int
+    _tiers: Tuple['OrderedDict[int, OrderedDict[int, Deque[Any]]]', ...] # Priority tier first. Guild ID -> channel ID -> tasks, both in the order they are served.
+    _guild_sizes: Dict[int, int]
+    _size: int
+    _closed: bool
+    _not_empty: threading.Condition
+
+    def __init__(self, max_size: int = 50, max_per_guild: int = 20):
+        self.max_size = max(1, max_size)
+        self.max_per_guild = min(max(1, max_per_guild), self.max_size)
+        self._tiers = (OrderedDict(), OrderedDict())
+        self._guild_sizes = {}
+        self._size = 0
+        self._closed = False
+        self._not_empty = threading.Condition()
+
+    @staticmethod
+    def _tasks_ahead(counts: List[Tuple[int, int]], key: int, own_ahead: int) -> int:
+        '''Counts the tasks served before a new task of `key` that has `own_ahead` tasks of its own key ahead of it, when one task is taken from
+        each key in turn. `counts` has each key's number of queued tasks, in the order the keys are served.'''
+        ahead = own_ahead
+        key_passed = False
+        for other_key, count in counts:
+            if other_key == key:
+                key_passed = True
+                continue
+            ahead += min(count, own_ahead) + (1 if count > own_ahead and not key_passed else 0)
+        return ahead
+
+    def _position(self, guild_id: int, channel_id: int, priority: bool) -> int:
+        '''Must be called with `_not_empty` held.'''
+        tier = self._tiers[0 if priority else 1]
+        channels = tier.get(guild_id, OrderedDict())
+        channel_tasks = channels.get(channel_id, ())
+        guild_ahead = self._tasks_ahead([(other_id, len(tasks)) for other_id, tasks in channels.items()], channel_id, len(channel_tasks))
+        ahead = self._tasks_ahead([(other_id, sum(len(tasks) for tasks in other_channels.values())) for other_id, other_channels in tier.items()], guild_id, guild_ahead)
+        if not priority:
+            ahead += sum(len(tasks) for channels in self._tiers[0].values() for tasks in channels.values())
+        return ahead + 1
+
+    def get_position(self, guild_id: int, channel_id: int, priority: bool = False) -> int:
+        '''Gets where a task put now would be served, counting from 1, if nothing else is added.
+        Raises `OCRQueueFullError` if it would be turned away instead.'''
+        with self._not_empty:
+            self._check_room(guild_id)
+            return self._position(guild_id, channel_id, priority)
+
+    def _check_room(self, guild_id: int) -> None:
+        guild_queued = self._guild_sizes.get(guild_id, 0)
+        if self._size >= self.max_size or guild_queued >= self.max_per_guild:
+            raise OCRQueueFullError(self._size, guild_queued, self._size < self.max_size)
+
+    def put(self, task: Any, guild_id: int, channel_id: int, priority: bool = False) -> int:
+        '''Queues a task. Returns its position in the queue, counting from 1, which later priority tasks may still move back.'''
+        with self._not_empty:
+            self._check_room(guild_id)
+            position = self._position(guild_id, channel_id, priority)
+            tier = self._tiers[0 if priority else 1]
+            tier.setdefault(guild_id, OrderedDict()).setdefault(channel_id, deque()).append(task)
+            self._guild_sizes[guild_id] = self._guild_sizes.get(guild_id, 0) + 1
+            self._size += 1
+            self._not_empty.notify()
+        return position
+
+    def get(self) -> Union[Any, None]:
+        '''Takes the next task, waiting for one if the queue is empty. Returns `None` once the scheduler is closed.'''
+        with self._not_empty:
+            while self._size == 0 and not self._closed:
+                self._not_empty.wait()
+            if self._closed:
+                return None
+            tier = self._tiers[0] if len(self._tiers[0]) > 0 else self._tiers[1]
+            guild_id, channels = next(iter(tier.items()))
+            channel_id, tasks = next(iter(channels.items()))
+            task = tasks.popleft()
+            if len(tasks) == 0:
+                del channels[channel_id]
+            else:
+                channels.move_to_end(channel_id)
+            if len(channels) == 0:
+                del tier[guild_id]
+            else:
+                tier.move_to_end(guild_id)
+            self._guild_sizes[guild_id] -= 1
+            if self._guild_sizes[guild_id] == 0:
+                del self._guild_sizes[guild_id]
+            self._size -= 1
+            return task
+
+    def qsize(self) -> int:
+        with self._not_empty:
+            return self._size
+
+    def get_guild_size(self, guild_id: int) -> int:
+        with self._not_empty:
+            return self._guild_sizes.get(guild_id, 0)
+
+    def close(self) -> None:
+        '''Wakes everything waiting in `get`, which then returns `None`. Queued tasks are dropped.'''
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify_all()
@@ -0,0 +1,177 @@
+import io, hashlib, threading, time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple, Union
+from PIL import Image
+from lib.scrim_logging import scrim_logger
+from lib.scrim_sqlite import DeceiveReaderResults, UUIDGenerator, BoolConvert, DatetimeConvert
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+lossless_image_formats: Tuple[str, ...] = ("PNG", "BMP", "TIFF") # Re-encoded as lossless WebP, which keeps every pixel. Lossy uploads are stored as they are, re-encoding them would only lose detail.
+
+class OCRResultRecord:
+    '''A score read from a screenshot, waiting to be written to ocr_reader_results.'''
+    __slots__ = ("result_id", "guild_id", "channel_id", "discord_id", "image_bytes", "content_hash", "image_url", "score", "read_at")
+    result_id: str
+    guild_id: int
+    channel_id: int
+    discord_id: int # The user who posted the screenshot. Resolved to their internal user ID when written.
+    image_bytes: bytes
+    content_hash: Union[str, None] # SHA-256 of `image_bytes`. Worked out on the writer thread if the dedup cache didn't already.
+    image_url: Union[str, None]
+    score: Tuple[int, int, int, bool, bool, bool, int]
+    read_at: datetime
+
+    def __init__(self, guild_id: int, channel_id: int, discord_id: int, image_bytes: bytes, score: Tuple[int, int, int, bool, bool, bool, int],
+                 image_url: Union[str, None] = None, content_hash: Union[str, None] = None):
+        self.result_id = UUIDGenerator.generate_uuid()
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.discord_id = discord_id
+        self.image_bytes = image_bytes
+        self.content_hash = content_hash
+        self.image_url = image_url
+        self.score = score
+        self.read_at = datetime.now(timezone.utc)
+
+    def to_params(self) -> Dict[str, Union[str, int, None]]:
+        '''Returns the named parameters `DeceiveReaderResults.add_results` takes.'''
+        return {"result_id": self.result_id, "guild_id": self.guild_id, "channel_id": self.channel_id, "discord_id": self.discord_id,
+                "content_hash": self.content_hash, "image_url": self.image_url, "total_score": self.score[0], "elimination_score": self.score[1],
+                "vault_terminal_score": self.score[2], "entered_vault": BoolConvert.convert_bool_to_int(self.score[3]),
+                "last_spy_standing": BoolConvert.convert_bool_to_int(self.score[4]), "extracted": BoolConvert.convert_bool_to_int(self.score[5]),
+                "allies_revived": self.score[6], "calculation_time": DatetimeConvert.convert_datetime_to_str(self.read_at)}
+
+def compress_image(image_bytes: bytes) -> Tuple[bytes, str]:
+    '''Gets the bytes to store for a screenshot and their format. Lossless screenshots are re-encoded as lossless WebP with the fastest settings,
+    which roughly halves a 1080p mission report PNG in about a quarter of a second. Anything else, or anything that doesn't come out smaller, is kept as uploaded.'''
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        source_format = (image.format or "unknown").lower()
+        if image.format not in lossless_image_formats:
+            return image_bytes, source_format
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        out = io.BytesIO()
+        image.save(out, format="WEBP", lossless=True, method=0, quality=0)
+        if out.tell() < len(image_bytes):
+            return out.getvalue(), "webp"
+        return image_bytes, source_format
+    except Exception: # Unreadable, or too large for WebP. Still worth keeping.
+        return image_bytes, "unknown"
+
+class OCRResultWriter:
+    '''Writes reader results to the database in the background, so replying to a screenshot never waits on a database write.
+
+    `add` only queues the result. A writer thread wakes every `flush_interval_seconds`, or as soon as `batch_size` results are waiting,
+    compresses the screenshots that aren't stored yet and writes the whole batch in one transaction. At most `max_pending` results are held;
+    past that new results are dropped and counted, rather than holding screenshots in memory while the database is unavailable.
+    A batch that fails to write is retried on the next flush, up to `max_attempts` times.'''
+    flush_interval_seconds: float
+    batch_size: int
+    max_pending: int
+    max_attempts: int
+    _pending: List[OCRResultRecord]
+    _condition: threading.Condition
+    _closed: bool
+    _failed_attempts: int
+    _thread: threading.Thread
+    _stats: Dict[str, int]
+
+    def __init__(self, flush_interval_seconds: float = 5.0, batch_size: int = 50, max_pending: int = 200, max_attempts: int = 3):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(self.batch_size, max_pending)
+        self.max_attempts = max(1, max_attempts)
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._failed_attempts = 0
+        self._stats = {"written": 0, "skipped": 0, "dropped": 0, "failed_flushes": 0, "images_stored": 0, "image_bytes_uploaded": 0, "image_bytes_stored": 0, "last_flush_ms": 0}
+        self._thread = threading.Thread(target=self._run, name="OCRResultWriter", daemon=True)
+        self._thread.start()
+
+    def add(self, record: OCRResultRecord) -> None:
+        '''Queues a result to be written. Never blocks on the database.'''
+        with self._condition:
+            if self._closed or len(self._pending) >= self.max_pending:
+                if self._stats["dropped"] == 0:
+                    scrim_logger.warning(f"OCR result writer is {'closed' if self._closed else 'full'}, results are being dropped.")
+                self._stats["dropped"] += 1
+                return
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval_seconds
+                while not self._closed and len(self._pending) < self.batch_size and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+                records = self._pending
+                self._pending = []
+                closed = self._closed
+            if len(records) > 0:
+                for i in range(0, len(records), self.batch_size):
+                    self._write(records[i:i + self.batch_size])
+            if closed:
+                return
+
+    def _write(self, records: List[OCRResultRecord]) -> None:
+        start = time.perf_counter()
+        for record in records:
+            if record.content_hash is None:
+                record.content_hash = hashlib.sha256(record.image_bytes).hexdigest()
+        try:
+            unique_records = {record.content_hash: record for record in records}
+            stored = DeceiveReaderResults.get_stored_image_hashes(list(unique_records))
+            images: List[Tuple[str, bytes, str, int]] = []
+            for content_hash, record in unique_records.items():
+                if content_hash not in stored:
+                    image, image_format = compress_image(record.image_bytes)
+                    images.append((content_hash, image, image_format, len(record.image_bytes)))
+            written = DeceiveReaderResults.add_results([record.to_params() for record in records], images)
+        except Exception as e:
+            self._failed_attempts += 1
+            with self._condition:
+                self._stats["failed_flushes"] += 1
+                if self._failed_attempts < self.max_attempts and not self._closed:
+                    self._pending[:0] = records # Retried first on the next flush.
+                    scrim_logger.warning(f"Failed to write {len(records)} OCR results, retrying on the next flush: {e}")
+                    return
+                self._stats["dropped"] += len(records)
+            scrim_logger.error(f"Dropped {len(records)} OCR results after {self._failed_attempts} failed writes: {e}")
+            self._failed_attempts = 0
+            return
+        self._failed_attempts = 0
+        with self._condition:
+            self._stats["written"] += written
+            self._stats["skipped"] += len(records) - written
+            self._stats["images_stored"] += len(images)
+            self._stats["image_bytes_uploaded"] += sum(image[3] for image in images)
+            self._stats["image_bytes_stored"] += sum(len(image[1]) for image in images)
+            self._stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000)
+        scrim_logger.debug(f"Wrote {written} OCR results and {len(images)} screenshots in {(time.perf_counter() - start) * 1000:.0f}ms.")
+
+    def get_pending(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        '''Returns the write counters, the number of results waiting and how large the stored screenshots are compared to the uploads.'''
+        with self._condition:
+            out: Dict[str, Union[int, float]] = dict(self._stats)
+            out["pending"] = len(self._pending)
+        out["image_size_ratio"] = out["image_bytes_stored"] / out["image_bytes_uploaded"] if out["image_bytes_uploaded"] > 0 else 1.0
+        return out
+
+    def close(self, timeout_seconds: float = 10.0) -> None:
+        '''Writes whatever is still waiting and stops the writer thread. Safe to call more than once.'''
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout_seconds)
+        if self._thread.is_alive():
+            scrim_logger.warning("OCR result writer did not finish writing before shutdown.")
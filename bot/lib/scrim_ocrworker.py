@@ -0,0 +1,224 @@
+import io, threading, time
+import cv2
+import numpy as np
+from queue import Queue, Empty
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Tuple, Union
+from PIL import Image
+import lib.scrim_imageprocessing as scrim_imageprocessing
+import lib.scrim_ocrmodel as scrim_ocrmodel
+
+# This module is imported by the OCR worker processes. Keep its imports light: nothing here may touch the database, Discord or the argument parser.
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+class OCRRequest:
+    '''A screenshot sent to an OCR worker process. Only plain data crosses the process boundary, never Discord objects.'''
+    __slots__ = ("task_id", "image_bytes")
+    task_id: str
+    image_bytes: bytes
+
+    def __init__(self, task_id: str, image_bytes: bytes):
+        self.task_id = task_id
+        self.image_bytes = image_bytes
+
+class OCRResult:
+    '''What an OCR worker sends back for one request: the recognised lines of text, or the error that stopped it, plus the size and run time of the batch
+    it was read in and how long each stage took for this image.'''
+    __slots__ = ("task_id", "text", "error", "batch_size", "batch_seconds", "stage_seconds")
+    task_id: str
+    text: Union[List[str], None]
+    error: Union[str, None]
+    batch_size: int
+    batch_seconds: float
+    stage_seconds: Dict[str, float]
+
+    def __init__(self, task_id: str, text: Union[List[str], None] = None, error: Union[str, None] = None):
+        self.task_id = task_id
+        self.text = text
+        self.error = error
+        self.batch_size = 1
+        self.batch_seconds = 0.0
+        self.stage_seconds = {}
+
+class OCRWorkerReady:
+    '''Sent once by an OCR worker when its model is loaded and warmed up, before it answers any requests.'''
+    __slots__ = ("shared_model", "load_seconds", "warm_up_seconds", "preload_error")
+    shared_model: bool
+    load_seconds: float
+    warm_up_seconds: float
+    preload_error: Union[str, None]
+
+    def __init__(self, shared_model: bool, load_seconds: float, warm_up_seconds: float, preload_error: Union[str, None] = None):
+        self.shared_model = shared_model
+        self.load_seconds = load_seconds
+        self.warm_up_seconds = warm_up_seconds
+        self.preload_error = preload_error
+
+def decode_image(image_bytes: bytes) -> np.ndarray:
+    '''Decodes a screenshot straight to a greyscale array, which is all the rest of the pipeline needs.'''
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None: # Formats OpenCV can't read, such as GIF.
+        image = np.array(Image.open(io.BytesIO(image_bytes)).convert("L"))
+    return image
+
+def resize_shortest_side(image: np.ndarray, size: int) -> np.ndarray:
+    '''Shrinks an image so that the shortest side is `size`. Smaller images are returned as they are.'''
+    height, width = image.shape[:2]
+    if min(width, height) <= size:
+        return image
+    if width < height:
+        new_width, new_height = size, int(height * size / width)
+    else:
+        new_width, new_height = int(width * size / height), size
+    return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+def prepare_image(image_bytes: bytes, stage_seconds: Union[Dict[str, float], None] = None) -> np.ndarray:
+    '''Decodes a screenshot and cleans it up for OCR. The image stays one greyscale array from decode to OCR.
+    If `stage_seconds` is given, the time spent in each stage is added to it.'''
+    stage_seconds = {} if stage_seconds is None else stage_seconds
+    stage_start = time.perf_counter()
+    def end_stage(name: str) -> None:
+        nonlocal stage_start
+        now = time.perf_counter()
+        stage_seconds[name] = stage_seconds.get(name, 0.0) + now - stage_start
+        stage_start = now
+    image = decode_image(image_bytes)
+    end_stage("decode")
+    image = resize_shortest_side(image, 1080)
+    end_stage("resize")
+    image = scrim_imageprocessing.crop_array_to_mission_report(image) # Only the score rows matter. Falls back to the whole screenshot if the panel isn't found.
+    end_stage("crop")
+    image = scrim_imageprocessing.binarize_array(image)
+    end_stage("binarize")
+    image = scrim_imageprocessing.sharpen_array(image)
+    end_stage("sharpen")
+    return image
+
+def read_text_batch(reader: Any, use_paddle: bool, images: List[np.ndarray]) -> List[List[str]]:
+    '''Runs OCR on prepared greyscale images and returns the lines of text found in each, in order. The arrays are passed to the engine as they are.
+
+    EasyOCR can only batch images of the same size, so images are grouped by size first. Screenshots from the same monitor usually share one.
+    PaddleOCR has no multi-image detection, so it reads them one at a time; it already batches the text it finds within each image.'''
+    if use_paddle:
+        texts = []
+        for image in images:
+            result = reader.ocr(cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), cls=True)[0] # PaddleOCR expects three channels.
+            texts.append([detection[1][0] for detection in (result or [])])
+        return texts
+    texts: List[Union[List[str], None]] = [None] * len(images)
+    groups: Dict[Tuple[int, ...], List[int]] = {}
+    for index, image in enumerate(images):
+        groups.setdefault(image.shape, []).append(index)
+    for indices in groups.values():
+        if len(indices) == 1:
+            group_results = [reader.readtext(images[indices[0]])]
+        else:
+            group_results = reader.readtext_batched([images[index] for index in indices])
+        for index, detections in zip(indices, group_results):
+            texts[index] = [detection[1] for detection in detections]
+    return texts
+
+def warm_up(reader: Any, use_paddle: bool) -> None:
+    '''Reads a small generated line of text, so the engine sets itself up now instead of on the first real screenshot.'''
+    image = np.full((64, 480), 255, dtype=np.uint8)
+    cv2.putText(image, "MISSION REPORT 12", (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+    read_text_batch(reader, use_paddle, [image])
+
+def _error_text(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}"
+
+def read_batch(reader: Any, use_paddle: bool, use_gpu: bool, requests: List[OCRRequest]) -> Tuple[List[OCRResult], Any]:
+    '''Reads a batch of requests with one OCR call where possible. Returns a result for every request, in order, along with the reader to use from now on.
+
+    If the batched call fails the reader is reloaded and the images are retried one at a time, so one bad screenshot can't fail the rest.'''
+    start_time = time.perf_counter()
+    results: Dict[str, OCRResult] = {}
+    images: Dict[str, np.ndarray] = {}
+    stage_seconds: Dict[str, Dict[str, float]] = {}
+    for request in requests:
+        stage_seconds[request.task_id] = {}
+        try:
+            images[request.task_id] = prepare_image(request.image_bytes, stage_seconds[request.task_id])
+        except Exception as e:
+            results[request.task_id] = OCRResult(request.task_id, error=_error_text(e))
+    ocr_start_time = time.perf_counter()
+    try:
+        for task_id, text in zip(images.keys(), read_text_batch(reader, use_paddle, list(images.values()))):
+            results[task_id] = OCRResult(task_id, text=text)
+    except Exception as e:
+        reader = None # Clear out and then reload the reader to clear any issues.
+        reader = scrim_ocrmodel.load_reader(use_paddle, use_gpu)
+        if len(images) == 1:
+            task_id = next(iter(images))
+            results[task_id] = OCRResult(task_id, error=_error_text(e))
+        else:
+            for task_id, image in images.items():
+                try:
+                    results[task_id] = OCRResult(task_id, text=read_text_batch(reader, use_paddle, [image])[0])
+                except Exception as e:
+                    results[task_id] = OCRResult(task_id, error=_error_text(e))
+                    reader = None
+                    reader = scrim_ocrmodel.load_reader(use_paddle, use_gpu)
+    end_time = time.perf_counter()
+    ocr_seconds_per_image = (end_time - ocr_start_time) / len(images) if len(images) > 0 else 0.0
+    ordered_results = [results[request.task_id] for request in requests]
+    for result in ordered_results:
+        result.batch_size = len(requests)
+        result.batch_seconds = end_time - start_time
+        result.stage_seconds = stage_seconds[result.task_id]
+        if result.task_id in images:
+            result.stage_seconds["ocr"] = ocr_seconds_per_image # The engine reads the whole batch at once, so each image gets an equal share.
+    return ordered_results, reader
+
+def _receive_requests(connection: Connection, requests: Queue) -> None:
+    '''Moves requests off the pipe as soon as they arrive, so the parent never blocks on a full pipe while this worker is busy.'''
+    try:
+        while True:
+            request = connection.recv()
+            requests.put(request)
+            if request is None:
+                return
+    except (EOFError, OSError): # The parent went away.
+        requests.put(None)
+
+def _next_batch(requests: Queue, batch_size: int, batch_wait_seconds: float) -> List[Union[OCRRequest, None]]:
+    '''Blocks until a request arrives, then keeps collecting until there are `batch_size` of them or `batch_wait_seconds` have passed.
+    A `None` (stop) always ends the batch.'''
+    batch = [requests.get()]
+    deadline = time.monotonic() + batch_wait_seconds
+    while len(batch) < batch_size and batch[-1] is not None:
+        try:
+            batch.append(requests.get(timeout=max(0.0, deadline - time.monotonic())))
+        except Empty:
+            break
+    return batch
+
+def run_ocr_worker(connection: Connection, worker_name: str, use_paddle: bool, use_gpu: bool, batch_size: int = 1, batch_wait_seconds: float = 0.0) -> None:
+    '''Entry point of an OCR worker process. Reads `OCRRequest`s from the pipe in batches of up to `batch_size` and answers each batch with a list of `OCRResult`s
+    until it receives `None`. Sends an `OCRWorkerReady` first, once the model is loaded and warmed up.'''
+    start_time = time.perf_counter()
+    reader, shared_model = scrim_ocrmodel.get_reader(use_paddle, use_gpu)
+    loaded_time = time.perf_counter()
+    warm_up(reader, use_paddle)
+    try:
+        connection.send(OCRWorkerReady(shared_model, loaded_time - start_time, time.perf_counter() - loaded_time, scrim_ocrmodel.preload_error))
+    except (BrokenPipeError, OSError):
+        return
+    requests: Queue = Queue()
+    threading.Thread(target=_receive_requests, args=(connection, requests), name=f"{worker_name}_receiver", daemon=True).start()
+    while True:
+        batch = _next_batch(requests, batch_size, batch_wait_seconds)
+        stopping = batch[-1] is None
+        if stopping:
+            batch.pop()
+        if len(batch) > 0:
+            results, reader = read_batch(reader, use_paddle, use_gpu, batch)
+            try:
+                connection.send(results)
+            except (BrokenPipeError, OSError):
+                break
+        if stopping:
+            break
+    connection.close()
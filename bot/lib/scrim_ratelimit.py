@@ -0,0 +1,117 @@
+import asyncio, time, random
+from typing import Dict, Union
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+class TokenBucket:
+    '''An asyncio token bucket. Allows bursts of up to `capacity` requests, then `rate_per_second` on average. Waiters are served in the order they arrived.'''
+    rate_per_second: float
+    capacity: float
+    _tokens: float
+    _last_refill: float
+    _paused_until: float
+    _lock: asyncio.Lock
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        if rate_per_second <= 0 or capacity < 1:
+            raise ValueError("A token bucket needs a positive rate and room for at least one token.")
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+
+    async def acquire(self) -> float:
+        '''Waits until a token is available and takes it.
+        ### Returns
+        * `float` - How many seconds the caller was held back, or exactly `0` if a token was free straight away.'''
+        start = time.monotonic()
+        waited = self._lock.locked()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    waited = True
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return time.monotonic() - start if waited else 0.0
+                waited = True
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+    def pause(self, seconds: float) -> None:
+        '''Holds back every caller for `seconds`, e.g. when the server answers with `Retry-After`. The bucket starts empty once the pause ends.'''
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._last_refill = self._paused_until
+
+    def get_available_tokens(self) -> float:
+        now = time.monotonic()
+        if now < self._paused_until:
+            return 0.0
+        return min(self.capacity, self._tokens + (now - self._last_refill) * self.rate_per_second)
+
+class CircuitBreaker:
+    '''Stops calls to a failing dependency for a while instead of letting every caller wait on it to time out.
+
+    After `failure_threshold` failures in a row the circuit opens and requests are refused. Once `reset_timeout_seconds` have passed it is half open:
+    requests are let through again, and the first result either closes the circuit or opens it for another timeout.'''
+    CLOSED: str = "closed"
+    OPEN: str = "open"
+    HALF_OPEN: str = "half_open"
+
+    failure_threshold: int
+    reset_timeout_seconds: float
+    _consecutive_failures: int
+    _opened_at: Union[float, None]
+    _times_opened: int
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._times_opened = 0
+
+    def get_state(self) -> str:
+        if self._opened_at is None:
+            return CircuitBreaker.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout_seconds:
+            return CircuitBreaker.HALF_OPEN
+        return CircuitBreaker.OPEN
+
+    def allow_request(self) -> bool:
+        return self.get_state() != CircuitBreaker.OPEN
+
+    def get_retry_after_seconds(self) -> float:
+        '''How long until the circuit lets requests through again.'''
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout_seconds - time.monotonic())
+
+    def record_success(self) -> None:
+        self._consecutive_failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._consecutive_failures += 1
+        state = self.get_state()
+        if state == CircuitBreaker.HALF_OPEN or (state == CircuitBreaker.CLOSED and self._consecutive_failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            self._times_opened += 1
+
+    def get_stats(self) -> Dict[str, Union[str, int, float]]:
+        return {"state": self.get_state(), "consecutive_failures": self._consecutive_failures, "times_opened": self._times_opened, "retry_after_seconds": self.get_retry_after_seconds()}
+
+def get_backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    '''Gets how long to wait before retry number `attempt` (starting at 0), using exponential backoff with full jitter so that retrying clients spread out.'''
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
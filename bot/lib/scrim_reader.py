@@ -1,28 +1,27 @@
-import os, sys, io, re, warnings, multiprocessing
-from typing import Union, List
+import os, sys, io, re, math, asyncio, warnings, multiprocessing, threading, time, uuid, atexit, importlib.util
+from typing import Union, List, Dict, Set, Callable, Tuple
 from datetime import datetime, timedelta
 from threading import Thread
-from PIL import Image
-from queue import Queue
+from multiprocessing.connection import Connection, wait
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import lib.scrim_sysinfo as scrim_sysinfo
 from lib.scrim_logging import scrim_logger
-from lib.scrim_sqlite import ScrimUserData, DeceiveReaderActiveChannels
+from lib.scrim_sqlite import DeceiveReaderActiveChannels
+from lib.scrim_sqlite_async import AsyncScrimUserData, AsyncScrimsData
 from lib.scrim_args import ScrimArgs
-import lib.scrim_imageprocessing as scrim_imageprocessing
+from lib.scrim_metrics import ocr_throughput_monitor, ocr_delivery_latency_histogram
+import lib.scrim_ocrworker as scrim_ocrworker
+import lib.scrim_ocrmodel as scrim_ocrmodel
+import lib.scrim_ocrdedup as scrim_ocrdedup
+import lib.scrim_ocrqueue as scrim_ocrqueue
+import lib.scrim_ocrresults as scrim_ocrresults
 
-is_paddle_active: bool = False
-
-try:
-    import paddleocr
-    scrim_logger.info("PaddleOCR loaded.")
-    is_paddle_active = True
-    paddleocr_reader = paddleocr.PaddleOCR(use_angle_cls=True, lang="en", use_gpu=scrim_sysinfo.system_has_gpu()) # We load this to make sure the model is downloaded.
-except ImportError as e:
-    print(e)
+is_paddle_active: bool = importlib.util.find_spec("paddleocr") is not None # Only checks that PaddleOCR is installed. The models are loaded by the worker processes.
+if is_paddle_active:
+    scrim_logger.info("PaddleOCR found.")
+else:
     scrim_logger.warning("PaddleOCR is not installed. Defaulting to EasyOCR instead.")
-import easyocr
 
 channel_id_list: List[int] = []
 for i in channel_id_list:
@@ -169,6 +168,21 @@ class MatchScore:
             out += f"* {self._print_extracted_score()}\n"
         return out
 
+    def to_row(self) -> Tuple[int, int, int, bool, bool, bool, int]:
+        '''Returns the score in the column order of the reader tables: total, eliminations, vault terminals disabled, vault entered, last spy standing, extracted, allies revived.'''
+        return (self.total_score, self.eliminations, self.vault_terminals_disabled, self.vault_entered, self.last_spy_standing, self.extracted, self.allies_revived)
+
+    @staticmethod
+    def from_row(row: Tuple[int, int, int, bool, bool, bool, int]) -> 'MatchScore':
+        '''Rebuilds a score stored with `to_row`.'''
+        match_score = MatchScore(row[0])
+        match_score.eliminations, match_score.vault_terminals_disabled, match_score.vault_entered = row[1], row[2], row[3]
+        match_score.last_spy_standing, match_score.extracted, match_score.allies_revived = row[4], row[5], row[6]
+        match_score.eliminations_known = match_score.eliminations != -1
+        match_score.terminals_disabled_known = match_score.vault_terminals_disabled != -1
+        match_score.allies_revived_known = match_score.allies_revived != -1
+        return match_score
+
     def create_embed(self, image_url: Union[str, None] = None) -> discord.Embed:
         emb: discord.Embed = discord.Embed(title=f"Estimated Score: {self.total_score}", color=0x8000ff, timestamp=datetime.now())
         emb.description = "**NOTE: Score Is Uncertain! Please Manually Verify Results!**" if self.is_score_uncertain() else ""
@@ -194,17 +208,16 @@ class MatchScore:
         return emb
 
 class ImageProcessError:
-    image: Image
+    image_bytes: bytes
     message: discord.Message
     attachment_url: str
+    received_at: float # time.monotonic() timestamp
 
-    def __init__(self, image: Image, message: discord.Message, attachment_url: str):
-        if isinstance(image, Image.Image):
-            self.image = image
-        else:
-            self.image = Image.open(io.BytesIO(image))
+    def __init__(self, image_bytes: bytes, message: discord.Message, attachment_url: str, received_at: Union[float, None] = None):
+        self.image_bytes = image_bytes
         self.message = message
         self.attachment_url = attachment_url
+        self.received_at = time.monotonic() if received_at is None else received_at
 
     def create_embed(self) -> discord.Embed:
         emb: discord.Embed = discord.Embed(title="Error Processing Image", color=0xff0000, timestamp=datetime.now())
@@ -215,59 +228,102 @@ class ImageProcessError:
         return emb
 
 class ImageProcessTask:
-    image: Image
+    task_id: str
+    image_bytes: bytes # Left undecoded, the worker process decodes it.
     message: discord.Message
     attachment_url: str
     score: MatchScore
+    received_at: float # time.monotonic() timestamp of when the bot saw the attachment
+    queued_at: float # time.monotonic() timestamp
+    image_hashes: Union[scrim_ocrdedup.ImageHashes, None] # Set when the score should be cached once it is read.
+    author_id: Union[int, None] # Discord ID of whoever posted the screenshot. `message` is the bot's reply.
 
-    def __init__(self, image: Image, message: discord.Message, attachment_url: Union[str, None] = None):
-        self.image = image if type(image) == Image else Image.open(io.BytesIO(image))
+    def __init__(self, image_bytes: bytes, message: discord.Message, attachment_url: Union[str, None] = None, image_hashes: Union[scrim_ocrdedup.ImageHashes, None] = None, received_at: Union[float, None] = None, author_id: Union[int, None] = None):
+        self.task_id = uuid.uuid4().hex
+        self.queued_at = time.monotonic()
+        self.received_at = self.queued_at if received_at is None else received_at
+        self.image_bytes = image_bytes
         self.message = message
         self.score = MatchScore(0)
         self.attachment_url = attachment_url
+        self.image_hashes = image_hashes
+        self.author_id = author_id
 
     async def edit_message(self, content: str, embed: discord.Embed):
         await self.message.edit(content=content, embed=embed)
 
 class OCRReaderProcess:
-    easyocr_reader: 'easyocr.Reader'
-    paddleocr_reader = 'paddleOCR.PaddleOCR'
-    read_queue: Queue
-    results_queue: Queue
-    error_queue: Queue
-    thread: Thread
-    thread_name: str
-    ocr_ready: bool
-
-    def __init__(self, read_queue: Queue, results_queue: Queue, error_queue: Queue, thread_name: str):
-        self.read_queue = read_queue
-        self.results_queue = results_queue
-        self.error_queue = error_queue
-        self.thread_name = thread_name
-        self.ocr_ready = False
-        self.thread = Thread(target=self._read_image_process, name=self.thread_name)
-        self.thread.start()
-
-    def _resize_image_shortest_side(self, img: Image, size: int) -> Image:
-        '''Resizes an image so that the shortest side is a certain size.
-        ### Parameters
-        `img` : Image - The image to resize.
-        `size` : int - The size of the shortest side.'''
-        if min(img.size) <= size:
-            scrim_logger.debug("Image is already smaller than the target size.")
-            return img
-        width, height = img.size
-        new_height, new_width = 0, 0
-        if width < height:
-            ratio = size / width
-            new_width = size
-            new_height = int(height * ratio)
-        else:
-            ratio = size / height
-            new_height = size
-            new_width = int(width * ratio)
-        scrim_logger.debug(f"Resizing Image to {new_width}x{new_height}")
-        return img.resize((new_width, new_height))
+    '''Parent-side handle of one OCR worker process. The OCR model runs in the child; the text it sends back is turned into a score here.'''
+    mp_context: multiprocessing.context.BaseContext
+    process: Union[multiprocessing.process.BaseProcess, None]
+    connection: Union[Connection, None]
+    process_name: str
+    use_paddle: bool
+    use_gpu: bool
+    batch_size: int
+    batch_wait_seconds: float
+    in_flight: Dict[str, ImageProcessTask]
+    restarts: int
+    started_at: float
+    ready: bool # Set once the worker reports that its model is loaded and warmed up. Tasks only go to ready workers.
+    retiring: bool # Set when the pool scales down and stops this worker. It gets no more tasks and is removed once it exits.
+    idle_since: float # When it last ran out of tasks.
+    exit_reported: bool
+    _send_lock: threading.Lock
+
+    def __init__(self, mp_context: multiprocessing.context.BaseContext, process_name: str, use_paddle: bool, use_gpu: bool, batch_size: int = 1, batch_wait_seconds: float = 0.0):
+        self.mp_context = mp_context
+        self.process = None
+        self.connection = None
+        self.process_name = process_name
+        self.use_paddle = use_paddle
+        self.use_gpu = use_gpu
+        self.batch_size = batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.in_flight = {}
+        self.restarts = 0
+        self.started_at = 0.0
+        self.ready = False
+        self.retiring = False
+        self.idle_since = 0.0
+        self.exit_reported = False
+        self._send_lock = threading.Lock()
+        self.start()
+
+    def start(self) -> None:
+        '''Starts the worker process with a fresh pipe. Anything the previous process was working on must already have been handled.'''
+        parent_connection, child_connection = self.mp_context.Pipe(duplex=True)
+        self.process = self.mp_context.Process(target=scrim_ocrworker.run_ocr_worker, args=(child_connection, self.process_name, self.use_paddle, self.use_gpu, self.batch_size, self.batch_wait_seconds), name=self.process_name, daemon=True)
+        self.process.start()
+        child_connection.close() # Only the child uses its end. Closing ours lets recv() raise EOFError if the child dies.
+        self.connection = parent_connection
+        self.in_flight = {}
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.retiring = False
+        self.idle_since = self.started_at
+        self.exit_reported = False
+        scrim_logger.debug(f"Started OCR Reader Process {self.process_name} (PID {self.process.pid}).")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def send(self, task: 'ImageProcessTask') -> None:
+        '''Sends a task to the worker. The caller must already have added it to `in_flight`.'''
+        with self._send_lock:
+            self.connection.send(scrim_ocrworker.OCRRequest(task.task_id, task.image_bytes))
+
+    def stop(self) -> None:
+        '''Asks the worker to exit once it has finished the requests it already has.'''
+        with self._send_lock:
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
 
     def _find_num_eliminations(self, text: Union[List[str], str, None]) -> Union[int, None]:
         '''Finds the number of eliminations in a list of strings.'''
@@ -447,274 +503,444 @@ class OCRReaderProcess:
         scrim_logger.debug(f"Calculated Match Score: {str(match_score.total_score)}")
         return match_score
 
-    def _read_image_process(self):
-        '''The main image processing loop for the OCR reader process.'''
-        scrim_logger.debug(f"Starting OCR Reader Process for Thread: {self.thread_name}")
-        
-        if is_paddle_active:
-            self.paddle_reader = paddleocr.PaddleOCR(use_angle_cls=True, lang="en", show_log=False, use_gpu=scrim_sysinfo.system_has_gpu())
-        else:
-            self.easyocr_reader = easyocr.Reader(['en'], verbose=False, gpu=scrim_sysinfo.system_has_gpu())
-        scrim_logger.debug(f"OCR Reader Process Initialized for Thread: {self.thread_name}")
-        self.ocr_ready = True
-        image_task: ImageProcessTask = None
+class OCRReaderPool:
+    '''Runs OCR on real worker processes so the models don't compete with the bot for the GIL.
+
+    A dispatcher thread takes tasks from `read_queue`, in the order its scheduler hands them out, and gives each one to a worker with free capacity. Each worker holds up to `batch_size` tasks and reads
+    them in one batched OCR call, waiting up to `batch_wait_seconds` for a batch to fill. A collector thread gathers the results, turns them into scores
+    and passes them on. It also notices workers that crash, reports their tasks as failed and restarts them.
+
+    The pool scales between `min_workers` and `max_workers`. Once a second the collector estimates how long the backlog (queued and in-flight tasks)
+    would take at the recent per-image OCR time, and starts enough workers to bring that under `target_wait_seconds`. Workers that have had nothing
+    to do for `idle_seconds` are stopped, down to `min_workers`, which frees their memory.
+
+    Before any worker starts, the model files are checked and, if needed, downloaded once. With the forkserver start method on the CPU the model is then
+    loaded once in the forkserver and every worker is forked from it, sharing the weights instead of loading a copy each.'''
+    read_queue: scrim_ocrqueue.OCRTaskScheduler
+    workers: List[OCRReaderProcess]
+    worker_capacity: int
+    min_workers: int
+    max_workers: int
+    idle_seconds: float
+    target_wait_seconds: float
+    seconds_per_image: Union[float, None] # Moving average of OCR time per image, from the batches workers send back.
+    on_result: Callable[[ImageProcessTask], None]
+    on_error: Callable[[ImageProcessError], None]
+    _capacity: threading.Condition
+    _closing: bool
+    _started_at: float
+    _all_ready_reported: bool
+    _preload_error_reported: bool
+    _mp_context: multiprocessing.context.BaseContext
+    _worker_args: Tuple[bool, bool, int, float] # use_paddle, use_gpu, batch_size and batch_wait_seconds for new workers.
+    _next_worker_number: int
+    _dispatcher: Thread
+    _collector: Thread
+
+    def __init__(self,
+                 read_queue: scrim_ocrqueue.OCRTaskScheduler,
+                 on_result: Callable[[ImageProcessTask], None],
+                 on_error: Callable[[ImageProcessError], None],
+                 min_workers: int,
+                 max_workers: int,
+                 start_method: str,
+                 use_paddle: bool,
+                 use_gpu: bool,
+                 batch_size: int = 1,
+                 batch_wait_seconds: float = 0.0,
+                 idle_seconds: float = 300.0,
+                 target_wait_seconds: float = 15.0):
+        self.read_queue = read_queue
+        self.on_result = on_result
+        self.on_error = on_error
+        self.worker_capacity = batch_size # A worker with a full batch gets nothing more until it answers, so a burst spreads over all the workers.
+        self.max_workers = max(1, max_workers)
+        self.min_workers = min(max(0, min_workers), self.max_workers)
+        self.idle_seconds = idle_seconds
+        self.target_wait_seconds = target_wait_seconds
+        self.seconds_per_image = None
+        self._capacity = threading.Condition()
+        self._closing = False
+        self._started_at = time.monotonic()
+        self._all_ready_reported = False
+        self._preload_error_reported = False
+        self._mp_context = multiprocessing.get_context(start_method)
+        self._worker_args = (use_paddle, use_gpu, batch_size, batch_wait_seconds)
+        self._next_worker_number = 0
+        self._prepare_models(self._mp_context, use_paddle, use_gpu)
+        scrim_logger.debug(f"Attempting to spawn {self.min_workers} OCR Reader Processes (scaling up to {self.max_workers}) using the {start_method} start method...")
+        self.workers = []
+        for _ in range(self.min_workers):
+            self._start_worker()
+        self._dispatcher = Thread(target=self._dispatch_loop, name="OCRReaderDispatcher", daemon=True)
+        self._collector = Thread(target=self._collect_loop, name="OCRReaderCollector", daemon=True)
+        self._dispatcher.start()
+        self._collector.start()
+
+    @staticmethod
+    def _prepare_models(mp_context: multiprocessing.context.BaseContext, use_paddle: bool, use_gpu: bool) -> None:
+        '''Makes sure the model files are on disk before any worker starts, so the workers don't all download them at once,
+        and sets up the forkserver to preload the model when the workers can share it.'''
+        problems = scrim_ocrmodel.verify_model_cache(use_paddle)
+        if len(problems) > 0:
+            scrim_logger.info(f"The OCR model cache is incomplete ({', '.join(problems)}). Downloading the models, this may take several minutes...")
+            downloader = multiprocessing.get_context("spawn").Process(target=scrim_ocrmodel.download_models, args=(use_paddle,), name="OCRModelDownload", daemon=True) # Keeps the engine out of the bot process.
+            downloader.start()
+            downloader.join()
+            problems = scrim_ocrmodel.verify_model_cache(use_paddle)
+            if len(problems) > 0:
+                scrim_logger.error(f"The OCR models could not be downloaded ({', '.join(problems)}). The OCR Reader Processes will try again as they start.")
+                return
+        scrim_logger.debug("OCR model cache verified.")
+        if mp_context.get_start_method() != "forkserver":
+            scrim_logger.debug("OCR Reader Processes each load their own model. Use the forkserver start method to share one.")
+            return
+        if use_gpu:
+            scrim_logger.debug("OCR Reader Processes each load their own model, a model on the GPU can't be shared between forked processes.")
+            return
+        os.environ[scrim_ocrmodel.PRELOAD_ENVIRONMENT_VARIABLE] = "paddle" if use_paddle else "easyocr"
+        bot_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        python_path = os.environ.get("PYTHONPATH", "")
+        if bot_directory not in python_path.split(os.pathsep): # The forkserver doesn't get our sys.path before it imports the preload module on Python 3.11.
+            os.environ["PYTHONPATH"] = os.pathsep.join(path for path in (bot_directory, python_path) if path != "")
+        mp_context.set_forkserver_preload(["lib.scrim_ocrpreload"])
+
+    def _idle_worker(self) -> Union[OCRReaderProcess, None]:
+        '''Gets the ready worker with the fewest tasks, if any has room for another. Must be called with `_capacity` held.'''
+        candidates = [worker for worker in self.workers if worker.ready and not worker.retiring and worker.is_alive() and len(worker.in_flight) < self.worker_capacity]
+        return min(candidates, key=lambda worker: len(worker.in_flight)) if len(candidates) > 0 else None
+
+    def _wait_for_idle_worker(self) -> Union[OCRReaderProcess, None]:
+        '''Blocks until a worker has room for another task. Returns `None` once the pool is shutting down. Must be called with `_capacity` held.'''
+        while not self._closing:
+            worker = self._idle_worker()
+            if worker is not None:
+                return worker
+            self._capacity.wait(timeout=1.0) # Also wakes up to notice workers that died.
+        return None
+
+    def _dispatch_loop(self) -> None:
         while True:
+            with self._capacity: # Only take a task off the queue once someone can run it, so the queue depth stays meaningful.
+                if self._wait_for_idle_worker() is None:
+                    return
+            task: Union[ImageProcessTask, None] = self.read_queue.get()
+            if task is None:
+                return
+            with self._capacity:
+                worker = self._wait_for_idle_worker()
+                if worker is None:
+                    return
+                worker.in_flight[task.task_id] = task
             try:
-                while True:
-                    image_task: ImageProcessTask = self.read_queue.get(block=True) # Wait until an image becomes available for the processor
-                    image_task.image = self._resize_image_shortest_side(image_task.image, 1080)
-                    image_task.image = scrim_imageprocessing.binarize_image(image_task.image) # Binarize the image
-                    image_task.image = scrim_imageprocessing.sharpen_image(image_task.image)
-                    image_task.image.show()
-                    image_buffer = io.BytesIO()
-                    image_task.image.save(image_buffer, format='PNG')
-                    image_buffer.seek(0)
-                    # Display the image buffer
-                    if is_paddle_active:
-                        # Convert the image buffer to bytes
-
-                        result = self.paddle_reader.ocr(image_buffer.getvalue(), cls=True)[0]
-                        raw_result: list = []
-                        for detection in result:
-                            raw_result.append(detection[1][0])
-                        image_task.score = self._calculate_score_from_text(raw_result)
+                worker.send(task)
+            except (BrokenPipeError, OSError) as e:
+                scrim_logger.warning(f"Could not send a task to {worker.process_name}: {e}") # The collector fails the task when it handles the dead worker.
+
+    def _collect_loop(self) -> None:
+        while not self._closing or any(worker.is_alive() for worker in self.workers):
+            with self._capacity:
+                live_workers = [worker for worker in self.workers if worker.is_alive()]
+            waitables = {}
+            for worker in live_workers:
+                waitables[worker.connection] = worker
+                waitables[worker.process.sentinel] = worker # Becomes ready when the process exits, so crashes are noticed right away.
+            for ready_object in wait(list(waitables.keys()), timeout=1.0):
+                worker = waitables[ready_object]
+                if ready_object is worker.connection:
+                    self._receive_results(worker)
+            for worker in list(self.workers):
+                if not worker.is_alive():
+                    self._receive_results(worker) # Anything it sent before exiting still counts.
+                    if worker.retiring:
+                        self._remove_retired_worker(worker)
                     else:
-                        result = self.easyocr_reader.readtext(image_buffer.getvalue())
-                        raw_result: list = []
-                        for detection in result:
-                            raw_result.append(detection[1])
-                    image_task.score = self._calculate_score_from_text(raw_result)
-                    self.results_queue.put(image_task)
-            except Exception as e:
-                ocr_ready = False
-                scrim_logger.error(e)
-                self.error_queue.put(ImageProcessError(image_task.image, image_task.message, image_task.attachment_url))
-                scrim_logger.debug(f"Restarting OCR Reader Process for Thread: {self.thread_name}")
-                self.easyocr_reader = None # Clear out and then restart the reader to clear any issues.
-                self.easyocr_reader = easyocr.Reader(['en'], verbose=False, gpu=scrim_sysinfo.system_has_gpu())
-                scrim_logger.debug(f"OCR Reader Process Restarted for Thread: {self.thread_name}")
-                ocr_ready = True
+                        self._handle_dead_worker(worker)
+            self._restart_dead_workers()
+            self._autoscale()
+
+    def _receive_results(self, worker: OCRReaderProcess) -> None:
+        try:
+            while worker.connection.poll():
+                message = worker.connection.recv()
+                if isinstance(message, scrim_ocrworker.OCRWorkerReady):
+                    self._worker_ready(worker, message)
+                else:
+                    self._complete_batch(worker, message)
+        except (EOFError, OSError): # The worker exited, its sentinel will fire.
+            pass
+
+    def _worker_ready(self, worker: OCRReaderProcess, ready: scrim_ocrworker.OCRWorkerReady) -> None:
+        with self._capacity:
+            worker.ready = True
+            worker.idle_since = time.monotonic()
+            worker.restarts = 0 # Its model loaded, so it is healthy again.
+            all_ready = all(other.ready for other in self.workers)
+            self._capacity.notify_all()
+        model = "the shared model" if ready.shared_model else "its own model"
+        scrim_logger.debug(f"{worker.process_name} is ready, {ready.load_seconds:.1f}s to get {model} and {ready.warm_up_seconds:.1f}s to warm up.")
+        if ready.preload_error is not None and not self._preload_error_reported:
+            self._preload_error_reported = True
+            scrim_logger.warning(f"The OCR model could not be preloaded for sharing ({ready.preload_error}). Each OCR Reader Process loads its own instead.")
+        if all_ready and not self._all_ready_reported:
+            self._all_ready_reported = True
+            scrim_logger.info(f"{len(self.workers)} OCR Reader Process(es) ready after {time.monotonic() - self._started_at:.1f}s.")
+
+    def _complete_batch(self, worker: OCRReaderProcess, results: List[scrim_ocrworker.OCRResult]) -> None:
+        with self._capacity:
+            tasks = [worker.in_flight.pop(result.task_id, None) for result in results]
+            worker.restarts = 0 # It answered, so it is healthy again.
+            if len(worker.in_flight) == 0:
+                worker.idle_since = time.monotonic()
+            if len(results) > 0 and results[0].batch_seconds > 0:
+                batch_seconds_per_image = results[0].batch_seconds / len(results)
+                self.seconds_per_image = batch_seconds_per_image if self.seconds_per_image is None else self.seconds_per_image + (batch_seconds_per_image - self.seconds_per_image) * 0.2
+            self._capacity.notify_all()
+        completed_at = time.monotonic()
+        latencies_seconds: List[float] = []
+        errors = 0
+        for task, result in zip(tasks, results):
+            if task is None:
+                continue
+            latencies_seconds.append(completed_at - task.queued_at)
+            if result.error is not None:
+                errors += 1
+                scrim_logger.error(f"{worker.process_name} failed to read an image: {result.error}")
+                self.on_error(ImageProcessError(task.image_bytes, task.message, task.attachment_url, task.received_at))
+                continue
+            task.score = worker._calculate_score_from_text(result.text)
+            self.on_result(task)
+        if len(results) > 0:
+            ocr_throughput_monitor.record_batch(latencies_seconds, results[0].batch_seconds, errors, [result.stage_seconds for result in results])
+
+    def _handle_dead_worker(self, worker: OCRReaderProcess) -> None:
+        '''Fails whatever a dead worker was still working on. It is restarted by `_restart_dead_workers`.'''
+        with self._capacity:
+            lost_tasks = list(worker.in_flight.values())
+            worker.in_flight.clear()
+        if not self._closing and not worker.exit_reported:
+            worker.exit_reported = True
+            scrim_logger.error(f"{worker.process_name} exited unexpectedly with code {worker.process.exitcode}. {len(lost_tasks)} task(s) were lost.")
+        for task in lost_tasks:
+            self.on_error(ImageProcessError(task.image_bytes, task.message, task.attachment_url, task.received_at))
+
+    def _restart_dead_workers(self) -> None:
+        if self._closing:
+            return
+        for worker in self.workers:
+            if worker.is_alive() or worker.retiring: # A retired worker that exited since the collector last looked is removed next time round.
+                continue
+            backoff_seconds = min(60.0, 2.0 ** worker.restarts)
+            if time.monotonic() - worker.started_at < backoff_seconds: # Don't spin on a worker that dies at start-up, e.g. because its model won't load.
+                continue
+            worker.close()
+            worker.restarts += 1
+            scrim_logger.debug(f"Restarting OCR Reader Process {worker.process_name} (restart {worker.restarts}).")
+            with self._capacity:
+                worker.start()
+                self._capacity.notify_all()
+
+    def _start_worker(self) -> OCRReaderProcess:
+        worker = OCRReaderProcess(self._mp_context, f"OCRReaderProcess_{self._next_worker_number}", *self._worker_args)
+        self._next_worker_number += 1
+        with self._capacity:
+            self.workers.append(worker)
+        return worker
+
+    def _remove_retired_worker(self, worker: OCRReaderProcess) -> None:
+        with self._capacity:
+            self.workers.remove(worker)
+            lost_tasks = list(worker.in_flight.values()) # Normally none, a worker is only retired while idle.
+            worker.in_flight.clear()
+        worker.close()
+        for task in lost_tasks:
+            self.on_error(ImageProcessError(task.image_bytes, task.message, task.attachment_url, task.received_at))
+        scrim_logger.debug(f"{worker.process_name} stopped.")
+
+    def _desired_workers(self, backlog: int) -> int:
+        '''How many workers it takes to get through `backlog` tasks within `target_wait_seconds`, going by the recent per-image OCR time.
+        Until a batch has been timed, assumes each worker can take one batch.'''
+        if backlog == 0:
+            return 0
+        if self.seconds_per_image is None:
+            return math.ceil(backlog / self.worker_capacity)
+        return math.ceil(backlog * self.seconds_per_image / self.target_wait_seconds)
+
+    def _autoscale(self) -> None:
+        '''Starts workers when the backlog would take too long to clear and stops ones that have been idle for `idle_seconds`. Runs on the collector thread.'''
+        if self._closing:
+            return
+        now = time.monotonic()
+        with self._capacity:
+            active_workers = [worker for worker in self.workers if not worker.retiring]
+            backlog = self.read_queue.qsize() + sum(len(worker.in_flight) for worker in active_workers)
+            target = min(self.max_workers, max(self.min_workers, self._desired_workers(backlog)))
+            to_retire: List[OCRReaderProcess] = []
+            if backlog == 0:
+                for worker in active_workers:
+                    if len(active_workers) - len(to_retire) <= self.min_workers:
+                        break
+                    if worker.ready and len(worker.in_flight) == 0 and now - worker.idle_since >= self.idle_seconds:
+                        worker.retiring = True
+                        to_retire.append(worker)
+        if target > len(active_workers):
+            scrim_logger.info(f"Scaling OCR Reader Processes up from {len(active_workers)} to {target} for a backlog of {backlog} screenshot(s).")
+            for _ in range(target - len(active_workers)):
+                self._start_worker()
+        for worker in to_retire:
+            worker.stop() # It exits once it has read what it has, and is removed by the collector.
+        if len(to_retire) > 0:
+            scrim_logger.info(f"Scaling OCR Reader Processes down from {len(active_workers)} to {len(active_workers) - len(to_retire)} after {self.idle_seconds:.0f}s idle.")
+
+    def get_queue_depth(self) -> int:
+        return self.read_queue.qsize()
+
+    def get_stats(self) -> Dict[str, Union[int, float, None]]:
+        '''Returns the current size of the pool and its backlog, for monitoring.'''
+        with self._capacity:
+            live_workers = [worker for worker in self.workers if worker.is_alive()]
+            return {"workers": len(live_workers),
+                    "ready_workers": sum(1 for worker in live_workers if worker.ready and not worker.retiring),
+                    "busy_workers": sum(1 for worker in live_workers if len(worker.in_flight) > 0),
+                    "starting_workers": sum(1 for worker in live_workers if not worker.ready),
+                    "retiring_workers": sum(1 for worker in live_workers if worker.retiring),
+                    "min_workers": self.min_workers,
+                    "max_workers": self.max_workers,
+                    "queue_depth": self.read_queue.qsize(),
+                    "in_flight": sum(len(worker.in_flight) for worker in live_workers),
+                    "ocr_ms_per_image": self.seconds_per_image * 1000 if self.seconds_per_image is not None else None}
+
+    def shutdown(self, timeout_seconds: float = 10.0) -> None:
+        '''Stops the pool. Workers finish the task they are on and exit; any still running after `timeout_seconds` are terminated. Queued tasks are dropped.'''
+        if self._closing:
+            return
+        scrim_logger.debug("Shutting down OCR Reader Processes...")
+        with self._capacity:
+            self._closing = True
+            self._capacity.notify_all()
+        self.read_queue.close() # Wakes the dispatcher if it is waiting for a task.
+        with self._capacity:
+            workers = list(self.workers)
+        for worker in workers:
+            worker.stop()
+        deadline = time.monotonic() + timeout_seconds
+        for worker in workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                scrim_logger.warning(f"{worker.process_name} did not exit in time, terminating it.")
+                worker.process.terminate()
+                worker.process.join()
+        self._collector.join(timeout=2.0)
+        for worker in workers:
+            worker.close()
+        scrim_logger.debug("OCR Reader Processes shut down.")
+
+class OCRResultChannel:
+    '''Hands finished tasks from the pool's collector thread to the event loop as soon as they are ready, instead of the loop polling for them.
+    Anything put before the channel is bound to a loop is held and delivered once it is.'''
+    _loop: Union[asyncio.AbstractEventLoop, None]
+    _queue: Union[asyncio.Queue, None]
+    _pending: List[Union[ImageProcessTask, ImageProcessError]]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._loop = None
+        self._queue = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        '''Starts delivering to `loop`. Must be called from that loop.'''
+        with self._lock:
+            if self._loop is loop:
+                return
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            for item in self._pending:
+                self._queue.put_nowait(item)
+            self._pending.clear()
+
+    def put(self, item: Union[ImageProcessTask, ImageProcessError]) -> None:
+        '''Thread-safe. Wakes whatever is waiting in `get`.'''
+        with self._lock:
+            if self._loop is None:
+                self._pending.append(item)
+                return
+            loop, queue = self._loop, self._queue
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError: # The loop has been closed, the bot is shutting down.
+            pass
+
+    async def get(self) -> Union[ImageProcessTask, ImageProcessError]:
+        return await self._queue.get()
 
 class ScrimReader(commands.Cog):
     bot: discord.Bot
-    reader_processes: List[OCRReaderProcess]
-    read_queue: Queue
-    results_queue: Queue
-    error_queue: Queue
+    reader_pool: Union[OCRReaderPool, None]
+    dedup_cache: Union[scrim_ocrdedup.OCRDedupCache, None]
+    result_writer: Union[scrim_ocrresults.OCRResultWriter, None]
+    read_queue: scrim_ocrqueue.OCRTaskScheduler
+    result_channel: OCRResultChannel
     channel_id_list: List[int]
     channel_list: List[Union[discord.TextChannel, discord.VoiceChannel, discord.ForumChannel, discord.StageChannel]]
+    _delivery_task: Union[asyncio.Task, None]
+    _edit_tasks: Set[asyncio.Task] # Held so running edits aren't garbage collected.
+    _priority_guild_ids: Set[int] # Guilds with an active scrim, whose screenshots are read first.
+    _priority_guilds_checked_at: float
     
     def __init__(self, bot: discord.Bot):
         self.bot = bot
-        self.read_queue, self.results_queue, self.error_queue = Queue(), Queue(), Queue()
+        args = ScrimArgs()
+        self.read_queue = scrim_ocrqueue.OCRTaskScheduler(args.reader_queue_size, args.reader_queue_per_guild)
+        self.result_channel = OCRResultChannel()
         self.channel_id_list = DeceiveReaderActiveChannels.get_active_channels()
-        self.reader_processes = [] # List of reader processes - This needs to be initialized in __main__ to avoid issues with forking
+        self.reader_pool = None
+        self._delivery_task = None
+        self._edit_tasks = set()
+        self._priority_guild_ids = set()
+        self._priority_guilds_checked_at = float("-inf")
+        self.dedup_cache = None if args.disable_reader_dedup else scrim_ocrdedup.OCRDedupCache(args.reader_dedup_max_distance)
+        self.result_writer = None if args.disable_reader_results else scrim_ocrresults.OCRResultWriter(args.reader_results_flush_seconds)
+        if self.result_writer is not None:
+            atexit.register(self.result_writer.close) # Registered after the connection pool, so it runs before the pool is closed.
         self.spawn_processes()
 
     def cog_unload(self):
-        scrim_logger.debug("Killing OCR Reader Processes...")
-        for p in self.reader_processes:
-            p.terminate()
-            p.join()
+        scrim_logger.debug("Stopping OCR Reader Processes...")
+        if self._delivery_task is not None:
+            self._delivery_task.cancel()
+        if self.reader_pool is not None:
+            self.reader_pool.shutdown()
+        if self.result_writer is not None:
+            self.result_writer.close()
 
-    def spawn_processes(self, num_ocr_processes: int = ScrimArgs().num_reader_threads):
-        # Import OCR engines
+    def spawn_processes(self, max_ocr_processes: int = ScrimArgs().num_reader_threads):
         if is_paddle_active:
-            scrim_logger.debug("PaddleOCR loaded.")
+            scrim_logger.debug("Using PaddleOCR for OCR Reader Processes.")
         else:
-            load_paddleocr()
-            if is_paddle_active:
-                scrim_logger.debug("PaddleOCR loaded.")
-            else:
-                scrim_logger.warning("PaddleOCR failed to load.")
-            load_easyocr()
-        scrim_logger.debug(f"Attempting to spawn {str(num_ocr_processes)} OCR Reader Processes...")
-        for i in range(num_ocr_processes):
-            self.reader_processes.append(OCRReaderProcess(self.read_queue, self.results_queue, self.error_queue, f"OCRReaderProcess_{i}"))
+            scrim_logger.debug("Using EasyOCR for OCR Reader Processes.")
+        args = ScrimArgs()
+        self.reader_pool = OCRReaderPool(self.read_queue,
+                                         self.result_channel.put,
+                                         self.result_channel.put,
+                                         args.min_reader_threads,
+                                         max_ocr_processes,
+                                         args.reader_start_method,
+                                         is_paddle_active,
+                                         scrim_sysinfo.system_has_gpu() and not args.reader_cpu_only,
+                                         args.reader_batch_size,
+                                         args.reader_batch_wait_ms / 1000,
+                                         args.reader_idle_seconds,
+                                         args.reader_target_wait_seconds)
+        atexit.register(self.reader_pool.shutdown)
 
-    ### READER FUNCTIONS ###
-
-    def _resize_image_shortest_side(self, img: Image, size: int) -> Image:
-        '''Resizes an image so that the shortest side is a certain size.
-        ### Parameters
-        `img` : Image - The image to resize.
-        `size` : int - The size of the shortest side.'''
-        if min(img.size) <= size:
-            return img
-        width, height = img.size
-        if width < height:
-            ratio = size / width
-            new_width = size
-            new_height = int(height * ratio)
-        else:
-            ratio = size / height
-            new_height = size
-            new_width = int(width * ratio)
-        return img.resize((new_width, new_height))
-
-    def _find_num_eliminations(self, text: Union[List[str], str, None]) -> Union[int, None]:
-        '''Finds the number of eliminations in a list of strings.'''
-        if text is None:
-            return None
-        # Create the regex pattern
-        pattern1 = re.compile(r'(?i)([0-9IiOo]+) ?eli?m?i?nations?')
-        pattern2 = re.compile(r'eli?m?i?nations?') # We assume 1 here, this is a last ditch backup effort
-        if type(text) == str:
-            text = [text]
-        for line in text:
-            # First make line lowercase
-            line = line.lower()
-            # Search for the pattern
-            match = pattern1.search(line)
-            if match:
-                # Get the number of eliminations on the front of the line
-                return int(match.group(1).lower().translate(str.maketrans("IiOo", "1100"))) # Convert all I's to 1's and O's to 0's
-            match = pattern2.search(line) # If we reach here, we can't read the number and thus should report -1 to indicate an unknown result.
-            if match:
-                return -1
-        return None
-
-    def _find_if_entered_vault(self, text: Union[List[str], str, None]) -> bool:
-        '''Finds if the word "vault entered" is in a list of strings.
-        ### Parameters
-        `text` : Union[List[str], str, None - The list of strings to search.'''
-        if text is None:
-            return False
-        # Create the regex pattern
-        pattern = re.compile(r'(?i)vault ?entered')
-        if type(text) == str:
-            text = [text]
-        for line in text:
-            # First make line lowercase
-            line = line.lower()
-            # Search for the pattern
-            match = pattern.search(line)
-            if match:
-                return True
-        return False
-
-    def _find_num_vault_terminals_disabled(self, text: Union[List[str], str, None]) -> Union[int, None]:
-        '''Finds the number of vault terminals disabled in a list of strings.
-        ### Parameters
-        `text` : Union[List[str], str, None - The list of strings to search.'''
-        if text is None:
-            return None
-        # Create the regex pattern
-        pattern1 = re.compile(r'(?i)([0-9IiOo]+) ?vault ?terminals? ?disabled')
-        pattern2 = re.compile(r'vault ?terminals? ?disabled') # Our backup regex
-        if type(text) == str:
-            text = [text]
-        for line in text:
-            # First make line lowercase
-            line = line.lower()
-            # Search for the pattern
-            match = pattern1.search(line)
-            if match:
-                # Get the number of vault terminals disabled on the front of the line
-                return int(match.group(1).lower().translate(str.maketrans("IiOo", "1100"))) # Convert all I's to 1's and O's to 0's
-            match = pattern2.search(line) # Backup, report unknown
-            if match:
-                return -1
-        return None
-
-    def _find_last_spy_standing(self, text: Union[List[str], str, None]) -> bool:
-        '''Finds if the word "last spy standing" is in a list of strings.
-        ### Parameters
-        `text` : Union[List[str], str, None - The list of strings to search.'''
-        if text is None:
-            return False
-        # Create the regex pattern
-        pattern = re.compile(r'(?i)last ?spy ?standing')
-        if type(text) == str:
-            text = [text]
-        for line in text:
-            # First make line lowercase
-            line = line.lower()
-            # Search for the pattern
-            match = pattern.search(line)
-            if match:
-                return True
-        return False
-    
-    def _find_if_extracted(self, text: Union[List[str], str, None]) -> bool:
-        '''Finds if the word "extracted" is in a list of strings.
-        ### Parameters
-        `text` : Union[List[str], str, None - The list of strings to search.'''
-        if text is None:
-            return False
-        # Create the regex pattern
-        pattern = re.compile(r'(?i)extracted')
-        if type(text) == str:
-            text = [text]
-        for line in text:
-            # First make line lowercase
-            line = line.lower()
-            # Search for the pattern
-            match = pattern.search(line)
-            if match:
-                return True
-        return False
-
-    def _find_num_allies_revived(self, text: Union[List[str], str, None]) -> Union[int, None]:
-        '''Finds the number of allies revived in a list of strings.
-        ### Parameters
-        `text` : `Union[List[str], str, None]` - The list of strings to search.'''
-        if text is None:
-            return None
-        # Create the regex pattern
-        pattern1 = re.compile(r'(?i)([0-9IiOo]+) ?ally ?revived')
-        pattern2 = re.compile(r'ally ?revived') # Our backup regex
-        if type(text) == str:
-            text = [text]
-        for line in text:
-            # First make line lowercase
-            line = line.lower()
-            # Search for the pattern
-            match = pattern1.search(line)
-            if match:
-                # Get the number of allies revived on the front of the line
-                return int(match.group(1).lower().translate(str.maketrans("IiOo", "1100"))) # Convert all I's to 1's and O's to 0's
-            match = pattern2.search(line) # Backup, report unknown
-            if match:
-                return -1
-        return None
-    
-    def _calculate_score_from_text(self, text: List[str]) -> MatchScore:
-        '''Calculates the score from a list of strings.'''
-        eliminations = self._find_num_eliminations(text)
-        vault_entered = self._find_if_entered_vault(text)
-        vault_terminals_disabled = self._find_num_vault_terminals_disabled(text)
-        last_spy_standing = self._find_last_spy_standing(text)
-        extracted = self._find_if_extracted(text)
-        allies_revived = self._find_num_allies_revived(text)
-        match_score = MatchScore(0)
-        if eliminations is not None:
-            match_score.total_score += eliminations if eliminations != -1 else 0
-            match_score.eliminations = eliminations
-            match_score.eliminations_known = True if eliminations != -1 else False
-        if vault_entered:
-            match_score.total_score += 1
-            match_score.vault_entered = True
-        if vault_terminals_disabled is not None:
-            match_score.total_score += vault_terminals_disabled if vault_terminals_disabled != -1 else 0
-            match_score.vault_terminals_disabled = vault_terminals_disabled
-            match_score.terminals_disabled_known = True if vault_terminals_disabled != -1 else False
-        if last_spy_standing:
-            match_score.total_score += 4
-            match_score.last_spy_standing = True
-        if extracted:
-            match_score.total_score += 4
-            match_score.extracted = True
-        if allies_revived is not None:
-            match_score.total_score -= allies_revived if allies_revived != -1 else 0
-            match_score.allies_revived = allies_revived
-            match_score.allies_revived_known = True if allies_revived != -1 else False
-        return match_score
-    
     ### LISTENERS ###
     @commands.Cog.listener()
     async def on_ready(self):
-        self.check_for_results.start()
+        if self._delivery_task is None or self._delivery_task.done(): # on_ready fires again after every reconnect.
+            self.result_channel.bind(asyncio.get_running_loop())
+            self._delivery_task = asyncio.get_running_loop().create_task(self._deliver_results())
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -724,20 +950,75 @@ class ScrimReader(commands.Cog):
         if message.author.bot:
             return
         # Insert the user into the database if they don't exist
-        ScrimUserData.insert_user_from_discord(message.author)
+        await AsyncScrimUserData.insert_user_from_discord(message.author)
         if len(message.attachments) > 0:
             for attachment in message.attachments:
                 if attachment.content_type.startswith('image'):
-                    message_handle: discord.Message = await message.reply('Processing image, please wait...')
-                    self.read_queue.put(ImageProcessTask(await attachment.read(), message_handle, attachment.url))
+                    received_at = time.monotonic()
+                    image_bytes = await attachment.read()
+                    image_hashes = None
+                    if self.dedup_cache is not None:
+                        image_hashes = await asyncio.to_thread(scrim_ocrdedup.hash_image, image_bytes) # Decoding takes a while, keep it off the event loop.
+                        cached_score = await self.dedup_cache.lookup(image_hashes) if image_hashes is not None else None
+                        if cached_score is not None and MatchScore.from_row(cached_score).is_score_uncertain(): # Cached before uncertain reads stopped being cached. Read it again.
+                            await self.dedup_cache.invalidate(image_hashes)
+                            cached_score = None
+                        if cached_score is not None:
+                            await message.reply(embed=MatchScore.from_row(cached_score).create_embed(attachment.url))
+                            self._save_result(message, message.author.id, image_bytes, cached_score, attachment.url, image_hashes)
+                            continue
+                    guild_id = message.guild.id if message.guild is not None else 0
+                    priority = await self._is_priority_guild(guild_id)
+                    try:
+                        position = self.read_queue.get_position(guild_id, message.channel.id, priority) # Turns the screenshot away right now if there is no room.
+                    except scrim_ocrqueue.OCRQueueFullError as e:
+                        await message.reply(self._queue_full_text(e))
+                        continue
+                    message_handle: discord.Message = await message.reply('Processing image, please wait...' if position == 1 else f'Queue position {position}, please wait...')
+                    try:
+                        self.read_queue.put(ImageProcessTask(image_bytes, message_handle, attachment.url, image_hashes, received_at, message.author.id), guild_id, message.channel.id, priority)
+                    except scrim_ocrqueue.OCRQueueFullError as e: # Filled up while the reply was being sent.
+                        await message_handle.edit(content=self._queue_full_text(e))
             return
 
-    @tasks.loop(seconds=1)
-    async def check_for_results(self):
-        while not self.results_queue.empty():
-            task: ImageProcessTask = self.results_queue.get()
-            await task.edit_message("", task.score.create_embed(task.attachment_url))
-        while not self.error_queue.empty():
-            task: ImageProcessError = self.error_queue.get()
-            await task.message.edit(content="", embed=task.create_embed())
+    def _save_result(self, message: discord.Message, author_id: int, image_bytes: bytes, score: Tuple[int, int, int, bool, bool, bool, int], image_url: Union[str, None], image_hashes: Union[scrim_ocrdedup.ImageHashes, None]) -> None:
+        '''Queues a score to be saved to ocr_reader_results. `message` can be the screenshot or the reply to it, only its guild and channel are used.'''
+        if self.result_writer is None or author_id is None:
+            return
+        guild_id = message.guild.id if message.guild is not None else 0
+        self.result_writer.add(scrim_ocrresults.OCRResultRecord(guild_id, message.channel.id, author_id, image_bytes, score, image_url, image_hashes.content_hash if image_hashes is not None else None))
+
+    async def _is_priority_guild(self, guild_id: int) -> bool:
+        '''Screenshots from guilds with an active scrim are read first. The list of those guilds is refreshed at most once a minute.'''
+        if time.monotonic() - self._priority_guilds_checked_at > 60:
+            self._priority_guilds_checked_at = time.monotonic()
+            self._priority_guild_ids = set(await AsyncScrimsData.get_active_scrim_guild_ids())
+        return guild_id in self._priority_guild_ids
+
+    @staticmethod
+    def _queue_full_text(e: scrim_ocrqueue.OCRQueueFullError) -> str:
+        if e.guild_full:
+            return f"This server already has {e.guild_queued} screenshots waiting to be read. Please post this one again once they are done."
+        return f"The reader is busy with {e.queued} screenshots. Please post this one again in a few minutes."
 
+    async def _deliver_results(self):
+        '''Edits each reply as soon as its result arrives. Every edit runs as its own task so one slow edit doesn't hold up the rest.'''
+        while True:
+            item = await self.result_channel.get()
+            if isinstance(item, ImageProcessTask):
+                self._save_result(item.message, item.author_id, item.image_bytes, item.score.to_row(), item.attachment_url, item.image_hashes)
+            edit_task = asyncio.get_running_loop().create_task(self._deliver_result(item))
+            self._edit_tasks.add(edit_task)
+            edit_task.add_done_callback(self._edit_tasks.discard)
+
+    async def _deliver_result(self, item: Union[ImageProcessTask, ImageProcessError]):
+        try:
+            if isinstance(item, ImageProcessError):
+                await item.message.edit(content="", embed=item.create_embed())
+            else:
+                await item.edit_message("", item.score.create_embed(item.attachment_url))
+            ocr_delivery_latency_histogram.record(time.monotonic() - item.received_at)
+            if isinstance(item, ImageProcessTask) and self.dedup_cache is not None and item.image_hashes is not None and not item.score.is_score_uncertain(): # A misread would be served to every repost.
+                await self.dedup_cache.store(item.image_hashes, item.score.to_row())
+        except Exception as e:
+            scrim_logger.error(e)
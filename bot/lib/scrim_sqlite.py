@@ -1,14 +1,17 @@
-import sqlean, pytz, asyncio, sys, threading, os, discord, uuid
-from typing import List, Tuple, Union
+import sqlean, pytz, asyncio, sys, threading, os, discord, uuid, atexit, functools, json
+from typing import List, Tuple, Union, Dict, Callable, Set
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from contextlib import closing
-from lib.DI_API_Obj.sweet_user import SweetUserPartial, SweetUser
+from lib.DI_API_Obj.sweet_user import SweetUserPartial, SweetUser, compact_format_version
 from lib.scrim_logging import scrim_logger
 from lib.obj.scrim_user import ScrimUser
 from lib.obj.scrim import Scrim
 from lib.obj.scrim_format import ScrimFormat
 from lib.scrim_logging import scrim_logger
+from lib.scrim_dbpool import ScrimConnectionPool
+from lib.scrim_cache import ScrimLRUCache
+from lib.scrim_statsstore import scrim_stats_store
 
 sqlean.extensions.enable_all()
 
@@ -17,9 +20,25 @@ dname = os.path.dirname(absPath)
 os.chdir(dname)
 load_dotenv()
 
-sqlite_db_path: str = "../rsc/spire_scrims.db"
-sweet_user_cache_expiration_seconds: int = 3600 # 1 hour
-db_lock = threading.Lock()
+sqlite_db_path: str = "../rsc/spire_scrims.db" # Relative to this folder. The bot opens it with open_scrim_db at startup.
+sweet_user_cache_expiration_seconds: int = 3600 # 1 hour. Past this, cached users are still served but refreshed in the background.
+sweet_user_cache_hard_expiration_seconds: int = 86400 # 1 day. Past this, cached users are too old to serve and callers wait for fresh data.
+sweet_user_memory_cache_max_entries: int = 512
+sweet_user_memory_cache_max_bytes: int = 4 * 1024 * 1024 # Measured by the size of the stored, compressed profiles. The parsed objects take up many times that.
+db_health_check_interval_seconds: int = 60
+sqlite_pragmas: Dict[str, Union[str, int]] = { # The pragmas for WAL mode. open_scrim_db adjusts journal_mode and synchronous for other journal modes.
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL", # NORMAL is durable across application crashes in WAL mode and skips an fsync per commit.
+    "cache_size": -16000, # Negative values are in KiB, so 16 MiB of page cache per connection.
+    "mmap_size": 268435456, # 256 MiB
+    "temp_store": "MEMORY"
+}
+db_pool: Union[ScrimConnectionPool, None] = None # Set by open_scrim_db.
+sweet_user_memory_cache: ScrimLRUCache = ScrimLRUCache(sweet_user_memory_cache_max_entries, sweet_user_memory_cache_max_bytes, sweet_user_cache_hard_expiration_seconds)
+
+class ScrimDatabaseNotOpenError(Exception):
+    def __init__(self):
+        super().__init__("The database has not been opened. Call open_scrim_db first.")
 
 class UUIDGenerator:
     @staticmethod
@@ -54,12 +73,6 @@ if __name__ == "__main__":
     print("This does not run on its own.")
     # sys.exit()
 
-def connect_to_db() -> sqlean.Connection:
-    '''Connects to the database. This should be used from within the @database_transaction decorator.
-    ### Returns
-    * `sqlean.Connection` - The connection object.'''
-    return sqlean.connect(sqlite_db_path)
-
 class DatetimeConvert:
     @staticmethod
     def convert_datetime_to_str(value: datetime) -> str:
@@ -90,21 +103,32 @@ class DatetimeConvert:
             scrim_logger.error("ValueError in DatetimeConvert.convert_str_to_datetime: Value must be a valid datetime string.")
             raise ValueError("Value must be a valid datetime string.")
 
-# Decorator wrapper
-def database_transaction(func): # This is a decorator that wraps a function in a database transaction.
+# Decorator wrappers
+def _get_db_pool() -> ScrimConnectionPool:
+    if db_pool is None:
+        raise ScrimDatabaseNotOpenError()
+    return db_pool
+
+def database_transaction(func): # This is a decorator that wraps a function in a database transaction on the pooled writer connection.
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        with db_lock:
-            with closing(connect_to_db()) as conn:
-                scrim_logger.debug("Connected to database.")
-                with closing(conn.cursor()) as cur:
-                    try:
-                        result = func(cur, *args, **kwargs)
-                        conn.commit()
-                        return result
-                    except Exception as e:
-                        conn.rollback()
-                        scrim_logger.error(f"Database transaction failed with the following error: {e}")
-                        raise e
+        with _get_db_pool().writer() as cur:
+            try:
+                return func(cur, *args, **kwargs)
+            except Exception as e:
+                scrim_logger.error(f"Database transaction failed with the following error: {e}")
+                raise e
+    return wrapper
+
+def database_read(func): # This is a decorator that runs a read-only function on a pooled reader connection. Anything that writes must use @database_transaction instead.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _get_db_pool().reader() as cur:
+            try:
+                return func(cur, *args, **kwargs)
+            except Exception as e:
+                scrim_logger.error(f"Database read failed with the following error: {e}")
+                raise e
     return wrapper
 
 @database_transaction
@@ -220,9 +244,162 @@ def init_scrim_db(cur: sqlean.Connection.cursor) -> None:
     
     # Debug
     cur.execute("CREATE TABLE IF NOT EXISTS scrim_debug_channels (guild_id INTEGER NOT NULL, channel_id INTEGER NOT NULL, PRIMARY KEY(guild_id, channel_id));")
+
+    # Migrations
+    cur.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                (version INTEGER PRIMARY KEY NOT NULL,
+                description TEXT NOT NULL,
+                applied_at TEXT NOT NULL);''')
     
     scrim_logger.debug("Database initialized.")
-init_scrim_db()
+
+### MIGRATIONS ###
+# Every step runs exactly once, in order, inside its own transaction. Add new steps to the end of schema_migrations and never edit or reorder a step that has shipped.
+
+def _create_unique_index_if_clean(cur: sqlean.Connection.cursor, index_name: str, table: str, columns: List[str], where: Union[str, None] = None) -> bool:
+    '''Creates a unique index unless the table already holds duplicates, in which case a warning is logged and nothing is created.
+    ### Returns
+    * `bool` - Whether the index was created.'''
+    column_list = ", ".join(columns)
+    where_clause = f" WHERE {where}" if where is not None else ""
+    if cur.execute(f"SELECT 1 FROM {table}{where_clause} GROUP BY {column_list} HAVING COUNT(*) > 1 LIMIT 1;").fetchone() is not None:
+        scrim_logger.warning(f"Not adding unique index {index_name}: {table} has duplicate values in ({column_list}). Lookups keep using the plain index on those columns.")
+        return False
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({column_list}){where_clause};")
+    return True
+
+def _migration_lookup_indexes(cur: sqlean.Connection.cursor) -> None:
+    '''Indexes every column the bot looks rows up by.'''
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scrim_users_discord_id ON scrim_users (discord_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scrim_users_sweet_id ON scrim_users (sweet_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scrim_users_twitch_id ON scrim_users (twitch_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sweet_user_partial_cache_display_name ON sweet_user_partial_cache (display_name);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_team_members_user_id ON team_members (user_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_team_members_team_id ON team_members (team_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ocr_reader_channels_channel_id ON ocr_reader_channels (channel_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scrim_debug_channels_channel_id ON scrim_debug_channels (channel_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scrim_run_times_scrim_id ON scrim_run_times (scrim_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scrims_active ON scrims (scrim_id) WHERE is_active = 1;")
+
+def _migration_unique_user_ids(cur: sqlean.Connection.cursor) -> None:
+    '''Makes the external IDs on scrim_users and team memberships unique. Where a unique index is created it replaces the plain lookup index.'''
+    for column in ["discord_id", "sweet_id", "twitch_id"]:
+        if _create_unique_index_if_clean(cur, f"uq_scrim_users_{column}", "scrim_users", [column], f"{column} IS NOT NULL"):
+            cur.execute(f"DROP INDEX IF EXISTS idx_scrim_users_{column};")
+    _create_unique_index_if_clean(cur, "uq_team_members_team_user", "team_members", ["team_id", "user_id"])
+
+def _migration_compact_sweet_user_cache(cur: sqlean.Connection.cursor) -> None:
+    '''Moves cached Sweet users from JSON text to the compact format written by `SweetUser.dump_compact`. Rows that can't be read are dropped, they are only a cache.'''
+    cur.execute("ALTER TABLE sweet_user_cache ADD COLUMN data_blob BLOB;")
+    cur.execute("ALTER TABLE sweet_user_cache ADD COLUMN format_version INTEGER;")
+    converted: List[Tuple[bytes, int, str]] = []
+    unreadable: List[Tuple[str]] = []
+    for sweet_id, json_data in cur.execute("SELECT sweet_id, json_data FROM sweet_user_cache WHERE json_data IS NOT NULL;").fetchall():
+        try:
+            converted.append((SweetUser.from_json(json_data).dump_compact(), compact_format_version, sweet_id))
+        except (ValueError, TypeError, AttributeError):
+            unreadable.append((sweet_id,))
+    cur.executemany("UPDATE sweet_user_cache SET data_blob = ?, format_version = ?, json_data = NULL WHERE sweet_id = ?;", converted)
+    cur.executemany("DELETE FROM sweet_user_cache WHERE sweet_id = ?;", unreadable)
+    if len(unreadable) > 0:
+        scrim_logger.warning(f"Dropped {len(unreadable)} cached Sweet users that could not be converted to the compact format.")
+
+def _migration_ocr_reader_score_cache(cur: sqlean.Connection.cursor) -> None:
+    '''Adds the table that remembers the score read from each screenshot, keyed by hashes of the image, so reposted screenshots skip OCR.'''
+    cur.execute('''CREATE TABLE IF NOT EXISTS ocr_reader_score_cache
+                (content_hash TEXT PRIMARY KEY NOT NULL,
+                pixel_hash TEXT NOT NULL,
+                perceptual_hash INTEGER NOT NULL,
+                total_score INTEGER NOT NULL,
+                elimination_score INTEGER NOT NULL,
+                vault_terminal_score INTEGER NOT NULL,
+                entered_vault INTEGER NOT NULL,
+                last_spy_standing INTEGER NOT NULL,
+                extracted INTEGER NOT NULL,
+                allies_revived INTEGER NOT NULL,
+                calculation_time TEXT NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                last_hit_time TEXT);''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ocr_reader_score_cache_pixel_hash ON ocr_reader_score_cache (pixel_hash);")
+
+def _migration_ocr_reader_results_storage(cur: sqlean.Connection.cursor) -> None:
+    '''Stores reader screenshots once each, keyed by the SHA-256 of the upload, and links every result to its screenshot and to the scrim that was running.
+    The old inline image column is left in place but no longer written. Adds the indexes the score aggregation queries run on.'''
+    cur.execute('''CREATE TABLE IF NOT EXISTS ocr_reader_images
+                (content_hash TEXT PRIMARY KEY NOT NULL,
+                image BLOB NOT NULL,
+                image_format TEXT NOT NULL,
+                original_size INTEGER NOT NULL,
+                stored_at TEXT NOT NULL);''')
+    cur.execute("ALTER TABLE ocr_reader_results ADD COLUMN content_hash TEXT REFERENCES ocr_reader_images(content_hash);")
+    cur.execute("ALTER TABLE ocr_reader_results ADD COLUMN scrim_id TEXT REFERENCES scrims(scrim_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ocr_reader_results_guild_time ON ocr_reader_results (guild_id, calculation_time);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ocr_reader_results_channel_time ON ocr_reader_results (channel_id, calculation_time);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ocr_reader_results_user_time ON ocr_reader_results (user_id, calculation_time);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ocr_reader_results_scrim_user ON ocr_reader_results (scrim_id, user_id) WHERE scrim_id IS NOT NULL;")
+
+def _migration_unique_ocr_reader_results(cur: sqlean.Connection.cursor) -> None:
+    '''Keeps one result per user, screenshot and scrim, so a reposted screenshot isn't counted twice in the score totals. Results outside a scrim count as one scrim.
+    Reposts that were already saved are removed, keeping the first.'''
+    cur.execute('''DELETE FROM ocr_reader_results WHERE content_hash IS NOT NULL AND rowid NOT IN
+                (SELECT MIN(rowid) FROM ocr_reader_results WHERE content_hash IS NOT NULL GROUP BY user_id, content_hash, IFNULL(scrim_id, ''));''')
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_ocr_reader_results_user_image_scrim ON ocr_reader_results (user_id, content_hash, IFNULL(scrim_id, ''));")
+
+schema_migrations: List[Tuple[int, str, Callable[[sqlean.Connection.cursor], None]]] = [
+    (1, "Add indexes for user, partial cache, team member and channel lookups", _migration_lookup_indexes),
+    (2, "Add unique constraints on user IDs and team memberships", _migration_unique_user_ids),
+    (3, "Store cached Sweet users in the compact format", _migration_compact_sweet_user_cache),
+    (4, "Add the OCR reader score cache", _migration_ocr_reader_score_cache),
+    (5, "Store OCR reader screenshots by content hash and index reader results", _migration_ocr_reader_results_storage),
+    (6, "Keep one OCR reader result per user, screenshot and scrim", _migration_unique_ocr_reader_results)
+]
+
+@database_read
+def get_schema_version(cur: sqlean.Connection.cursor) -> int:
+    '''Gets the version of the last migration applied to the database, or 0 if none have been applied.'''
+    result = cur.execute("SELECT MAX(version) FROM schema_version;").fetchone()
+    return result[0] if result is not None and result[0] is not None else 0
+
+@database_transaction
+def _apply_migration(cur: sqlean.Connection.cursor, version: int, description: str, step: Callable[[sqlean.Connection.cursor], None]) -> None:
+    if not cur.connection.in_transaction: # DDL does not open a transaction by itself, so open one to keep the step and its version row atomic.
+        cur.execute("BEGIN;")
+    step(cur)
+    cur.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?);", (version, description, DatetimeConvert.convert_datetime_to_str(datetime.now(timezone.utc))))
+
+def migrate_scrim_db() -> None:
+    '''Applies every migration newer than the database's current schema version.'''
+    current_version = get_schema_version()
+    for version, description, step in schema_migrations:
+        if version <= current_version:
+            continue
+        scrim_logger.info(f"Applying database migration {version}: {description}")
+        _apply_migration(version, description, step)
+
+def open_scrim_db(db_path: str = sqlite_db_path, journal_mode: str = "WAL", pool_size: int = 8) -> ScrimConnectionPool:
+    '''Opens the connection pool, creates any missing tables and applies pending migrations. Nothing can read or write before this is called.
+    The bot calls it once at startup. Calling it again closes the open database first.
+    ### Parameters
+    * `db_path` - The database file. Relative paths are relative to this folder.
+    * `journal_mode` - The SQLite journal mode, WAL or DELETE.
+    * `pool_size` - The maximum number of pooled read connections.
+    ### Returns
+    * `ScrimConnectionPool` - The pool the data-access classes now use.'''
+    global db_pool
+    close_scrim_db()
+    pragmas = {**sqlite_pragmas, "journal_mode": journal_mode, "synchronous": "NORMAL" if journal_mode == "WAL" else "FULL"}
+    db_pool = ScrimConnectionPool(os.path.join(dname, db_path), max_readers=pool_size, health_check_interval_seconds=db_health_check_interval_seconds, pragmas=pragmas)
+    init_scrim_db()
+    migrate_scrim_db()
+    return db_pool
+
+def close_scrim_db() -> None:
+    '''Closes the connection pool, if the database is open.'''
+    global db_pool
+    if db_pool is not None:
+        db_pool.close()
+        db_pool = None
+atexit.register(close_scrim_db) # Registered on import, so it runs after anything registered later that still needs the database.
 
 
 ### USERS ###
@@ -245,67 +422,56 @@ class ScrimUserData:
         cur.execute("INSERT OR IGNORE INTO scrim_users (internal_user_id, username, discord_id) VALUES (?, ?, ?);", (player_id, username, discord_user))
         cur.execute("INSERT INTO player_stats (user_id, mmr, priority) VALUES (?, ?, ?);", (player_id, mmr, priority))
     
+    @staticmethod
+    @database_read
+    def _get_user_row(cur: sqlean.Connection.cursor, column: str, value: Union[int, str]) -> Union[tuple, None]:
+        '''Gets a user's row joined with their player stats by one of the identifying columns of `scrim_users`.'''
+        if column not in ["internal_user_id", "discord_id", "sweet_id", "twitch_id"]:
+            raise ValueError(f"Users can not be looked up by the column {column}.")
+        cur.execute(f'''SELECT scrim_users.internal_user_id, scrim_users.username, scrim_users.discord_id, scrim_users.sweet_id, scrim_users.twitch_id, player_stats.mmr, player_stats.priority
+            FROM scrim_users
+            LEFT JOIN player_stats ON player_stats.user_id = scrim_users.internal_user_id
+            WHERE scrim_users.{column} = ?;''', (value,))
+        return cur.fetchone()
+
     @staticmethod
     @database_transaction
-    def get_user_by_discord_id(cur: sqlean.Connection.cursor, discord_user: Union[discord.Member, discord.User, int]) -> Union[ScrimUser, None]:
+    def _insert_default_player_stats(cur: sqlean.Connection.cursor, internal_id: str) -> None:
+        '''Creates the default player stats for a user that does not have any yet.'''
+        cur.execute("INSERT OR IGNORE INTO player_stats (user_id, mmr, priority) VALUES (?, ?, ?);", (internal_id, 1000, 0))
+
+    @staticmethod
+    def _get_user_by_column(column: str, value: Union[int, str]) -> Union[ScrimUser, None]:
+        '''Looks a user up on a reader connection. Only users missing their player stats touch the writer, after the read has finished.'''
+        result = ScrimUserData._get_user_row(column, value)
+        if result is None:
+            return None
+        if result[5] is None:
+            ScrimUserData._insert_default_player_stats(result[0])
+            result = result[:5] + (1000, 0)
+        return ScrimUser(result[0], result[1], result[2], result[3], result[4], result[5], result[6])
+
+    @staticmethod
+    def get_user_by_discord_id(discord_user: Union[discord.Member, discord.User, int]) -> Union[ScrimUser, None]:
         '''Gets a user from the database by Discord ID.'''
         if isinstance(discord_user, discord.Member) or isinstance(discord_user, discord.User):
             discord_user = discord_user.id
-        cur.execute("SELECT * FROM scrim_users WHERE discord_id = ?;", (discord_user,))
-        result = cur.fetchone()
-        if result is None:
-            return None
-        cur.execute("SELECT * FROM player_stats WHERE user_id = ?;", (result[0],)).fetchone()
-        result_stats = cur.fetchone()
-        if result_stats is None:
-            cur.execute("INSERT OR IGNORE INTO player_stats (user_id, mmr, priority) VALUES (?, ?, ?);", (result[0], 1000, 0))
-            result_stats = (result[0], 1000, 0)
-        return ScrimUser(result[0], result[1], result[2], result[3], result[4], result_stats[1], result_stats[2])
+        return ScrimUserData._get_user_by_column("discord_id", discord_user)
     
     @staticmethod
-    @database_transaction
-    def get_user_by_sweet_id(cur: sqlean.Connection.cursor, sweet_id: str) -> Union[ScrimUser, None]:
+    def get_user_by_sweet_id(sweet_id: str) -> Union[ScrimUser, None]:
         '''Gets a user from the database by Sweet ID.'''
-        cur.execute("SELECT * FROM scrim_users WHERE sweet_id = ?;", (sweet_id,))
-        result = cur.fetchone()
-        if result is None:
-            return None
-        cur.execute("SELECT * FROM player_stats WHERE user_id = ?;", (result[0],)).fetchone()
-        result_stats = cur.fetchone()
-        if result_stats is None:
-            cur.execute("INSERT OR IGNORE INTO player_stats (user_id, mmr, priority) VALUES (?, ?, ?);", (result[0], 1000, 0))
-            result_stats = (result[0], 1000, 0)
-        return ScrimUser(result[0], result[1], result[2], result[3], result[4])
+        return ScrimUserData._get_user_by_column("sweet_id", sweet_id)
     
     @staticmethod
-    @database_transaction
-    def get_user_by_twitch_id(cur, twitch_id: str) -> Union[ScrimUser, None]:
+    def get_user_by_twitch_id(twitch_id: str) -> Union[ScrimUser, None]:
         '''Gets a user from the database by Twitch ID.'''
-        cur.execute("SELECT * FROM scrim_users WHERE twitch_id = ?;", (twitch_id,))
-        result = cur.fetchone()
-        if result is None:
-            return None
-        cur.execute("SELECT * FROM player_stats WHERE user_id = ?;", (result[0],)).fetchone()
-        result_stats = cur.fetchone()
-        if result_stats is None:
-            cur.execute("INSERT OR IGNORE INTO player_stats (user_id, mmr, priority) VALUES (?, ?, ?);", (result[0], 1000, 0))
-            result_stats = (result[0], 1000, 0)
-        return ScrimUser(result[0], result[1], result[2], result[3], result[4])
+        return ScrimUserData._get_user_by_column("twitch_id", twitch_id)
 
     @staticmethod
-    @database_transaction
-    def get_user_by_id(cur, internal_id: str) -> Union[ScrimUser, None]:
+    def get_user_by_id(internal_id: str) -> Union[ScrimUser, None]:
         '''Gets a user from the database by internal ID.'''
-        cur.execute("SELECT * FROM scrim_users WHERE internal_user_id = ?;", (internal_id,))
-        result = cur.fetchone()
-        if result is None:
-            return None
-        cur.execute("SELECT * FROM player_stats WHERE user_id = ?;", (result[0],)).fetchone()
-        result_stats = cur.fetchone()
-        if result_stats is None:
-            cur.execute("INSERT OR IGNORE INTO player_stats (user_id, mmr, priority) VALUES (?, ?, ?);", (result[0], 1000, 0))
-            result_stats = (result[0], 1000, 0)
-        return ScrimUser(result[0], result[1], result[2], result[3], result[4])
+        return ScrimUserData._get_user_by_column("internal_user_id", internal_id)
     
     @staticmethod
     @database_transaction
@@ -391,6 +557,44 @@ class ScrimUserData:
         cur.execute("DELETE FROM scrim_users WHERE internal_user_id = ?;", (internal_id,))
         cur.execute("DELETE FROM player_stats WHERE user_id = ?;", (internal_id,))
 
+    @staticmethod
+    @database_read
+    def get_usernames_by_discord_ids(cur, discord_ids: List[int]) -> Dict[int, Union[str, None]]:
+        '''Gets the stored username for each of the given Discord IDs in a single query. IDs that are not in the database are left out.'''
+        cur.execute("SELECT discord_id, username FROM scrim_users WHERE discord_id IN (SELECT value FROM json_each(?));", (json.dumps(discord_ids),))
+        return {result[0]: result[1] for result in cur.fetchall()}
+
+    @staticmethod
+    @database_transaction
+    def _apply_member_sync_chunk(cur, new_members: List[Tuple[int, str]], renamed_members: List[Tuple[int, str]]) -> None:
+        '''Inserts and renames one chunk of members in a single transaction.'''
+        cur.executemany("INSERT OR IGNORE INTO scrim_users (internal_user_id, username, discord_id) VALUES (?, ?, ?);", [(UUIDGenerator.generate_uuid(), username, discord_id) for discord_id, username in new_members])
+        cur.executemany("INSERT OR IGNORE INTO player_stats (user_id, mmr, priority) SELECT internal_user_id, 1000, 0 FROM scrim_users WHERE discord_id = ?;", [(discord_id,) for discord_id, _ in new_members])
+        cur.executemany("UPDATE scrim_users SET username = ? WHERE discord_id = ?;", [(username, discord_id) for discord_id, username in renamed_members])
+
+    @staticmethod
+    def sync_discord_members(members: List[Tuple[int, str]], chunk_size: int = 500) -> Tuple[int, int]:
+        '''Brings the stored users in line with a list of Discord members. Members that are missing are inserted and members whose name changed are renamed.
+        The diff is a single read. Writes are applied in chunks of `chunk_size` members, one transaction per chunk, so a large guild never holds the writer for long.
+        ### Parameters
+        * `members` - `(discord_id, username)` pairs for every member to sync.
+        * `chunk_size` - The number of members written per transaction.
+        ### Returns
+        * `Tuple[int, int]` - The number of members inserted and the number renamed.'''
+        if len(members) == 0:
+            return (0, 0)
+        stored_usernames = ScrimUserData.get_usernames_by_discord_ids([discord_id for discord_id, _ in members])
+        new_members: List[Tuple[int, str]] = []
+        renamed_members: List[Tuple[int, str]] = []
+        for discord_id, username in members:
+            if discord_id not in stored_usernames:
+                new_members.append((discord_id, username))
+            elif stored_usernames[discord_id] != username:
+                renamed_members.append((discord_id, username))
+        for i in range(0, max(len(new_members), len(renamed_members)), chunk_size):
+            ScrimUserData._apply_member_sync_chunk(new_members[i:i + chunk_size], renamed_members[i:i + chunk_size])
+        return (len(new_members), len(renamed_members))
+
 class ScrimTeams:
     @staticmethod
     @database_transaction
@@ -409,7 +613,7 @@ class ScrimTeams:
                     member = cur.execute("SELECT * FROM scrim_users WHERE discord_id = ?;", (member.id,)).fetchone()
             cur.execute("INSERT INTO team_members (team_id, user_id, is_owner) VALUES (?, ?, ?);", (team_id, member[0], BoolConvert.convert_bool_to_int(member[0] == team_owner[0])))
             if isinstance(team_owner, discord.Member) or isinstance(team_owner, discord.User):
-                team_owner = ScrimUserData.get_user_by_discord_id(cur, team_owner)
+                team_owner = ScrimUserData.get_user_by_discord_id(team_owner)
             member_scrimusers = []
             for member in team_members:
                 if isinstance(member, discord.Member) or isinstance(member, discord.User):
@@ -425,7 +629,7 @@ class ScrimTeams:
     
 class ScrimsData:
     @staticmethod
-    @database_transaction
+    @database_read
     def get_scrim_by_id(cur, scrim_id: str) -> Union[Scrim, None]:
         '''Gets a scrim by ID.'''
         cur.execute('''SELECT scrims.scrim_id, scrims.format, scrims.is_active, scrim_run_times.checkin_start_time, scrim_run_times.checkin_end_time, scrim_run_times.scrim_start_time
@@ -443,7 +647,7 @@ class ScrimsData:
                      DatetimeConvert.convert_str_to_datetime(result[5]) if result[5] is not None else None)
 
     @staticmethod
-    @database_transaction
+    @database_read
     def get_active_scrims(cur) -> Union[List[Scrim], None]:
         '''Gets all active scrims.'''
         cur.execute('''SELECT scrims.scrim_id, scrims.scrim_guild_id, scrims.format, scrims.is_active, scrim_run_times.checkin_start_time, scrim_run_times.checkin_end_time, scrim_run_times.scrim_start_time
@@ -461,6 +665,13 @@ class ScrimsData:
                 DatetimeConvert.convert_str_to_datetime(result[5]) if result[5] is not None else None,
                 DatetimeConvert.convert_str_to_datetime(result[6]) if result[6] is not None else None) for result in results]
 
+    @staticmethod
+    @database_read
+    def get_active_scrim_guild_ids(cur) -> List[int]:
+        '''Gets the IDs of the guilds that have an active scrim.'''
+        cur.execute("SELECT DISTINCT scrim_guild_id FROM scrims WHERE is_active = 1;")
+        return [result[0] for result in cur.fetchall()]
+
     @staticmethod
     @database_transaction
     def start_scrim(cur, scrim: Scrim) -> None:
@@ -478,7 +689,7 @@ class ScrimsData:
 
 class ScrimCheckinData:
     @staticmethod
-    @database_transaction
+    @database_read
     def get_check_in_channels(cur, guild_ids: Union[List[discord.Guild], discord.Guild, List[int], int, None] = None) -> List[int]:
         '''Gets the scrim check-in channels. If a guild is supplied, searches for that particular guild.'''
         out = []
@@ -513,7 +724,7 @@ class ScrimCheckinData:
         return out
     
     @staticmethod
-    @database_transaction
+    @database_read
     def get_dropout_channels(cur, guild_ids: Union[List[discord.Guild], discord.Guild, List[int], int, None] = None) -> List[int]:
         '''Gets the scrim dropout channels. If a guild is supplied, searches for that particular guild.'''
         out = []
@@ -548,7 +759,7 @@ class ScrimCheckinData:
         return out
     
     @staticmethod
-    @database_transaction
+    @database_read
     def get_checkin_channel_start_message_sent(cur, scrim_id: str) -> bool:
         '''Checks if the checkin start message for a specific scrim has been sent or not yet.'''
         cur.execute("SELECT * FROM scrim_checkin_update_message_sent WHERE scrim_id = ?;", (scrim_id,))
@@ -558,7 +769,7 @@ class ScrimCheckinData:
         return BoolConvert.convert_int_to_bool(result[1])
     
     @staticmethod
-    @database_transaction
+    @database_read
     def get_checkin_channel_end_message_sent(cur, scrim_id: str) -> bool:
         '''Checks if the checkin end message for a specific scrim has been sent or not yet.'''
         cur.execute("SELECT * FROM scrim_checkin_update_message_sent WHERE scrim_id = ?;", (scrim_id,))
@@ -584,7 +795,7 @@ class ScrimCheckinData:
 
 class ScrimDebugChannels:
     @staticmethod
-    @database_transaction
+    @database_read
     def get_debug_channels(cur: sqlean.Connection.cursor, guild: Union[discord.Guild, int, None] = None) -> List[int]:
         '''Gets debug channels within discord. If a guild is supplied, returns debug channels for that guild.'''
         if guild is None:
@@ -596,7 +807,7 @@ class ScrimDebugChannels:
         return [result[1] for result in cur.execute("SELECT * FROM scrim_debug_channels WHERE guild_id = ?;", (guild,)).fetchall()]
     
     @staticmethod
-    @database_transaction
+    @database_read
     def is_channel_debug(cur: sqlean.Connection.cursor, channel: Union[discord.TextChannel, discord.VoiceChannel, discord.StageChannel, discord.Thread, int]) -> bool:
         '''Determines if a channel is a debug channel.'''
         if isinstance(channel, discord.TextChannel) or isinstance(channel, discord.VoiceChannel) or isinstance(channel, discord.StageChannel) or isinstance(channel, discord.Thread):
@@ -634,7 +845,7 @@ class DeceiveAPIAuthData:
         return expiration <= datetime.now(timezone.utc)
 
     @staticmethod
-    @database_transaction
+    @database_read
     def get_auth_token(cur) -> Union[Tuple[str, datetime], None]:
         '''Gets the auth token from the database, if one exists.'''
         cur.execute("SELECT * FROM api_data;")
@@ -652,26 +863,148 @@ class DeceiveAPIAuthData:
 
 class SweetUserCache:
     @staticmethod
-    @database_transaction
-    def get_user(cur, sweet_id: str) -> Union[SweetUser, None]:
-        '''Gets a user from the cache.'''
-        cur.execute("SELECT * FROM sweet_user_cache WHERE sweet_id = ?;", (sweet_id,))
-        result = cur.fetchone()
+    def _remember_user(user: SweetUser, last_updated: datetime, size_bytes: int) -> None:
+        '''Keeps a parsed user in memory for as long as it may still be served. A copy already in memory is only replaced by one at least as new, so a row
+        read just before `set_users` wrote a newer profile can't overwrite the newer copy.'''
+        remaining_seconds = (last_updated + timedelta(seconds=sweet_user_cache_hard_expiration_seconds) - datetime.now(timezone.utc)).total_seconds()
+        sweet_user_memory_cache.put(user.sweet_id, (user, last_updated), size_bytes, remaining_seconds, replace_if=lambda entry: entry[1] <= last_updated)
+
+    @staticmethod
+    def _decode_user_row(data_blob: Union[bytes, None], json_data: Union[str, None], last_updated: str) -> Tuple[SweetUser, datetime, int]:
+        '''Decodes a cached user, along with its last updated timestamp and stored size.'''
+        if data_blob is not None:
+            return SweetUser.from_compact(data_blob), DatetimeConvert.convert_str_to_datetime(last_updated), len(data_blob)
+        return SweetUser.from_json(json_data), DatetimeConvert.convert_str_to_datetime(last_updated), len(json_data)
+
+    @staticmethod
+    @database_read
+    def _get_user_row(cur, sweet_id: str) -> Union[Tuple[str, Union[bytes, None], Union[str, None], str], None]:
+        cur.execute("SELECT sweet_id, data_blob, json_data, last_updated FROM sweet_user_cache WHERE sweet_id = ?;", (sweet_id,))
+        return cur.fetchone()
+
+    @staticmethod
+    def get_user_entry(sweet_id: str) -> Union[Tuple[SweetUser, datetime], None]:
+        '''Gets a user from the cache along with when it was last updated. Recently read users are served from memory.
+        ### Parameters
+        * `sweet_id` - The user's Sweet ID.
+        ### Returns
+        * `Tuple[SweetUser, datetime]` - The user and its last updated timestamp, or `None` if the user is not cached.'''
+        entry = sweet_user_memory_cache.get(sweet_id)
+        if entry is not None:
+            return entry
+        result = SweetUserCache._get_user_row(sweet_id)
         if result is None:
             return None
-        return SweetUser.from_json(result[1])
+        user, last_updated, size_bytes = SweetUserCache._decode_user_row(result[1], result[2], result[3])
+        SweetUserCache._remember_user(user, last_updated, size_bytes)
+        return user, last_updated
 
     @staticmethod
-    @database_transaction
-    def set_user(cur, user: SweetUser) -> None:
-        '''Sets a user in the cache.'''
-        cur.execute("DELETE FROM sweet_user_cache WHERE sweet_id = ?;", (user.sweet_id,))
-        cur.execute("INSERT INTO sweet_user_cache (sweet_id, json_data, last_updated) VALUES (?, ?, ?);", (user.sweet_id, user.dump_json(), DatetimeConvert.convert_datetime_to_str(datetime.now(timezone.utc))))
+    def peek_user_entry(sweet_id: str) -> Union[Tuple[SweetUser, datetime], None]:
+        '''Like `get_user_entry`, but only looks in memory. Never touches the database, so it is safe to call from the event loop.'''
+        return sweet_user_memory_cache.get(sweet_id)
+
+    @staticmethod
+    def get_user(sweet_id: str) -> Union[SweetUser, None]:
+        '''Gets a user from the cache. The returned object is shared with the in-memory cache and should not be modified.'''
+        entry = SweetUserCache.get_user_entry(sweet_id)
+        return entry[0] if entry is not None else None
+
+    @staticmethod
+    @database_read
+    def _get_user_rows(cur, sweet_ids: List[str]) -> List[Tuple[str, Union[bytes, None], Union[str, None], str]]:
+        cur.execute("SELECT sweet_id, data_blob, json_data, last_updated FROM sweet_user_cache WHERE sweet_id IN (SELECT value FROM json_each(?));", (json.dumps(sweet_ids),))
+        return cur.fetchall()
+
+    @staticmethod
+    def get_user_entries(sweet_ids: List[str]) -> Dict[str, Tuple[SweetUser, datetime]]:
+        '''Batch version of `get_user_entry`. Users that are not in memory are read in a single query.
+        ### Parameters
+        * `sweet_ids` - The Sweet IDs to look up.
+        ### Returns
+        * `Dict[str, Tuple[SweetUser, datetime]]` - Each cached user and its last updated timestamp, keyed by Sweet ID. Users that are not cached are left out.'''
+        out: Dict[str, Tuple[SweetUser, datetime]] = {}
+        missing: List[str] = []
+        for sweet_id in sweet_ids:
+            entry = sweet_user_memory_cache.get(sweet_id)
+            if entry is not None:
+                out[sweet_id] = entry
+            else:
+                missing.append(sweet_id)
+        if len(missing) > 0:
+            for sweet_id, data_blob, json_data, last_updated_str in SweetUserCache._get_user_rows(missing):
+                user, last_updated, size_bytes = SweetUserCache._decode_user_row(data_blob, json_data, last_updated_str)
+                SweetUserCache._remember_user(user, last_updated, size_bytes)
+                out[sweet_id] = (user, last_updated)
+        return out
 
     @staticmethod
     @database_transaction
-    def get_user_last_updated(cur, sweet_id: str) -> Union[datetime, None]:
+    def _set_user_rows(cur, rows: List[Tuple[str, bytes, int, str]]) -> None:
+        cur.executemany("DELETE FROM sweet_user_cache WHERE sweet_id = ?;", [(row[0],) for row in rows])
+        cur.executemany("INSERT INTO sweet_user_cache (sweet_id, data_blob, format_version, last_updated) VALUES (?, ?, ?, ?);", rows)
+
+    @staticmethod
+    def set_users(users: List[SweetUser]) -> None:
+        '''Sets several users in the cache in a single transaction, replacing any copies held in memory.'''
+        for user in users:
+            sweet_user_memory_cache.invalidate(user.sweet_id)
+        data_blobs = [user.dump_compact() for user in users]
+        last_updated = datetime.now(timezone.utc)
+        last_updated_str = DatetimeConvert.convert_datetime_to_str(last_updated)
+        SweetUserCache._set_user_rows([(user.sweet_id, data, compact_format_version, last_updated_str) for user, data in zip(users, data_blobs)])
+        for user, data in zip(users, data_blobs):
+            SweetUserCache._remember_user(user, last_updated, len(data))
+        scrim_stats_store.ingest_users(users)
+
+    @staticmethod
+    def set_user(user: SweetUser) -> None:
+        '''Sets a user in the cache, replacing any copy held in memory.'''
+        SweetUserCache.set_users([user])
+
+    @staticmethod
+    @database_read
+    def _get_user_rows_after(cur, after_sweet_id: str, limit: int) -> List[Tuple[str, Union[bytes, None], Union[str, None], str]]:
+        cur.execute("SELECT sweet_id, data_blob, json_data, last_updated FROM sweet_user_cache WHERE sweet_id > ? ORDER BY sweet_id LIMIT ?;", (after_sweet_id, limit))
+        return cur.fetchall()
+
+    @staticmethod
+    def load_stats_store(chunk_size: int = 256) -> int:
+        '''Rebuilds the columnar stats store from every cached user, reading them in chunks so no single read holds a connection for long. Returns the number of users loaded.
+        Cached users are kept up to date in the store by `set_users` afterwards.'''
+        scrim_stats_store.clear()
+        loaded = 0
+        skipped = 0
+        after_sweet_id = ""
+        while True:
+            rows = SweetUserCache._get_user_rows_after(after_sweet_id, chunk_size)
+            if len(rows) == 0:
+                break
+            users: List[SweetUser] = []
+            for sweet_id, data_blob, json_data, last_updated in rows:
+                try:
+                    users.append(SweetUserCache._decode_user_row(data_blob, json_data, last_updated)[0])
+                except (ValueError, TypeError, KeyError):
+                    skipped += 1
+            scrim_stats_store.ingest_users(users)
+            loaded += len(users)
+            after_sweet_id = rows[-1][0]
+        if skipped > 0:
+            scrim_logger.warning(f"Skipped {skipped} cached Sweet users that could not be read while loading the stats store.")
+        scrim_logger.info(f"Loaded {loaded} cached Sweet users into the stats store.")
+        return loaded
+
+    @staticmethod
+    def get_user_last_updated(sweet_id: str) -> Union[datetime, None]:
         '''Gets the last updated timestamp for a user.'''
+        entry = sweet_user_memory_cache.get(sweet_id)
+        if entry is not None:
+            return entry[1]
+        return SweetUserCache._get_user_last_updated_row(sweet_id)
+
+    @staticmethod
+    @database_read
+    def _get_user_last_updated_row(cur, sweet_id: str) -> Union[datetime, None]:
         cur.execute("SELECT last_updated FROM sweet_user_cache WHERE sweet_id = ?;", (sweet_id,))
         result = cur.fetchone()
         if result is None:
@@ -679,34 +1012,42 @@ class SweetUserCache:
         return DatetimeConvert.convert_str_to_datetime(result[0])
 
     @staticmethod
-    @database_transaction
-    def has_user_cache_expired(cur, sweet_id: str) -> bool:
+    def get_memory_cache_stats() -> Dict[str, Union[int, float]]:
+        '''Returns the hit, miss and eviction counters of the in-memory user cache.'''
+        return sweet_user_memory_cache.get_stats()
+
+    @staticmethod
+    def has_user_cache_expired(sweet_id: str) -> bool:
         '''Determines if the user cache has expired.'''
-        last_updated = SweetUserCache.get_user_last_updated(cur, sweet_id)
+        last_updated = SweetUserCache.get_user_last_updated(sweet_id)
         if last_updated is None:
             return True
         return last_updated + timedelta(seconds=sweet_user_cache_expiration_seconds) <= datetime.now(timezone.utc)
 
     @staticmethod
-    @database_transaction
+    @database_read
     def get_user_partial_by_id(cur, sweet_id: str) -> Union[SweetUserPartial, None]:
         '''Gets a user partial from the cache.'''
         cur.execute("SELECT * FROM sweet_user_partial_cache WHERE sweet_id = ?;", (sweet_id,))
         result = cur.fetchone()
         if result is None:
             return None
-        return SweetUserPartial(result[0], result[1], DatetimeConvert.convert_str_to_datetime(result[2]))
+        return SweetUserPartial(result[0], result[1])
 
-    def get_user_partial_by_name(cur, name: str) -> Union[List[SweetUserPartial], None]:
+    @staticmethod
+    @database_read
+    def get_user_partial_entries_by_name(cur, name: str) -> List[Tuple[SweetUserPartial, datetime]]:
+        '''Gets the user partials matching a name from the cache, along with when each was last updated.'''
+        cur.execute("SELECT sweet_id, display_name, last_updated FROM sweet_user_partial_cache WHERE display_name = ?;", (name,))
+        return [(SweetUserPartial(result[0], result[1]), DatetimeConvert.convert_str_to_datetime(result[2])) for result in cur.fetchall()]
+
+    @staticmethod
+    def get_user_partial_by_name(name: str) -> List[SweetUserPartial]:
         '''Gets a user partial from the cache by name. As names are not unique, returns a list instead.'''
-        cur.execute("SELECT * FROM sweet_user_partial_cache WHERE display_name = ?;", (name,))
-        results = cur.fetchall()
-        if results is None:
-            return None
-        return [SweetUserPartial(result[0], result[1], DatetimeConvert.convert_str_to_datetime(result[2])) for result in results]
+        return [entry[0] for entry in SweetUserCache.get_user_partial_entries_by_name(name)]
 
     @staticmethod
-    @database_transaction
+    @database_read
     def get_user_partial_last_updated(cur, sweet_id: str) -> Union[datetime, None]:
         '''Gets the last updated timestamp for a user partial.'''
         cur.execute("SELECT last_updated FROM sweet_user_partial_cache WHERE sweet_id = ?;", (sweet_id,))
@@ -723,10 +1064,10 @@ class SweetUserCache:
         cur.execute("INSERT INTO sweet_user_partial_cache (sweet_id, display_name, last_updated) VALUES (?, ?, ?);", (user.sweet_id, user.display_name, DatetimeConvert.convert_datetime_to_str(datetime.now(timezone.utc))))
 
     @staticmethod
-    @database_transaction
+    @database_read
     def has_user_partial_cache_expired(cur, sweet_id: str) -> bool:
         '''Determines if the user partial cache has expired.'''
-        last_updated = SweetUserCache.get_user_partial_last_updated(cur, sweet_id)
+        last_updated = SweetUserCache.get_user_partial_last_updated(sweet_id)
         if last_updated is None:
             return True
         return last_updated + timedelta(seconds=sweet_user_cache_expiration_seconds) <= datetime.now(timezone.utc)
@@ -735,7 +1076,7 @@ class SweetUserCache:
 
 class DeceiveReaderActiveChannels:
     @staticmethod
-    @database_transaction
+    @database_read
     def get_active_channels(cur) -> List[int]:
         '''Gets the active channels from the database.'''
         cur.execute("SELECT * FROM ocr_reader_channels;")
@@ -757,4 +1098,136 @@ class DeceiveReaderActiveChannels:
     @database_transaction
     def remove_active_channel(cur, channel_id: int) -> None:
         '''Removes an active channel from the database.'''
-        cur.execute("DELETE FROM ocr_reader_channels WHERE channel_id = ?;", (channel_id,))
\ No newline at end of file
+        cur.execute("DELETE FROM ocr_reader_channels WHERE channel_id = ?;", (channel_id,))
+
+class DeceiveReaderScoreCache:
+    '''Scores already read from screenshots, keyed by hashes of the image. Scores are stored as the tuple
+    (total_score, elimination_score, vault_terminal_score, entered_vault, last_spy_standing, extracted, allies_revived).'''
+    @staticmethod
+    def _to_signed(perceptual_hash: int) -> int: # SQLite integers are signed 64-bit.
+        return perceptual_hash - (1 << 64) if perceptual_hash >= (1 << 63) else perceptual_hash
+
+    @staticmethod
+    def _to_unsigned(perceptual_hash: int) -> int:
+        return perceptual_hash + (1 << 64) if perceptual_hash < 0 else perceptual_hash
+
+    @staticmethod
+    @database_read
+    def get_score_by_hashes(cur, content_hash: str, pixel_hash: str) -> Union[Tuple[Tuple[int, int, int, bool, bool, bool, int], str], None]:
+        '''Gets the cached score of a screenshot with the same file or the same pixels. Same-file matches are preferred.
+        ### Returns
+        * `Tuple[score, str]` - The score and the content hash of the cached screenshot it belongs to. `None` if neither hash matched.'''
+        row = cur.execute("SELECT content_hash, total_score, elimination_score, vault_terminal_score, entered_vault, last_spy_standing, extracted, allies_revived FROM ocr_reader_score_cache WHERE content_hash = ? OR pixel_hash = ? ORDER BY content_hash = ? DESC LIMIT 1;", (content_hash, pixel_hash, content_hash)).fetchone()
+        if row is None:
+            return None
+        return (row[1], row[2], row[3], BoolConvert.convert_int_to_bool(row[4]), BoolConvert.convert_int_to_bool(row[5]), BoolConvert.convert_int_to_bool(row[6]), row[7]), row[0]
+
+    @staticmethod
+    @database_read
+    def get_score_by_content_hash(cur, content_hash: str) -> Union[Tuple[int, int, int, bool, bool, bool, int], None]:
+        row = cur.execute("SELECT total_score, elimination_score, vault_terminal_score, entered_vault, last_spy_standing, extracted, allies_revived FROM ocr_reader_score_cache WHERE content_hash = ?;", (content_hash,)).fetchone()
+        if row is None:
+            return None
+        return (row[0], row[1], row[2], BoolConvert.convert_int_to_bool(row[3]), BoolConvert.convert_int_to_bool(row[4]), BoolConvert.convert_int_to_bool(row[5]), row[6])
+
+    @staticmethod
+    @database_read
+    def get_perceptual_hashes(cur) -> Dict[int, str]:
+        '''Gets the perceptual hash of every cached screenshot, mapped to its content hash.'''
+        return {DeceiveReaderScoreCache._to_unsigned(row[0]): row[1] for row in cur.execute("SELECT perceptual_hash, content_hash FROM ocr_reader_score_cache;").fetchall()}
+
+    @staticmethod
+    @database_transaction
+    def add_score(cur, content_hash: str, pixel_hash: str, perceptual_hash: int, score: Tuple[int, int, int, bool, bool, bool, int]) -> None:
+        '''Caches the score read from a screenshot. A screenshot that is already cached keeps its first score.'''
+        cur.execute("INSERT OR IGNORE INTO ocr_reader_score_cache (content_hash, pixel_hash, perceptual_hash, total_score, elimination_score, vault_terminal_score, entered_vault, last_spy_standing, extracted, allies_revived, calculation_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                    (content_hash, pixel_hash, DeceiveReaderScoreCache._to_signed(perceptual_hash), score[0], score[1], score[2],
+                     BoolConvert.convert_bool_to_int(score[3]), BoolConvert.convert_bool_to_int(score[4]), BoolConvert.convert_bool_to_int(score[5]), score[6],
+                     DatetimeConvert.convert_datetime_to_str(datetime.now(timezone.utc))))
+
+    @staticmethod
+    @database_transaction
+    def record_hit(cur, content_hash: str) -> None:
+        cur.execute("UPDATE ocr_reader_score_cache SET hit_count = hit_count + 1, last_hit_time = ? WHERE content_hash = ?;", (DatetimeConvert.convert_datetime_to_str(datetime.now(timezone.utc)), content_hash))
+
+    @staticmethod
+    @database_transaction
+    def remove_scores(cur, content_hash: str, pixel_hash: str) -> List[str]:
+        '''Forgets the cached score of a screenshot with the same file or the same pixels, so it is read again.
+        ### Returns
+        * `List[str]` - The content hashes of the entries that were removed.'''
+        removed = [row[0] for row in cur.execute("SELECT content_hash FROM ocr_reader_score_cache WHERE content_hash = ? OR pixel_hash = ?;", (content_hash, pixel_hash)).fetchall()]
+        cur.execute("DELETE FROM ocr_reader_score_cache WHERE content_hash = ? OR pixel_hash = ?;", (content_hash, pixel_hash))
+        return removed
+
+class DeceiveReaderResults:
+    '''Every score the reader has read, along with the screenshot it was read from. Scores are written with the column order of `DeceiveReaderScoreCache`.
+    Aggregates are returned as tuples of (user_id, results, total of total_score, best total_score), highest total first.'''
+    @staticmethod
+    @database_read
+    def get_stored_image_hashes(cur, content_hashes: List[str]) -> Set[str]:
+        '''Gets which of these screenshots are already stored, so they aren't compressed again.'''
+        stored: Set[str] = set()
+        for i in range(0, len(content_hashes), 500): # Stay under SQLite's limit on bound parameters.
+            chunk = content_hashes[i:i + 500]
+            stored.update(row[0] for row in cur.execute(f"SELECT content_hash FROM ocr_reader_images WHERE content_hash IN ({', '.join('?' * len(chunk))});", chunk).fetchall())
+        return stored
+
+    @staticmethod
+    @database_transaction
+    def add_results(cur, results: List[Dict[str, Union[str, int, None]]], images: List[Tuple[str, bytes, str, int]]) -> int:
+        '''Writes a batch of results and the screenshots they were read from in one transaction.
+        ### Parameters
+        * `results` - One dict per result with the keys `result_id`, `guild_id`, `channel_id`, `discord_id`, `content_hash`, `image_url`, `total_score`,
+        `elimination_score`, `vault_terminal_score`, `entered_vault`, `last_spy_standing`, `extracted`, `allies_revived` and `calculation_time`.
+        The result is attributed to the newest active scrim in its guild, if there is one. A screenshot the same user already has a result for in that scrim,
+        or outside any scrim if there is none, is skipped so reposts aren't counted twice.
+        * `images` - (content_hash, image, image_format, original_size) for each screenshot. Screenshots that are already stored are skipped.
+        ### Returns
+        * `int` - The number of results written. Reposts and results from users that aren't in scrim_users are skipped.'''
+        stored_at = DatetimeConvert.convert_datetime_to_str(datetime.now(timezone.utc))
+        cur.executemany("INSERT OR IGNORE INTO ocr_reader_images (content_hash, image, image_format, original_size, stored_at) VALUES (?, ?, ?, ?, ?);",
+                        [(content_hash, image, image_format, original_size, stored_at) for content_hash, image, image_format, original_size in images])
+        cur.executemany('''INSERT OR IGNORE INTO ocr_reader_results
+                        (result_id, guild_id, channel_id, user_id, content_hash, image_url, total_score, elimination_score, vault_terminal_score,
+                        entered_vault, last_spy_standing, extracted, allies_revived, manual_adjustment, calculation_time, scrim_id)
+                        SELECT :result_id, :guild_id, :channel_id, internal_user_id, :content_hash, :image_url, :total_score, :elimination_score, :vault_terminal_score,
+                        :entered_vault, :last_spy_standing, :extracted, :allies_revived, 0, :calculation_time,
+                        (SELECT scrim_id FROM scrims WHERE scrim_guild_id = :guild_id AND is_active = 1 ORDER BY rowid DESC LIMIT 1)
+                        FROM scrim_users WHERE discord_id = :discord_id;''', results)
+        return cur.rowcount
+
+    @staticmethod
+    @database_read
+    def get_image(cur, content_hash: str) -> Union[Tuple[bytes, str], None]:
+        '''Gets a stored screenshot and its format (png, jpeg, webp...). `None` if it isn't stored.'''
+        row = cur.execute("SELECT image, image_format FROM ocr_reader_images WHERE content_hash = ?;", (content_hash,)).fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    @staticmethod
+    @database_read
+    def get_scrim_score_totals(cur, scrim_id: str) -> List[Tuple[str, int, int, int]]:
+        '''Totals the scores read during a scrim, per user.'''
+        return cur.execute('''SELECT user_id, COUNT(*), SUM(total_score + manual_adjustment), MAX(total_score + manual_adjustment) FROM ocr_reader_results
+                           WHERE scrim_id = ? GROUP BY user_id ORDER BY 3 DESC;''', (scrim_id,)).fetchall()
+
+    @staticmethod
+    @database_read
+    def get_score_totals(cur, guild_id: int, start: datetime, end: datetime, channel_id: Union[int, None] = None) -> List[Tuple[str, int, int, int]]:
+        '''Totals the scores read in a guild, or in one of its channels, between `start` (inclusive) and `end` (exclusive), per user.'''
+        column, key = ("channel_id", channel_id) if channel_id is not None else ("guild_id", guild_id)
+        return cur.execute(f'''SELECT user_id, COUNT(*), SUM(total_score + manual_adjustment), MAX(total_score + manual_adjustment) FROM ocr_reader_results
+                           WHERE {column} = ? AND guild_id = ? AND calculation_time >= ? AND calculation_time < ? GROUP BY user_id ORDER BY 3 DESC;''',
+                           (key, guild_id, DatetimeConvert.convert_datetime_to_str(start), DatetimeConvert.convert_datetime_to_str(end))).fetchall()
+
+    @staticmethod
+    @database_read
+    def get_user_results(cur, user_id: str, start: Union[datetime, None] = None, limit: int = 50) -> List[Tuple[str, Tuple[int, int, int, bool, bool, bool, int], datetime, Union[str, None]]]:
+        '''Gets a user's most recent results, newest first, optionally only those since `start`.
+        ### Returns
+        * `List[Tuple[str, score, datetime, str]]` - The result ID, the score, when it was read and the scrim it was read during, if any.'''
+        since = DatetimeConvert.convert_datetime_to_str(start) if start is not None else ""
+        rows = cur.execute('''SELECT result_id, total_score, elimination_score, vault_terminal_score, entered_vault, last_spy_standing, extracted, allies_revived, calculation_time, scrim_id
+                           FROM ocr_reader_results WHERE user_id = ? AND calculation_time >= ? ORDER BY calculation_time DESC LIMIT ?;''', (user_id, since, limit)).fetchall()
+        return [(row[0], (row[1], row[2], row[3], BoolConvert.convert_int_to_bool(row[4]), BoolConvert.convert_int_to_bool(row[5]), BoolConvert.convert_int_to_bool(row[6]), row[7]),
+                 DatetimeConvert.convert_str_to_datetime(row[8]), row[9]) for row in rows]
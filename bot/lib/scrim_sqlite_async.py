@@ -0,0 +1,162 @@
+import asyncio, atexit, functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Any, Union
+from lib.scrim_logging import scrim_logger
+from lib.scrim_sqlite import ScrimDatabaseNotOpenError, ScrimUserData, ScrimsData, ScrimCheckinData, ScrimDebugChannels, DeceiveAPIAuthData, SweetUserCache, DeceiveReaderActiveChannels, DeceiveReaderScoreCache, DeceiveReaderResults
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+db_executor_max_workers: int = 4 # Capped by the connection pool size in start_db_executor.
+db_executor_max_pending: int = 256
+
+class ScrimDBExecutor:
+    '''Runs blocking database calls on dedicated threads so coroutines can await them without stalling the event loop.
+
+    At most `max_pending` calls are queued or running at once. Past that, callers wait on the event loop rather than growing the queue.'''
+    max_workers: int
+    max_pending: int
+    _executor: ThreadPoolExecutor
+    _pending: asyncio.Semaphore
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 256):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ScrimDBExecutor")
+        self._pending = asyncio.Semaphore(max_pending)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        '''Runs a blocking function on the database executor and waits for its result.
+        ### Parameters
+        * `func` - The function to run.
+        * `*args`, `**kwargs` - The arguments to call it with.
+        ### Returns
+        * `Any` - Whatever the function returns. Exceptions raised by the function are re-raised here.'''
+        async with self._pending:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        '''Waits for queued calls to finish and stops the executor threads.'''
+        self._executor.shutdown(wait=True)
+        scrim_logger.debug("Database executor shut down.")
+
+scrim_db_executor: Union[ScrimDBExecutor, None] = None # Set by start_db_executor.
+
+def start_db_executor(db_pool_size: int) -> ScrimDBExecutor:
+    '''Starts the database executor. The bot calls it once at startup, after open_scrim_db.
+    ### Parameters
+    * `db_pool_size` - The number of pooled read connections. There are never more executor threads than this, so no thread waits on a connection.
+    ### Returns
+    * `ScrimDBExecutor` - The executor the awaitable classes now use.'''
+    global scrim_db_executor
+    if scrim_db_executor is not None:
+        scrim_db_executor.shutdown()
+    scrim_db_executor = ScrimDBExecutor(max(1, min(db_executor_max_workers, db_pool_size)), db_executor_max_pending)
+    atexit.register(scrim_db_executor.shutdown) # Registered after the connection pool, so it runs before the pool is closed.
+    return scrim_db_executor
+
+def _awaitable(func: Callable) -> staticmethod:
+    '''Wraps a blocking data-access method in a coroutine that runs it on the database executor.'''
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if scrim_db_executor is None:
+            raise ScrimDatabaseNotOpenError()
+        return await scrim_db_executor.run(func, *args, **kwargs)
+    return staticmethod(wrapper)
+
+### USERS ###
+
+class AsyncScrimUserData:
+    '''Awaitable counterpart of `ScrimUserData`.'''
+    insert_user_from_discord = _awaitable(ScrimUserData.insert_user_from_discord)
+    get_user_by_discord_id = _awaitable(ScrimUserData.get_user_by_discord_id)
+    get_user_by_sweet_id = _awaitable(ScrimUserData.get_user_by_sweet_id)
+    get_user_by_twitch_id = _awaitable(ScrimUserData.get_user_by_twitch_id)
+    get_user_by_id = _awaitable(ScrimUserData.get_user_by_id)
+    connect_discord_to_id = _awaitable(ScrimUserData.connect_discord_to_id)
+    connect_sweet_to_id = _awaitable(ScrimUserData.connect_sweet_to_id)
+    connect_twitch_to_id = _awaitable(ScrimUserData.connect_twitch_to_id)
+    update_user = _awaitable(ScrimUserData.update_user)
+    update_username = _awaitable(ScrimUserData.update_username)
+    update_username_by_discord_id = _awaitable(ScrimUserData.update_username_by_discord_id)
+    update_mmr = _awaitable(ScrimUserData.update_mmr)
+    update_priority = _awaitable(ScrimUserData.update_priority)
+    adjust_user_mmr = _awaitable(ScrimUserData.adjust_user_mmr)
+    adjust_user_priority = _awaitable(ScrimUserData.adjust_user_priority)
+    delete_user = _awaitable(ScrimUserData.delete_user)
+    get_usernames_by_discord_ids = _awaitable(ScrimUserData.get_usernames_by_discord_ids)
+    sync_discord_members = _awaitable(ScrimUserData.sync_discord_members)
+
+class AsyncScrimsData:
+    '''Awaitable counterpart of `ScrimsData`.'''
+    get_scrim_by_id = _awaitable(ScrimsData.get_scrim_by_id)
+    get_active_scrims = _awaitable(ScrimsData.get_active_scrims)
+    get_active_scrim_guild_ids = _awaitable(ScrimsData.get_active_scrim_guild_ids)
+    start_scrim = _awaitable(ScrimsData.start_scrim)
+    end_scrim = _awaitable(ScrimsData.end_scrim)
+
+class AsyncScrimCheckinData:
+    '''Awaitable counterpart of `ScrimCheckinData`.'''
+    get_check_in_channels = _awaitable(ScrimCheckinData.get_check_in_channels)
+    get_dropout_channels = _awaitable(ScrimCheckinData.get_dropout_channels)
+    get_checkin_channel_start_message_sent = _awaitable(ScrimCheckinData.get_checkin_channel_start_message_sent)
+    get_checkin_channel_end_message_sent = _awaitable(ScrimCheckinData.get_checkin_channel_end_message_sent)
+    set_checkin_channel_start_message_sent = _awaitable(ScrimCheckinData.set_checkin_channel_start_message_sent)
+    set_checkin_channel_start_message = _awaitable(ScrimCheckinData.set_checkin_channel_start_message)
+
+class AsyncScrimDebugChannels:
+    '''Awaitable counterpart of `ScrimDebugChannels`.'''
+    get_debug_channels = _awaitable(ScrimDebugChannels.get_debug_channels)
+    is_channel_debug = _awaitable(ScrimDebugChannels.is_channel_debug)
+    add_debug_channel = _awaitable(ScrimDebugChannels.add_debug_channel)
+    remove_debug_channel = _awaitable(ScrimDebugChannels.remove_debug_channel)
+
+### DECEIVE API ###
+
+class AsyncDeceiveAPIAuthData:
+    '''Awaitable counterpart of `DeceiveAPIAuthData`.'''
+    is_token_expired = staticmethod(DeceiveAPIAuthData.is_token_expired) # Pure function, no need to leave the event loop.
+    get_auth_token = _awaitable(DeceiveAPIAuthData.get_auth_token)
+    set_auth_token = _awaitable(DeceiveAPIAuthData.set_auth_token)
+
+class AsyncSweetUserCache:
+    '''Awaitable counterpart of `SweetUserCache`.'''
+    peek_user_entry = staticmethod(SweetUserCache.peek_user_entry) # Memory only, no need to leave the event loop.
+    get_user_entry = _awaitable(SweetUserCache.get_user_entry)
+    get_user_entries = _awaitable(SweetUserCache.get_user_entries)
+    get_user = _awaitable(SweetUserCache.get_user)
+    set_user = _awaitable(SweetUserCache.set_user)
+    set_users = _awaitable(SweetUserCache.set_users)
+    load_stats_store = _awaitable(SweetUserCache.load_stats_store)
+    get_user_last_updated = _awaitable(SweetUserCache.get_user_last_updated)
+    has_user_cache_expired = _awaitable(SweetUserCache.has_user_cache_expired)
+    get_user_partial_by_id = _awaitable(SweetUserCache.get_user_partial_by_id)
+    get_user_partial_by_name = _awaitable(SweetUserCache.get_user_partial_by_name)
+    get_user_partial_entries_by_name = _awaitable(SweetUserCache.get_user_partial_entries_by_name)
+    get_user_partial_last_updated = _awaitable(SweetUserCache.get_user_partial_last_updated)
+    set_user_partial = _awaitable(SweetUserCache.set_user_partial)
+    has_user_partial_cache_expired = _awaitable(SweetUserCache.has_user_partial_cache_expired)
+
+### READER ###
+
+class AsyncDeceiveReaderActiveChannels:
+    '''Awaitable counterpart of `DeceiveReaderActiveChannels`.'''
+    get_active_channels = _awaitable(DeceiveReaderActiveChannels.get_active_channels)
+    add_active_channel = _awaitable(DeceiveReaderActiveChannels.add_active_channel)
+    remove_active_channel = _awaitable(DeceiveReaderActiveChannels.remove_active_channel)
+
+class AsyncDeceiveReaderScoreCache:
+    '''Awaitable counterpart of `DeceiveReaderScoreCache`.'''
+    get_score_by_hashes = _awaitable(DeceiveReaderScoreCache.get_score_by_hashes)
+    get_score_by_content_hash = _awaitable(DeceiveReaderScoreCache.get_score_by_content_hash)
+    get_perceptual_hashes = _awaitable(DeceiveReaderScoreCache.get_perceptual_hashes)
+    add_score = _awaitable(DeceiveReaderScoreCache.add_score)
+    record_hit = _awaitable(DeceiveReaderScoreCache.record_hit)
+    remove_scores = _awaitable(DeceiveReaderScoreCache.remove_scores)
+
+class AsyncDeceiveReaderResults:
+    '''Awaitable counterpart of `DeceiveReaderResults`. Results are written by `OCRResultWriter` on its own thread, so only the reads are wrapped.'''
+    get_image = _awaitable(DeceiveReaderResults.get_image)
+    get_scrim_score_totals = _awaitable(DeceiveReaderResults.get_scrim_score_totals)
+    get_score_totals = _awaitable(DeceiveReaderResults.get_score_totals)
+    get_user_results = _awaitable(DeceiveReaderResults.get_user_results)
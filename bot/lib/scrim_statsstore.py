@@ -0,0 +1,236 @@
+import threading
+import numpy as np
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, Union
+from lib.DI_API_Obj.sweet_user import SweetUser
+from lib.DI_API_Obj.gamemode import GameMode
+from lib.DI_API_Obj.gamemode_counter import GamemodeCounter
+
+if __name__ == "__main__":
+    print("This file is not meant to be run directly.")
+
+general_stat_names: Tuple[str, ...] = ("eliminations", "deaths", "matches_played", "matches_won", "time_played") # In GeneralAccountStats attribute order.
+_gamemode_positions: Dict[GameMode, int] = {GameMode.SOLO: 0, GameMode.DUO: 1, GameMode.TRIO: 2}
+_stat_dtype = np.int64
+
+def _season_label(season: Union[int, str, None]) -> Union[int, str]:
+    '''Lifetime stats are stored under the "lifetime" season. Seasons read back from old JSON rows may be digit strings.'''
+    if season is None:
+        return "lifetime"
+    return int(season) if isinstance(season, str) and season.isdigit() else season
+
+def _counts(counter: Optional[GamemodeCounter]) -> Tuple[int, int, int]:
+    if counter is None:
+        return (0, 0, 0)
+    return (counter.solo or 0, counter.duo or 0, counter.trio or 0)
+
+def _grow(array: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    '''Returns a zeroed array of the new shape with the old contents copied into its leading corner.'''
+    if array.shape == shape:
+        return array
+    out = np.zeros(shape, dtype=array.dtype)
+    out[tuple(slice(0, size) for size in array.shape)] = array
+    return out
+
+class _AxisLabels:
+    '''Maps the labels of one array axis (players, seasons, agents or gadgets) to their positions.'''
+    __slots__ = ("labels", "positions")
+    labels: List[Hashable]
+    positions: Dict[Hashable, int]
+
+    def __init__(self):
+        self.labels = []
+        self.positions = {}
+
+    def add(self, label: Hashable) -> int:
+        position = self.positions.get(label)
+        if position is None:
+            position = len(self.labels)
+            self.positions[label] = position
+            self.labels.append(label)
+        return position
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+class ScrimStatsStore:
+    '''Keeps the stats of every cached Sweet user in NumPy arrays so they can be aggregated across players without walking each profile.
+
+    Arrays are indexed by (player, season, agent or gadget, gamemode). Lifetime stats are the "lifetime" season.
+    Ingesting a user again overwrites their row, so the store can be fed every profile written to the cache.'''
+    _lock: threading.Lock
+    _players: _AxisLabels
+    _seasons: _AxisLabels
+    _agents: _AxisLabels
+    _gadgets: _AxisLabels
+    _player_capacity: int
+    _general: np.ndarray # (player, season, general stat, gamemode)
+    _agent_picks: np.ndarray # (player, season, agent, gamemode)
+    _agent_wins: np.ndarray # (player, season, agent, gamemode)
+    _agent_playtime: np.ndarray # (player, season, agent)
+    _gadget_picks: np.ndarray # (player, season, gadget, gamemode)
+
+    def __init__(self, initial_player_capacity: int = 64):
+        self._lock = threading.Lock()
+        self._player_capacity = initial_player_capacity
+        self._reset()
+
+    def _reset(self) -> None:
+        self._players = _AxisLabels()
+        self._seasons = _AxisLabels()
+        self._agents = _AxisLabels()
+        self._gadgets = _AxisLabels()
+        self._seasons.add("lifetime")
+        self._general = np.zeros((self._player_capacity, 1, len(general_stat_names), 3), dtype=_stat_dtype)
+        self._agent_picks = np.zeros((self._player_capacity, 1, 0, 3), dtype=_stat_dtype)
+        self._agent_wins = np.zeros((self._player_capacity, 1, 0, 3), dtype=_stat_dtype)
+        self._agent_playtime = np.zeros((self._player_capacity, 1, 0), dtype=_stat_dtype)
+        self._gadget_picks = np.zeros((self._player_capacity, 1, 0, 3), dtype=_stat_dtype)
+
+    def _resize(self) -> None:
+        '''Grows the arrays to fit every known label. The player axis doubles so repeated ingests don't copy the arrays every time.'''
+        while self._player_capacity < len(self._players):
+            self._player_capacity *= 2
+        players, seasons, agents, gadgets = self._player_capacity, len(self._seasons), len(self._agents), len(self._gadgets)
+        self._general = _grow(self._general, (players, seasons, len(general_stat_names), 3))
+        self._agent_picks = _grow(self._agent_picks, (players, seasons, agents, 3))
+        self._agent_wins = _grow(self._agent_wins, (players, seasons, agents, 3))
+        self._agent_playtime = _grow(self._agent_playtime, (players, seasons, agents))
+        self._gadget_picks = _grow(self._gadget_picks, (players, seasons, gadgets, 3))
+
+    def _register_labels(self, user: SweetUser) -> None:
+        self._players.add(user.sweet_id)
+        for season in user.general_stats:
+            self._seasons.add(_season_label(season))
+        for agent_name, agent_stats in user.agent_stats.items():
+            self._agents.add(agent_name)
+            for season in (agent_stats.seasonal_stats or {}):
+                self._seasons.add(_season_label(season))
+        for gadget_name, gadget_stats in user.gadget_stats.items():
+            self._gadgets.add(gadget_name)
+            for season in (gadget_stats.seasonal_stats or {}):
+                self._seasons.add(_season_label(season))
+
+    def _write_user(self, user: SweetUser) -> None:
+        player = self._players.positions[user.sweet_id]
+        for array in (self._general, self._agent_picks, self._agent_wins, self._agent_playtime, self._gadget_picks):
+            array[player] = 0
+        seasons = self._seasons.positions
+        for season, general_stats in user.general_stats.items():
+            self._general[player, seasons[_season_label(season)]] = [_counts(getattr(general_stats, name)) for name in general_stat_names]
+        for agent_name, agent_stats in user.agent_stats.items():
+            agent = self._agents.positions[agent_name]
+            timelines = dict(agent_stats.seasonal_stats or {})
+            timelines["lifetime"] = agent_stats.lifetime_stats
+            for season, timeline in timelines.items():
+                if timeline is None:
+                    continue
+                season_position = seasons[_season_label(season)]
+                self._agent_picks[player, season_position, agent] = _counts(timeline.pick_count)
+                self._agent_wins[player, season_position, agent] = _counts(timeline.win_count)
+                self._agent_playtime[player, season_position, agent] = timeline.playtime_seconds or 0
+        for gadget_name, gadget_stats in user.gadget_stats.items():
+            gadget = self._gadgets.positions[gadget_name]
+            timelines = dict(gadget_stats.seasonal_stats or {})
+            timelines["lifetime"] = gadget_stats.lifetime_stats
+            for season, timeline in timelines.items():
+                if timeline is None:
+                    continue
+                self._gadget_picks[player, seasons[_season_label(season)], gadget] = _counts(timeline.pick_count)
+
+    def ingest_users(self, users: Iterable[SweetUser]) -> None:
+        '''Adds users to the store, replacing the stats of any that were already in it.'''
+        with self._lock:
+            for user in users:
+                self._register_labels(user)
+                self._resize()
+                self._write_user(user)
+
+    def ingest_user(self, user: SweetUser) -> None:
+        self.ingest_users([user])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _select(self, season: Union[int, str, None], sweet_ids: Optional[Iterable[str]]) -> Optional[Tuple[Union[slice, np.ndarray], int]]:
+        '''Gets the player rows and season column to aggregate over, or `None` if nothing matches.'''
+        season_position = self._seasons.positions.get(_season_label(season))
+        if season_position is None or len(self._players) == 0:
+            return None
+        if sweet_ids is None:
+            return slice(0, len(self._players)), season_position # A slice is a view, so aggregating every player copies nothing.
+        players = np.fromiter((self._players.positions[sweet_id] for sweet_id in set(sweet_ids) if sweet_id in self._players.positions), dtype=np.intp)
+        if len(players) == 0:
+            return None
+        return players, season_position
+
+    @staticmethod
+    def _by_gamemode(array: np.ndarray, gamemode: Union[GameMode, None]) -> np.ndarray:
+        '''Picks one gamemode from the last axis, or sums all of them.'''
+        return array.sum(axis=-1) if gamemode is None else array[..., _gamemode_positions[gamemode]]
+
+    def _pick_totals(self, array: np.ndarray, labels: _AxisLabels, season: Union[int, str, None], gamemode: Union[GameMode, None], sweet_ids: Optional[Iterable[str]]) -> List[Tuple[str, int]]:
+        with self._lock:
+            selection = self._select(season, sweet_ids)
+            if selection is None:
+                return []
+            players, season_position = selection
+            totals = self._by_gamemode(array[players, season_position], gamemode).sum(axis=0)
+            names = list(labels.labels)
+        order = np.argsort(totals, kind="stable")[::-1]
+        return [(names[i], int(totals[i])) for i in order if totals[i] > 0]
+
+    def get_agent_pick_counts(self, season: Union[int, None] = None, gamemode: Union[GameMode, None] = None, sweet_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, int]]:
+        '''Gets how often each agent was picked across players, most picked first. Agents that were never picked are left out.
+        ### Parameters
+        * `season` - `Union[int, None]` - Default `None` - The season to count. If no season is supplied, uses lifetime stats.
+        * `gamemode` - `Union[GameMode, None]` - Default `None` - The game mode to count. If no game mode is supplied, counts all of them.
+        * `sweet_ids` - `Optional[Iterable[str]]` - Default `None` - The players to count, e.g. the registered scrim players. If none are supplied, counts every player in the store.'''
+        return self._pick_totals(self._agent_picks, self._agents, season, gamemode, sweet_ids)
+
+    def get_most_picked_agent(self, season: Union[int, None] = None, gamemode: Union[GameMode, None] = None, sweet_ids: Optional[Iterable[str]] = None) -> Union[Tuple[str, int], None]:
+        '''Gets the most picked agent and its pick count, or `None` if no agent was picked. Takes the same parameters as `get_agent_pick_counts`.'''
+        pick_counts = self.get_agent_pick_counts(season, gamemode, sweet_ids)
+        return pick_counts[0] if len(pick_counts) > 0 else None
+
+    def get_gadget_pick_counts(self, season: Union[int, None] = None, gamemode: Union[GameMode, None] = None, sweet_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, int]]:
+        '''Gets how often each gadget was picked across players, most picked first. Takes the same parameters as `get_agent_pick_counts`.'''
+        return self._pick_totals(self._gadget_picks, self._gadgets, season, gamemode, sweet_ids)
+
+    def get_average_agent_win_rates(self, season: Union[int, None] = None, gamemode: Union[GameMode, None] = None, sweet_ids: Optional[Iterable[str]] = None, min_picks: int = 1) -> Dict[str, float]:
+        '''Gets the average of each player's win rate on each agent. Players count towards an agent once they have picked it `min_picks` times.
+        Agents nobody has picked enough are left out. Takes the same other parameters as `get_agent_pick_counts`.'''
+        with self._lock:
+            selection = self._select(season, sweet_ids)
+            if selection is None:
+                return {}
+            players, season_position = selection
+            picks = self._by_gamemode(self._agent_picks[players, season_position], gamemode)
+            wins = self._by_gamemode(self._agent_wins[players, season_position], gamemode)
+            names = list(self._agents.labels)
+        counted = picks >= max(min_picks, 1)
+        win_rates = np.divide(wins, picks, out=np.zeros(picks.shape, dtype=np.float64), where=counted)
+        player_counts = counted.sum(axis=0)
+        rate_sums = win_rates.sum(axis=0)
+        return {names[i]: float(rate_sums[i] / player_counts[i]) for i in range(len(names)) if player_counts[i] > 0}
+
+    def get_general_stat_totals(self, season: Union[int, None] = None, gamemode: Union[GameMode, None] = None, sweet_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        '''Gets the totals of the general account stats (eliminations, deaths, matches played and won, time played) across players. Takes the same parameters as `get_agent_pick_counts`.'''
+        with self._lock:
+            selection = self._select(season, sweet_ids)
+            if selection is None:
+                return {name: 0 for name in general_stat_names}
+            players, season_position = selection
+            totals = self._by_gamemode(self._general[players, season_position], gamemode).sum(axis=0)
+        return {name: int(total) for name, total in zip(general_stat_names, totals)}
+
+    def get_stats(self) -> Dict[str, int]:
+        '''Returns the number of players, seasons, agents and gadgets in the store, and the bytes taken by its arrays.'''
+        with self._lock:
+            return {"players": len(self._players),
+                    "seasons": len(self._seasons),
+                    "agents": len(self._agents),
+                    "gadgets": len(self._gadgets),
+                    "bytes": sum(array.nbytes for array in (self._general, self._agent_picks, self._agent_wins, self._agent_playtime, self._gadget_picks))}
+
+scrim_stats_store: ScrimStatsStore = ScrimStatsStore()
@@ -1,51 +1,47 @@
 from typing import Union, List
-import discord
+import discord, time
 from discord.ext import commands
-from lib.scrim_sqlite import ScrimUserData
+from lib.scrim_sqlite_async import AsyncScrimUserData
+from lib.scrim_logging import scrim_logger
 
 class ScrimUserUpdateListener(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
 
+    async def sync_guild_members(self, guild: discord.Guild) -> None:
+        '''Adds every missing member of a guild to the database and updates changed usernames in one bulk pass.'''
+        start_time = time.perf_counter()
+        members = [(member.id, member.name) for member in guild.members if not member.bot]
+        inserted, renamed = await AsyncScrimUserData.sync_discord_members(members)
+        scrim_logger.info(f"Synced {len(members)} members of guild {guild.name} ({guild.id}) in {time.perf_counter() - start_time:.2f}s: {inserted} added, {renamed} renamed.")
+
     @commands.Cog.listener()
     async def on_ready(self):
         for guild in self.bot.guilds:
-            for member in guild.members:
-                if member.bot:
-                    continue
-                if ScrimUserData.get_user_by_discord_id(member) == None:
-                    ScrimUserData.insert_user_from_discord(member)
-                ScrimUserData.update_username_by_discord_id(member, member.name)
+            await self.sync_guild_members(guild)
     
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
-        for member in guild.members:
-            if member.bot:
-                continue
-            if ScrimUserData.get_user_by_discord_id(member) == None:
-                ScrimUserData.insert_user_from_discord(member)
-            ScrimUserData.update_username_by_discord_id(member, member.name)
+        await self.sync_guild_members(guild)
     
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         if member.bot:
             return
-        if ScrimUserData.get_user_by_discord_id(member) == None:
-            ScrimUserData.insert_user_from_discord(member)
-        ScrimUserData.update_username_by_discord_id(member, member.name)
+        await AsyncScrimUserData.sync_discord_members([(member.id, member.name)])
 
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member):
         if before.bot:
             return
         if before.name != after.name:
-            ScrimUserData.update_username_by_discord_id(after, after.name)
+            await AsyncScrimUserData.update_username_by_discord_id(after, after.name)
 
     @commands.Cog.listener()
     async def on_user_update(self, before: discord.User, after: discord.User):
         if before.bot:
             return
         if before.name != after.name:
-            ScrimUserData.update_username_by_discord_id(after, after.name)
+            await AsyncScrimUserData.update_username_by_discord_id(after, after.name)
     
     
\ No newline at end of file
@@ -0,0 +1,162 @@
+import os, sys, json, shutil, asyncio, tempfile
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+from aiohttp import web
+
+# Points the Deceive Inc API client at a local stand-in server that counts the requests it receives, then checks that concurrent identical
+# calls reach it once: get_user, search_users, and token refreshes after many requests are rejected with a 401 at the same time.
+# The access token is stored in a temporary database, so the bot's database is never opened. The Sweet user cache is kept in memory and
+# always misses, so every call has to go to the API.
+# Run from anywhere: python ocr_test/api_coalescing_test.py
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+bot_dir = os.path.join(test_dir, "..", "bot")
+sys.path.insert(0, bot_dir)
+os.chdir(bot_dir) # The bot's modules expect to run from here, like main.py does.
+
+import lib.scrim_di_api as scrim_di_api
+import lib.scrim_sqlite as scrim_sqlite
+import lib.scrim_sqlite_async as scrim_sqlite_async
+from lib.DI_API_Obj.sweet_user import SweetUser, SweetUserPartial
+
+concurrent_calls = 100
+response_delay_seconds = 0.1 # Long enough that every concurrent call arrives while the first request is still running.
+
+with open(os.path.join(test_dir, "..", "sample_api_data.json")) as f:
+    sample_profile = json.load(f)
+
+class MemoryUserCache:
+    '''Stands in for AsyncSweetUserCache. Starts empty so every call has to go to the API.'''
+    users: Dict[str, SweetUser] = {}
+
+    @staticmethod
+    def peek_user_entry(sweet_id: str) -> None:
+        return None
+
+    @staticmethod
+    async def get_user_entry(sweet_id: str) -> None:
+        return None
+
+    @staticmethod
+    async def get_user_entries(sweet_ids: List[str]) -> Dict[str, Tuple[SweetUser, datetime]]:
+        return {}
+
+    @staticmethod
+    async def get_user_partial_entries_by_name(name: str) -> List[Tuple[SweetUserPartial, datetime]]:
+        return []
+
+    @staticmethod
+    async def set_user(user: SweetUser) -> None:
+        MemoryUserCache.users[user.sweet_id] = user
+
+    @staticmethod
+    async def set_users(users: List[SweetUser]) -> None:
+        for user in users:
+            MemoryUserCache.users[user.sweet_id] = user
+
+    @staticmethod
+    async def set_user_partial(user: SweetUserPartial) -> None:
+        pass
+
+scrim_di_api.AsyncSweetUserCache = MemoryUserCache
+scrim_di_api.api_rate_limit_per_second = 100000.0 # The rate limiter is not what is being measured, and would only spread the calls out.
+scrim_di_api.api_rate_limit_burst = 100000
+
+class StandInAPI:
+    '''Serves the token, profile and search endpoints, and counts every request.'''
+    hits: Dict[str, int]
+    valid_token: Union[str, None]
+    tokens_issued: int
+
+    def __init__(self):
+        self.hits = {}
+        self.valid_token = None
+        self.tokens_issued = 0
+
+    def _count(self, endpoint: str) -> None:
+        self.hits[endpoint] = self.hits.get(endpoint, 0) + 1
+
+    async def token(self, request: web.Request) -> web.Response:
+        self._count("token")
+        await asyncio.sleep(response_delay_seconds)
+        self.tokens_issued += 1
+        self.valid_token = f"token-{self.tokens_issued}"
+        return web.json_response({"access_token": self.valid_token, "expires_in": 3600})
+
+    def _authorized(self, request: web.Request) -> bool:
+        return request.headers.get("Authorization") == f"Bearer {self.valid_token}"
+
+    async def profile(self, request: web.Request) -> web.Response:
+        self._count("profile")
+        if not self._authorized(request):
+            return web.Response(status=401, text="Unauthorized")
+        await asyncio.sleep(response_delay_seconds)
+        return web.json_response(sample_profile)
+
+    async def search(self, request: web.Request) -> web.Response:
+        self._count("search")
+        if not self._authorized(request):
+            return web.Response(status=401, text="Unauthorized")
+        await asyncio.sleep(response_delay_seconds)
+        return web.json_response([{"sweetId": "sweet-1", "displayName": request.query["query"]}])
+
+failures = []
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    print(f"{'PASS' if passed else 'FAIL'} {name}{': ' + detail if detail else ''}")
+    if not passed:
+        failures.append(name)
+
+async def main() -> None:
+    scrim_sqlite_async.start_db_executor(2)
+    api = StandInAPI()
+    app = web.Application()
+    app.router.add_post("/oauth2/token", api.token)
+    app.router.add_get("/user/{sweet_id}/profile", api.profile)
+    app.router.add_get("/search/user", api.search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    scrim_di_api.oauth_url = f"http://127.0.0.1:{port}/oauth2/token"
+    scrim_di_api.api_base_url = f"http://127.0.0.1:{port}"
+    client = scrim_di_api.DeceiveIncAPIClient("client-id", "client-secret")
+    try:
+        users = await asyncio.gather(*[client.get_user("sweet-1") for _ in range(concurrent_calls)])
+        check(f"{concurrent_calls} concurrent get_user calls make one profile request", api.hits.get("profile") == 1 and api.hits.get("token") == 1,
+              f"{api.hits.get('profile')} profile, {api.hits.get('token')} token requests")
+        check("every caller gets the user", all(user is users[0] for user in users) and users[0] is not None)
+
+        api.hits.clear()
+        results = await asyncio.gather(*[client.search_users("Agent") for _ in range(concurrent_calls)])
+        check(f"{concurrent_calls} concurrent search_users calls make one search request", api.hits.get("search") == 1, f"{api.hits.get('search')} search requests")
+        check("every caller gets the results", all(len(result) == 1 and result[0].display_name == "Agent" for result in results))
+
+        api.hits.clear()
+        await asyncio.gather(*[client.get_user(f"sweet-{i}") for i in range(20) for _ in range(5)])
+        check("concurrent calls for 20 users make one request per user", api.hits.get("profile") == 20, f"{api.hits.get('profile')} profile requests")
+
+        # Revoke the token. Every request below is rejected once, and all of them should share a single refresh.
+        api.hits.clear()
+        api.valid_token = "revoked"
+        users = await asyncio.gather(*[client.get_user(f"refresh-{i}", force=True) for i in range(concurrent_calls)], return_exceptions=True)
+        errors = [user for user in users if isinstance(user, BaseException)]
+        check(f"{concurrent_calls} requests rejected with 401 share one token refresh", api.hits.get("token") == 1, f"{api.hits.get('token')} token requests")
+        check("every request succeeds after the refresh", len(errors) == 0 and api.hits.get("profile") == 2 * concurrent_calls,
+              f"{len(errors)} errors, {api.hits.get('profile')} profile requests ({concurrent_calls} rejected, {concurrent_calls} retried)")
+        print(f"client stats: {client.get_stats()}")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+work_dir = tempfile.mkdtemp(prefix="scrim_coalescing_test_")
+try:
+    scrim_sqlite.open_scrim_db(os.path.join(work_dir, "scrims.db"))
+    asyncio.run(main())
+finally:
+    if scrim_sqlite_async.scrim_db_executor is not None:
+        scrim_sqlite_async.scrim_db_executor.shutdown()
+    scrim_sqlite.close_scrim_db()
+    shutil.rmtree(work_dir, ignore_errors=True)
+sys.exit(1 if failures else 0)
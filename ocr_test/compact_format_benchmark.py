@@ -0,0 +1,52 @@
+import os, sys, json, timeit
+
+# Compares the compact format cached Sweet users are stored in (dump_compact/from_compact) with the JSON format it replaced (dump_json/from_json)
+# on sample_api_data.json: bytes on disk, encode time and decode time. Also checks that both formats round-trip to the same dump_json output.
+# Run from anywhere: python ocr_test/compact_format_benchmark.py
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(test_dir, "..", "bot"))
+
+from lib.DI_API_Obj.sweet_user import SweetUser
+
+repeats = 200
+
+with open(os.path.join(test_dir, "..", "sample_api_data.json")) as f:
+    user = SweetUser.from_api_response("sweet-id", json.load(f))
+
+json_data = user.dump_json()
+compact_data = user.dump_compact()
+
+def comparable(dumped: str) -> dict:
+    '''dump_json stamps the time it was called, so that field is left out of comparisons.'''
+    return {key: value for key, value in json.loads(dumped).items() if key != "data_creation_time"}
+
+expected = comparable(json_data)
+
+failures = []
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    print(f"{'PASS' if passed else 'FAIL'} {name}{': ' + detail if detail else ''}")
+    if not passed:
+        failures.append(name)
+
+check("JSON round-trip gives the same dump_json output", comparable(SweetUser.from_json(json_data).dump_json()) == expected)
+check("compact round-trip gives the same dump_json output", comparable(SweetUser.from_compact(compact_data).dump_json()) == expected)
+
+def time_ms(func) -> float:
+    return min(timeit.repeat(func, number=repeats, repeat=3)) / repeats * 1000
+
+# from_compact only decodes the stat sections that are used, so it is timed both on its own and with every section read (by dumping it to JSON).
+json_bytes = len(json_data.encode("utf-8"))
+rows = [
+    ("bytes on disk", f"{json_bytes:,}", f"{len(compact_data):,}"),
+    ("encode", f"{time_ms(user.dump_json):.3f} ms", f"{time_ms(user.dump_compact):.3f} ms"),
+    ("decode", f"{time_ms(lambda: SweetUser.from_json(json_data)):.3f} ms", f"{time_ms(lambda: SweetUser.from_compact(compact_data)):.3f} ms"),
+    ("decode, every section read", f"{time_ms(lambda: SweetUser.from_json(json_data).dump_json()):.3f} ms", f"{time_ms(lambda: SweetUser.from_compact(compact_data).dump_json()):.3f} ms"),
+]
+print(f"\n{'':<28}{'JSON':>14}{'compact':>14}")
+for name, json_value, compact_value in rows:
+    print(f"{name:<28}{json_value:>14}{compact_value:>14}")
+print(f"The compact format is {json_bytes / len(compact_data):.1f}x smaller.")
+
+sys.exit(1 if failures else 0)
@@ -0,0 +1,104 @@
+import os, sys, time, uuid, random, shutil, tempfile, statistics
+from typing import Dict, List, Tuple
+
+# Times the user, partial cache and team member lookups the bot makes, on databases of 10k, 100k and 1M users, before and after the
+# lookup index migrations (schema_migrations steps 1 and 2). Each size is built in a temporary database with the bot's schema and pragmas, so the bot's own database is never opened.
+# Run from anywhere: python ocr_test/db_lookup_benchmark.py [--sizes 10000,100000,1000000]
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+bot_dir = os.path.join(test_dir, "..", "bot")
+sys.path.insert(0, bot_dir)
+os.chdir(bot_dir) # The bot's modules expect to run from here, like main.py does.
+sizes = [int(size) for size in sys.argv[sys.argv.index("--sizes") + 1].split(",")] if "--sizes" in sys.argv else [10_000, 100_000, 1_000_000]
+
+import sqlean
+import lib.scrim_sqlite as scrim_sqlite
+
+max_lookups = 1000
+max_seconds_per_query = 2.0 # Unindexed lookups on the larger databases scan the whole table, so they stop early.
+copied_tables = ["scrim_users", "player_stats", "sweet_user_partial_cache", "teams_master", "team_members", "ocr_reader_channels", "scrim_debug_channels", "scrim_run_times", "scrims"]
+
+# The same statements ScrimUserData, SweetUserCache and the team code run.
+queries: Dict[str, str] = {
+    "user by discord_id": '''SELECT scrim_users.internal_user_id, scrim_users.username, scrim_users.discord_id, scrim_users.sweet_id, scrim_users.twitch_id, player_stats.mmr, player_stats.priority
+        FROM scrim_users LEFT JOIN player_stats ON player_stats.user_id = scrim_users.internal_user_id WHERE scrim_users.discord_id = ?;''',
+    "user by sweet_id": '''SELECT scrim_users.internal_user_id, scrim_users.username, scrim_users.discord_id, scrim_users.sweet_id, scrim_users.twitch_id, player_stats.mmr, player_stats.priority
+        FROM scrim_users LEFT JOIN player_stats ON player_stats.user_id = scrim_users.internal_user_id WHERE scrim_users.sweet_id = ?;''',
+    "user by twitch_id": '''SELECT scrim_users.internal_user_id, scrim_users.username, scrim_users.discord_id, scrim_users.sweet_id, scrim_users.twitch_id, player_stats.mmr, player_stats.priority
+        FROM scrim_users LEFT JOIN player_stats ON player_stats.user_id = scrim_users.internal_user_id WHERE scrim_users.twitch_id = ?;''',
+    "insert_user_from_discord check": "SELECT * FROM scrim_users WHERE discord_id = ?;",
+    "partial cache by display_name": "SELECT sweet_id, display_name, last_updated FROM sweet_user_partial_cache WHERE display_name = ?;",
+    "teams of a user": "SELECT team_id FROM team_members WHERE user_id = ?;",
+}
+
+def read_schema(path: str) -> Dict[str, str]:
+    '''Creates the bot's database at `path` and returns the statements that create its tables, by table name.'''
+    scrim_sqlite.open_scrim_db(path)
+    with scrim_sqlite.db_pool.reader() as cur:
+        schema = {name: sql for name, sql in cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table';").fetchall()}
+    scrim_sqlite.close_scrim_db()
+    return schema
+
+def build_database(path: str, size: int, schema: Dict[str, str]) -> Tuple[sqlean.Connection, Dict[str, List]]:
+    '''Creates the bot's tables without any indexes and fills them with `size` users. Returns the connection and the keys to look up.'''
+    connection = sqlean.connect(path, isolation_level=None)
+    for pragma, value in scrim_sqlite.sqlite_pragmas.items():
+        connection.execute(f"PRAGMA {pragma} = {value};")
+    for table in copied_tables:
+        connection.execute(schema[table])
+    rng = random.Random(size)
+    users = [(str(uuid.UUID(int=rng.getrandbits(128))), f"user{i}", rng.randrange(10**17, 2**63), f"{rng.getrandbits(64):016x}", f"twitch{i}" if i % 2 == 0 else None) for i in range(size)]
+    connection.execute("BEGIN;")
+    connection.executemany("INSERT INTO scrim_users (internal_user_id, username, discord_id, sweet_id, twitch_id) VALUES (?, ?, ?, ?, ?);", users)
+    connection.executemany("INSERT INTO player_stats (user_id, mmr, priority) VALUES (?, 1000, 0);", [(user[0],) for user in users])
+    connection.executemany("INSERT INTO sweet_user_partial_cache (sweet_id, display_name, last_updated) VALUES (?, ?, '2024-01-01T00:00:00+00:00');", [(user[3], user[1]) for user in users])
+    connection.executemany("INSERT INTO team_members (team_id, user_id, is_owner) VALUES (?, ?, 0);", [(f"team{i // 4}", user[0]) for i, user in enumerate(users)])
+    connection.execute("COMMIT;")
+    sample = rng.sample(users, min(max_lookups, size))
+    keys = {
+        "user by discord_id": [user[2] for user in sample],
+        "user by sweet_id": [user[3] for user in sample],
+        "user by twitch_id": [user[4] for user in sample if user[4] is not None],
+        "insert_user_from_discord check": [user[2] for user in sample],
+        "partial cache by display_name": [user[1] for user in sample],
+        "teams of a user": [user[0] for user in sample],
+    }
+    return connection, keys
+
+def time_lookups(connection: sqlean.Connection, sql: str, keys: List) -> Tuple[float, float, int]:
+    '''Runs the query once per key. Returns the median and p95 time in microseconds and the number of lookups made.'''
+    times: List[float] = []
+    deadline = time.perf_counter() + max_seconds_per_query
+    for key in keys:
+        start = time.perf_counter()
+        connection.execute(sql, (key,)).fetchall()
+        times.append((time.perf_counter() - start) * 1e6)
+        if time.perf_counter() > deadline:
+            break
+    p95 = statistics.quantiles(times, n=20)[-1] if len(times) >= 2 else times[0]
+    return statistics.median(times), p95, len(times)
+
+work_dir = tempfile.mkdtemp(prefix="scrim_lookup_benchmark_")
+try:
+    schema = read_schema(os.path.join(work_dir, "schema.db"))
+    for size in sizes:
+        build_start = time.perf_counter()
+        connection, keys = build_database(os.path.join(work_dir, f"users_{size}.db"), size, schema)
+        print(f"\n{size:,} users (built in {time.perf_counter() - build_start:.1f}s)")
+        before = {name: time_lookups(connection, sql, keys[name]) for name, sql in queries.items()}
+        migration_start = time.perf_counter()
+        cur = connection.cursor()
+        cur.execute("BEGIN;")
+        scrim_sqlite._migration_lookup_indexes(cur)
+        scrim_sqlite._migration_unique_user_ids(cur)
+        cur.execute("COMMIT;")
+        print(f"migrations 1-2 took {time.perf_counter() - migration_start:.1f}s")
+        after = {name: time_lookups(connection, sql, keys[name]) for name, sql in queries.items()}
+        print(f"{'lookup':<32}{'before median/p95':>22}{'after median/p95':>22}{'speedup':>10}")
+        for name in queries:
+            (before_median, before_p95, before_count), (after_median, after_p95, _) = before[name], after[name]
+            print(f"{name:<32}{f'{before_median:,.0f}/{before_p95:,.0f}us':>22}{f'{after_median:,.1f}/{after_p95:,.1f}us':>22}{f'{before_median / after_median:,.0f}x':>10}"
+                  + (f"  ({before_count} lookups before)" if before_count < len(keys[name]) else ""))
+        connection.close()
+finally:
+    shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,139 @@
+import os, sys, time, uuid, random, shutil, tempfile, threading, statistics
+from contextlib import closing, contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Runs reader and writer threads against temporary databases built with the bot's schema and reports read and write throughput for:
+# * a new connection per call with SQLite's defaults, as the bot did before connections were pooled,
+# * the connection pool with the default rollback journal,
+# * the connection pool with the pragmas the bot uses (WAL and the rest of `sqlite_pragmas`).
+# Run from anywhere: python ocr_test/db_stress_benchmark.py [--seconds 10] [--readers 8] [--writers 2] [--users 10000]
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+bot_dir = os.path.join(test_dir, "..", "bot")
+sys.path.insert(0, bot_dir)
+os.chdir(bot_dir) # The bot's modules expect to run from here, like main.py does.
+
+def get_option(name: str, default: int) -> int:
+    return int(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+run_seconds = get_option("--seconds", 10)
+reader_threads = get_option("--readers", 8)
+writer_threads = get_option("--writers", 2)
+user_count = get_option("--users", 10_000)
+
+import sqlean
+import lib.scrim_sqlite as scrim_sqlite
+from lib.scrim_dbpool import ScrimConnectionPool
+
+# The statements behind ScrimUserData.get_user_by_discord_id, insert_user_from_discord and adjust_user_mmr.
+read_sql = '''SELECT scrim_users.internal_user_id, scrim_users.username, scrim_users.discord_id, scrim_users.sweet_id, scrim_users.twitch_id, player_stats.mmr, player_stats.priority
+    FROM scrim_users LEFT JOIN player_stats ON player_stats.user_id = scrim_users.internal_user_id WHERE scrim_users.discord_id = ?;'''
+
+class PerCallConnections:
+    '''Opens a new connection for every read and write, with no pragmas set.'''
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlean.Cursor]:
+        with closing(sqlean.connect(self.db_path, timeout=30)) as connection, closing(connection.cursor()) as cur:
+            yield cur
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlean.Cursor]:
+        with closing(sqlean.connect(self.db_path, timeout=30)) as connection, closing(connection.cursor()) as cur:
+            yield cur
+            connection.commit()
+
+    def close(self) -> None:
+        pass
+
+def build_database(path: str) -> List[int]:
+    '''Creates the bot's database at `path` and fills the user tables. Returns the Discord IDs of the users.'''
+    scrim_sqlite.open_scrim_db(path, journal_mode="DELETE") # Each setup picks its own journal mode, so the file is left in SQLite's default one.
+    rng = random.Random(2)
+    users = [(str(uuid.UUID(int=rng.getrandbits(128))), f"user{i}", rng.randrange(10**17, 2**63)) for i in range(user_count)]
+    with scrim_sqlite.db_pool.writer() as cur:
+        cur.executemany("INSERT INTO scrim_users (internal_user_id, username, discord_id) VALUES (?, ?, ?);", users)
+        cur.executemany("INSERT INTO player_stats (user_id, mmr, priority) VALUES (?, 1000, 0);", [(user[0],) for user in users])
+    scrim_sqlite.close_scrim_db()
+    return [user[2] for user in users]
+
+def run(connections, discord_ids: List[int]) -> Dict[str, float]:
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    read_latencies: List[float] = []
+    lock = threading.Lock()
+
+    def read_loop(seed: int) -> None:
+        rng = random.Random(seed)
+        reads, latencies = 0, []
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with connections.reader() as cur:
+                    cur.execute(read_sql, (rng.choice(discord_ids),)).fetchone()
+                reads += 1
+                latencies.append(time.perf_counter() - start)
+            except sqlean.Error:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["reads"] += reads
+            read_latencies.extend(latencies)
+
+    def write_loop(seed: int) -> None:
+        rng = random.Random(seed)
+        writes = 0
+        while not stop.is_set():
+            try:
+                with connections.writer() as cur:
+                    if rng.random() < 0.5: # A new user joining, as insert_user_from_discord does.
+                        discord_id = rng.randrange(10**17, 2**63)
+                        if cur.execute("SELECT * FROM scrim_users WHERE discord_id = ?;", (discord_id,)).fetchone() is None:
+                            internal_id = str(uuid.UUID(int=rng.getrandbits(128)))
+                            cur.execute("INSERT OR IGNORE INTO scrim_users (internal_user_id, username, discord_id) VALUES (?, ?, ?);", (internal_id, "new user", discord_id))
+                            cur.execute("INSERT INTO player_stats (user_id, mmr, priority) VALUES (?, 1000, 0);", (internal_id,))
+                    else: # An MMR change after a match.
+                        row = cur.execute("SELECT internal_user_id FROM scrim_users WHERE discord_id = ?;", (rng.choice(discord_ids),)).fetchone()
+                        cur.execute("UPDATE player_stats SET mmr = mmr + ? WHERE user_id = ?;", (rng.randint(-20, 20), row[0]))
+                writes += 1
+            except sqlean.Error:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["writes"] += writes
+
+    threads = [threading.Thread(target=read_loop, args=(i,)) for i in range(reader_threads)] + [threading.Thread(target=write_loop, args=(1000 + i,)) for i in range(writer_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(run_seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {"reads_per_second": counts["reads"] / elapsed, "writes_per_second": counts["writes"] / elapsed, "errors": counts["errors"],
+            "read_p95_ms": statistics.quantiles(read_latencies, n=20)[-1] * 1000 if len(read_latencies) >= 2 else float("nan")}
+
+setups: List[Tuple[str, Callable[[str], object]]] = [
+    ("new connection per call", PerCallConnections),
+    ("pool, rollback journal", lambda path: ScrimConnectionPool(path, max_readers=reader_threads)),
+    ("pool, bot pragmas (WAL)", lambda path: ScrimConnectionPool(path, max_readers=reader_threads, pragmas=scrim_sqlite.sqlite_pragmas)),
+]
+
+print(f"{reader_threads} reader threads, {writer_threads} writer threads, {user_count:,} users, {run_seconds}s per setup")
+print(f"{'setup':<28}{'reads/s':>10}{'writes/s':>10}{'read p95':>11}{'errors':>8}")
+work_dir = tempfile.mkdtemp(prefix="scrim_stress_benchmark_")
+try:
+    for index, (name, create) in enumerate(setups):
+        db_path = os.path.join(work_dir, f"{index}.db")
+        discord_ids = build_database(db_path)
+        connections = create(db_path)
+        try:
+            result = run(connections, discord_ids)
+        finally:
+            connections.close()
+        print(f"{name:<28}{result['reads_per_second']:>10,.0f}{result['writes_per_second']:>10,.0f}{result['read_p95_ms']:>9.2f}ms{result['errors']:>8}")
+finally:
+    shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,144 @@
+import os, sys, time, random, threading, statistics
+
+# Pushes synthetic tasks through the OCR task scheduler and checks that it stays fair, bounded and accurate about queue positions.
+# No OCR runs and no bot is started. Run from anywhere: python ocr_test/queue_load_test.py
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(test_dir, "..", "bot"))
+
+from lib.scrim_ocrqueue import OCRTaskScheduler, OCRQueueFullError
+
+failures = []
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    print(f"{'PASS' if passed else 'FAIL'} {name}{': ' + detail if detail else ''}")
+    if not passed:
+        failures.append(name)
+
+def drain(scheduler: OCRTaskScheduler) -> list:
+    tasks = []
+    while scheduler.qsize() > 0:
+        tasks.append(scheduler.get())
+    return tasks
+
+# One guild floods the queue, then two others post a few screenshots each.
+scheduler = OCRTaskScheduler(max_size=50, max_per_guild=20)
+turned_away = 0
+for i in range(200):
+    try:
+        scheduler.put(("flood", i), guild_id=1, channel_id=10)
+    except OCRQueueFullError as e:
+        turned_away += 1
+        guild_full = e.guild_full
+check("flooding guild is capped at its share", turned_away == 180 and guild_full, f"{200 - turned_away} queued, {turned_away} turned away")
+positions = {}
+for guild_id in (2, 3):
+    for i in range(5):
+        positions[(guild_id, i)] = scheduler.put((guild_id, i), guild_id=guild_id, channel_id=guild_id * 10)
+order = drain(scheduler)
+served_at = {task: index + 1 for index, task in enumerate(order)}
+worst = max(served_at[(guild_id, i)] - 3 * (i + 1) for guild_id in (2, 3) for i in range(5))
+check("other guilds are served within one task per round of the flood", worst <= 0,
+      f"guild 2 served at {[served_at[(2, i)] for i in range(5)]}, guild 3 at {[served_at[(3, i)] for i in range(5)]} (first come, first served: 21-30)")
+check("reported positions match the order served", all(served_at[(3, i)] == positions[(3, i)] for i in range(5))) # Guild 2's were reported before guild 3 joined.
+check("a flooding guild's own tasks stay in order", [task[1] for task in order if task[0] == "flood"] == list(range(20)))
+
+# Within one guild, a busy channel doesn't hold up a quiet one.
+scheduler = OCRTaskScheduler(max_size=50, max_per_guild=50)
+for i in range(15):
+    scheduler.put(("busy", i), guild_id=4, channel_id=40)
+for i in range(3):
+    scheduler.put(("quiet", i), guild_id=4, channel_id=41)
+order = drain(scheduler)
+quiet_served_at = [index + 1 for index, task in enumerate(order) if task[0] == "quiet"]
+check("channels within a guild take turns", quiet_served_at == [2, 4, 6], f"quiet channel served at {quiet_served_at}")
+
+# Guilds with an active scrim go first, and take turns among themselves.
+scheduler = OCRTaskScheduler(max_size=50, max_per_guild=20)
+for guild_id in (5, 6, 7):
+    for i in range(4):
+        scheduler.put(("normal", guild_id, i), guild_id=guild_id, channel_id=guild_id * 10)
+priority_positions = [scheduler.put(("scrim", guild_id, i), guild_id=guild_id, channel_id=guild_id * 10, priority=True) for guild_id in (8, 9) for i in range(3)]
+order = drain(scheduler)
+check("active scrim guilds are read first", [task[0] for task in order[:6]] == ["scrim"] * 6 and max(priority_positions) <= 6,
+      f"first six: {[task[1] for task in order[:6]]}")
+check("active scrim guilds take turns", [task[1] for task in order[:6]] == [8, 9, 8, 9, 8, 9])
+
+# Positions stay accurate across random mixes of guilds, channels and priorities.
+rng = random.Random(24)
+mismatches = 0
+for trial in range(500):
+    scheduler = OCRTaskScheduler(max_size=200, max_per_guild=200)
+    for i in range(rng.randint(0, 60)):
+        scheduler.put(("filler", i), rng.randint(1, 6), rng.randint(1, 3), rng.random() < 0.2)
+    for i in range(min(rng.randint(0, 20), scheduler.qsize())): # Leave the round-robin part way through.
+        scheduler.get()
+    guild_id, channel_id, priority = rng.randint(1, 7), rng.randint(1, 4), rng.random() < 0.2
+    position = scheduler.put("probe", guild_id, channel_id, priority)
+    if drain(scheduler).index("probe") + 1 != position:
+        mismatches += 1
+check("positions are exact when nothing else is added", mismatches == 0, f"{mismatches}/500 wrong")
+
+# Concurrent load: producers for one heavy and several light guilds, consumers standing in for workers.
+scheduler = OCRTaskScheduler(max_size=50, max_per_guild=20)
+accepted, rejected, consumed, max_depth = {}, {}, [], 0
+lock = threading.Lock()
+stop = threading.Event()
+
+def produce(guild_id: int, count: int, delay_seconds: float) -> None:
+    for i in range(count):
+        try:
+            scheduler.put((guild_id, i, time.perf_counter()), guild_id, guild_id * 10 + i % 2)
+            with lock:
+                accepted[guild_id] = accepted.get(guild_id, 0) + 1
+        except OCRQueueFullError:
+            with lock:
+                rejected[guild_id] = rejected.get(guild_id, 0) + 1
+        time.sleep(delay_seconds)
+
+def consume() -> None:
+    while True:
+        task = scheduler.get()
+        if task is None:
+            return
+        waited = time.perf_counter() - task[2]
+        with lock:
+            consumed.append((task[0], task[1], waited))
+        time.sleep(0.001) # Stands in for OCR.
+
+def watch() -> None:
+    global max_depth
+    while not stop.is_set():
+        max_depth = max(max_depth, scheduler.qsize())
+        time.sleep(0.0005)
+
+producers = [threading.Thread(target=produce, args=(1, 4000, 0.0))] + [threading.Thread(target=produce, args=(guild_id, 200, 0.002)) for guild_id in (2, 3, 4, 5)]
+consumers = [threading.Thread(target=consume) for _ in range(3)]
+watcher = threading.Thread(target=watch)
+start = time.perf_counter()
+for thread in consumers + producers + [watcher]:
+    thread.start()
+for thread in producers:
+    thread.join()
+while scheduler.qsize() > 0:
+    time.sleep(0.01)
+time.sleep(0.05) # Let the consumers finish what they took.
+scheduler.close()
+for thread in consumers:
+    thread.join()
+stop.set()
+watcher.join()
+elapsed = time.perf_counter() - start
+check("no task is lost or read twice", len(consumed) == sum(accepted.values()) and len(set((guild_id, i) for guild_id, i, _ in consumed)) == len(consumed),
+      f"{sum(accepted.values())} accepted, {len(consumed)} consumed")
+check("the queue never grows past its limit", max_depth <= 50, f"deepest {max_depth}")
+waits = {guild_id: [waited for other_id, _, waited in consumed if other_id == guild_id] for guild_id in accepted}
+light_p95 = max(statistics.quantiles(waits[guild_id], n=20)[-1] for guild_id in (2, 3, 4, 5))
+heavy_p95 = statistics.quantiles(waits[1], n=20)[-1]
+check("light guilds wait less than the flooding guild", light_p95 < heavy_p95, f"p95 wait {light_p95 * 1000:.1f}ms light vs {heavy_p95 * 1000:.1f}ms heavy")
+light_rejected = sum(rejected.get(guild_id, 0) for guild_id in (2, 3, 4, 5))
+check("backpressure lands on the flooding guild", light_rejected == 0 and rejected.get(1, 0) > 0,
+      f"flooding guild: {accepted.get(1, 0)} queued, {rejected.get(1, 0)} turned away; light guilds: {light_rejected} turned away")
+print(f"{len(consumed) + sum(rejected.values())} puts and {len(consumed)} gets in {elapsed:.2f}s")
+
+sys.exit(1 if failures else 0)
@@ -0,0 +1,47 @@
+import os, sys, time, statistics
+
+# Compares OCR time and parsed fields on whole screenshots against screenshots cropped to the mission report panel.
+# Run from anywhere: python ocr_test/roi_benchmark.py [--paddle]
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+bot_dir = os.path.join(test_dir, "..", "bot")
+sys.path.insert(0, bot_dir)
+os.chdir(bot_dir) # The bot's modules expect to run from here, like main.py does.
+use_paddle = "--paddle" in sys.argv
+sys.argv = sys.argv[:1] # The bot's argument parser runs on import.
+
+import lib.scrim_ocrworker as scrim_ocrworker
+import lib.scrim_ocrmodel as scrim_ocrmodel
+import lib.scrim_imageprocessing as scrim_imageprocessing
+from lib.scrim_reader import OCRReaderProcess
+
+# What a person reads off each test screenshot.
+expected = {
+    "missionreport.png": {"eliminations": 0, "vault_terminals_disabled": 0, "vault_entered": True, "last_spy_standing": False, "extracted": False, "allies_revived": 0},
+}
+repeats = 3
+
+reader = scrim_ocrmodel.load_reader(use_paddle, False)
+parser = OCRReaderProcess.__new__(OCRReaderProcess) # Only its parsing methods are used, no worker process is started.
+crop_array_to_mission_report = scrim_imageprocessing.crop_array_to_mission_report
+
+for mode in ("full", "cropped"):
+    scrim_imageprocessing.crop_array_to_mission_report = crop_array_to_mission_report if mode == "cropped" else (lambda image: image)
+    prepare_times, ocr_times, correct, total = [], [], 0, 0
+    for file_name, fields in expected.items():
+        with open(os.path.join(test_dir, file_name), "rb") as f:
+            image_bytes = f.read()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            image = scrim_ocrworker.prepare_image(image_bytes)
+            prepared = time.perf_counter()
+            text = scrim_ocrworker.read_text_batch(reader, use_paddle, [image])[0]
+            prepare_times.append(prepared - start)
+            ocr_times.append(time.perf_counter() - prepared)
+        score = parser._calculate_score_from_text(text)
+        wrong = {name: getattr(score, name) for name, value in fields.items() if getattr(score, name) != value}
+        correct += len(fields) - len(wrong)
+        total += len(fields)
+        print(f"{mode:8} {file_name}: {image.shape[1]}x{image.shape[0]}, {len(fields) - len(wrong)}/{len(fields)} fields correct {wrong if wrong else ''}")
+    print(f"{mode:8} prepare {statistics.median(prepare_times) * 1000:.0f}ms, OCR {statistics.median(ocr_times) * 1000:.0f}ms (medians), {correct}/{total} fields correct\n")
+scrim_imageprocessing.crop_array_to_mission_report = crop_array_to_mission_report
@@ -0,0 +1,134 @@
+import os, sys, copy, json, math, random, itertools
+from typing import Dict, List, Optional, Union
+
+# Ingests variants of sample_api_data.json into the columnar stats store and checks its aggregations against plain Python sums over the same
+# profiles, for every season, game mode, player selection and min_picks combination. Some profiles are round-tripped through JSON, which
+# turns their season keys into digit strings, and one player is ingested twice to check that the second copy replaces the first.
+# Run from anywhere: python ocr_test/stats_store_test.py
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(test_dir, "..", "bot"))
+
+from lib.DI_API_Obj.sweet_user import SweetUser
+from lib.DI_API_Obj.gamemode import GameMode
+from lib.scrim_statsstore import ScrimStatsStore, general_stat_names
+
+player_count = 12
+
+with open(os.path.join(test_dir, "..", "sample_api_data.json")) as f:
+    sample = json.load(f)
+
+def make_variant(rng: random.Random) -> dict:
+    '''Copies the sample with every count redrawn below its original value and some agents removed from seasons, so players differ and some never
+    pick an agent in a season. Lifetime stats keep every agent, as dump_json needs them for any agent with seasonal stats.'''
+    variant = copy.deepcopy(sample)
+    for season, season_stats in variant["stats"].items():
+        for key, value in season_stats.items():
+            if isinstance(value, dict):
+                for name in list(value):
+                    if season != "lifetime" and rng.random() < 0.2:
+                        del value[name]
+                    elif isinstance(value[name], int):
+                        value[name] = rng.randint(0, value[name])
+            elif isinstance(value, int):
+                season_stats[key] = rng.randint(0, value)
+    return variant
+
+rng = random.Random(15)
+users: Dict[str, SweetUser] = {}
+store = ScrimStatsStore(initial_player_capacity=4) # Small, so ingesting grows the arrays.
+for i in range(player_count):
+    user = SweetUser.from_api_response(f"sweet-{i}", make_variant(rng))
+    if i % 3 == 0:
+        user = SweetUser.from_json(user.dump_json())
+    users[user.sweet_id] = user
+    store.ingest_user(user)
+replacement = SweetUser.from_api_response("sweet-0", make_variant(rng))
+users["sweet-0"] = replacement
+store.ingest_users([replacement])
+
+### PLAIN PYTHON REFERENCE ###
+
+def season_key(season) -> Union[int, str]:
+    return int(season) if isinstance(season, str) and season.isdigit() else season
+
+def by_season(timelines: Optional[dict]) -> dict:
+    return {season_key(season): value for season, value in (timelines or {}).items()}
+
+def count(counter, gamemode: Optional[GameMode]) -> int:
+    if counter is None:
+        return 0
+    values = {GameMode.SOLO: counter.solo, GameMode.DUO: counter.duo, GameMode.TRIO: counter.trio}
+    if gamemode is not None:
+        return values[gamemode] or 0
+    return sum(value or 0 for value in values.values())
+
+def agent_timeline(agent_stats, season: Optional[int]):
+    return agent_stats.lifetime_stats if season is None else by_season(agent_stats.seasonal_stats).get(season)
+
+def selected_users(sweet_ids: Optional[List[str]]) -> List[SweetUser]:
+    return list(users.values()) if sweet_ids is None else [users[sweet_id] for sweet_id in set(sweet_ids) if sweet_id in users]
+
+def reference_pick_counts(season, gamemode, sweet_ids) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for user in selected_users(sweet_ids):
+        for agent_name, agent_stats in user.agent_stats.items():
+            timeline = agent_timeline(agent_stats, season)
+            if timeline is not None:
+                totals[agent_name] = totals.get(agent_name, 0) + count(timeline.pick_count, gamemode)
+    return {name: total for name, total in totals.items() if total > 0}
+
+def reference_win_rates(season, gamemode, sweet_ids, min_picks: int) -> Dict[str, float]:
+    rates: Dict[str, List[float]] = {}
+    for user in selected_users(sweet_ids):
+        for agent_name, agent_stats in user.agent_stats.items():
+            timeline = agent_timeline(agent_stats, season)
+            if timeline is None:
+                continue
+            picks, wins = count(timeline.pick_count, gamemode), count(timeline.win_count, gamemode)
+            if picks >= max(min_picks, 1):
+                rates.setdefault(agent_name, []).append(wins / picks)
+    return {name: sum(values) / len(values) for name, values in rates.items()}
+
+def reference_general_totals(season, gamemode, sweet_ids) -> Dict[str, int]:
+    totals = {name: 0 for name in general_stat_names}
+    for user in selected_users(sweet_ids):
+        general_stats = by_season(user.general_stats).get("lifetime" if season is None else season)
+        if general_stats is None:
+            continue
+        for name in general_stat_names:
+            totals[name] += count(getattr(general_stats, name), gamemode)
+    return totals
+
+### CHECKS ###
+
+failures = []
+
+def check(name: str, passed: bool, detail: str = "") -> None:
+    if not passed:
+        print(f"FAIL {name}{': ' + detail if detail else ''}")
+        failures.append(name)
+
+seasons = [None, 1, 2, 3, 4, 99] # 99 is a season nobody has played.
+gamemodes = [None, GameMode.SOLO, GameMode.DUO, GameMode.TRIO]
+selections = [None, ["sweet-0", "sweet-3", "sweet-4"], ["sweet-5", "not-in-store"], ["not-in-store"]]
+cases = 0
+for season, gamemode, sweet_ids in itertools.product(seasons, gamemodes, selections):
+    label = f"season {season}, gamemode {gamemode}, players {sweet_ids}"
+    pick_counts = store.get_agent_pick_counts(season, gamemode, sweet_ids)
+    check(f"get_agent_pick_counts ({label})", dict(pick_counts) == reference_pick_counts(season, gamemode, sweet_ids), f"{dict(pick_counts)} != {reference_pick_counts(season, gamemode, sweet_ids)}")
+    check(f"get_agent_pick_counts is sorted ({label})", [total for _, total in pick_counts] == sorted((total for _, total in pick_counts), reverse=True))
+    general_totals = store.get_general_stat_totals(season, gamemode, sweet_ids)
+    check(f"get_general_stat_totals ({label})", general_totals == reference_general_totals(season, gamemode, sweet_ids), f"{general_totals} != {reference_general_totals(season, gamemode, sweet_ids)}")
+    for min_picks in (0, 1, 5, 50):
+        win_rates = store.get_average_agent_win_rates(season, gamemode, sweet_ids, min_picks)
+        expected = reference_win_rates(season, gamemode, sweet_ids, min_picks)
+        check(f"get_average_agent_win_rates ({label}, min_picks {min_picks})",
+              win_rates.keys() == expected.keys() and all(math.isclose(win_rates[name], expected[name], rel_tol=1e-12) for name in expected), f"{win_rates} != {expected}")
+    cases += 1
+
+check("some seasons had picks to compare", any(len(reference_pick_counts(season, None, None)) > 0 for season in seasons[1:-1]))
+check("min_picks 50 leaves some agents out", len(reference_win_rates(None, None, None, 50)) < len(reference_win_rates(None, None, None, 1)))
+print(f"{'PASS' if len(failures) == 0 else 'FAIL'} {cases} season, game mode and player combinations match the plain Python sums ({len(failures)} failures)")
+print(f"store: {store.get_stats()}")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,65 @@
+import os, sys, io, gc, json, shutil, tarfile, tempfile, subprocess, tracemalloc
+
+# Measures the memory each cached Sweet user takes with tracemalloc, before and after the stat models were given __slots__. The models from before
+# are read from git history, so run this inside the repository. Each version is measured in its own process, since both use the same module names.
+# Run from anywhere: python ocr_test/sweet_user_memory_benchmark.py [--profiles N]
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.join(test_dir, "..")
+profile_count = int(sys.argv[sys.argv.index("--profiles") + 1]) if "--profiles" in sys.argv else 50
+
+def measure(bot_dir: str) -> dict:
+    '''Returns the bytes each profile takes, with the models found under `bot_dir`. Runs in the child process.'''
+    sys.path.insert(0, bot_dir)
+    from lib.DI_API_Obj.sweet_user import SweetUser
+    with open(os.path.join(repo_dir, "sample_api_data.json")) as f:
+        response = json.load(f)
+    compact_data = SweetUser.from_api_response("sweet-id", response).dump_compact()
+
+    def per_profile(build) -> float:
+        gc.collect()
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        profiles = [build(i) for i in range(profile_count)]
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        del profiles
+        return used / profile_count
+
+    def from_cache(i: int):
+        user = SweetUser.from_compact(compact_data)
+        user.dump_json() # Reads every section, so nothing is left packed.
+        return user
+
+    return {
+        "parsed from the API response": per_profile(lambda i: SweetUser.from_api_response(f"sweet-{i}", response)),
+        "read from the cache and fully accessed": per_profile(from_cache),
+    }
+
+if "--measure" in sys.argv:
+    print(json.dumps(measure(sys.argv[sys.argv.index("--measure") + 1])))
+    sys.exit(0)
+
+def run_measurement(bot_dir: str) -> dict:
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", bot_dir, "--profiles", str(profile_count)], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# The oldest [user-014] commit added the slots. Later ones are follow-up fixes, such as the one that added this benchmark.
+commits = subprocess.run(["git", "log", "--reverse", "--format=%H", "--grep=^\\[user-014\\]"], cwd=repo_dir, capture_output=True, text=True, check=True).stdout.split()
+if len(commits) == 0:
+    sys.exit("Could not find the commit that added __slots__ to the stat models.")
+work_dir = tempfile.mkdtemp(prefix="scrim_memory_benchmark_")
+try:
+    archive = subprocess.run(["git", "archive", "--format=tar", f"{commits[0]}^", "bot/lib/__init__.py", "bot/lib/DI_API_Obj"], cwd=repo_dir, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(work_dir)
+    before = run_measurement(os.path.join(work_dir, "bot"))
+    after = run_measurement(os.path.join(repo_dir, "bot"))
+finally:
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+print(f"Bytes per profile for sample_api_data.json, averaged over {profile_count} profiles")
+print(f"{'':<40}{'before':>12}{'after':>12}{'saved':>8}")
+for name in before:
+    print(f"{name:<40}{before[name]:>12,.0f}{after[name]:>12,.0f}{1 - after[name] / before[name]:>8.0%}")
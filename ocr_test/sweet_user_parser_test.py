@@ -0,0 +1,78 @@
+import os, sys, json, copy, random, subprocess, timeit, types
+from collections.abc import Mapping
+from enum import Enum
+
+# Checks that SweetUser.from_api_response builds the same user as the parser it replaced, on sample_api_data.json and on copies of it
+# with stat keys removed, then prints parses per second for both. The old parser is read from git history, so run this inside the repository.
+# Run from anywhere: python ocr_test/sweet_user_parser_test.py [--variants N]
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.join(test_dir, "..")
+sys.path.insert(0, os.path.join(repo_dir, "bot"))
+variant_count = int(sys.argv[sys.argv.index("--variants") + 1]) if "--variants" in sys.argv else 200
+
+from lib.DI_API_Obj.sweet_user import SweetUser
+
+def load_old_parser() -> types.ModuleType:
+    '''Loads sweet_user.py as it was before the single-pass parser was committed.'''
+    # The oldest [user-012] commit is the rewrite. Later ones are follow-up fixes, such as the one that added this test, and already have the new parser.
+    commits = subprocess.run(["git", "log", "--reverse", "--format=%H", "--grep=^\\[user-012\\]"], cwd=repo_dir, capture_output=True, text=True, check=True).stdout.split()
+    if len(commits) == 0:
+        sys.exit("Could not find the commit that replaced the parser.")
+    source = subprocess.run(["git", "show", f"{commits[0]}^:bot/lib/DI_API_Obj/sweet_user.py"], cwd=repo_dir, capture_output=True, text=True, check=True).stdout
+    module = types.ModuleType("sweet_user_old")
+    exec(compile(source, "sweet_user_old.py", "exec"), module.__dict__)
+    return module
+
+def normalise(value):
+    '''Turns a parsed user into plain dicts and lists so two parsers' output can be compared, whatever the classes store their fields in.'''
+    if isinstance(value, Enum):
+        return value
+    if isinstance(value, Mapping):
+        return {key: normalise(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalise(item) for item in value]
+    fields = [name for cls in type(value).__mro__ for name in getattr(cls, "__slots__", ())] + list(getattr(value, "__dict__", {}))
+    if len(fields) > 0:
+        return (type(value).__name__, {name: normalise(getattr(value, name)) for name in fields if hasattr(value, name)})
+    return value
+
+def parse(parser, response: dict):
+    try:
+        return normalise(parser.from_api_response("sweet-id", response))
+    except Exception as e:
+        return ("raised", type(e).__name__)
+
+old_parser = load_old_parser().SweetUser
+with open(os.path.join(repo_dir, "sample_api_data.json")) as f:
+    sample = json.load(f)
+
+# Copies of the sample with stat keys, and keys inside the stat blocks, removed at random.
+rng = random.Random(12)
+cases = [("sample", sample)]
+for i in range(variant_count):
+    variant = copy.deepcopy(sample)
+    for season in list(variant["stats"]):
+        for key in list(variant["stats"][season]):
+            if rng.random() < 0.15:
+                del variant["stats"][season][key]
+            elif isinstance(variant["stats"][season][key], dict):
+                for inner_key in list(variant["stats"][season][key]):
+                    if rng.random() < 0.1:
+                        del variant["stats"][season][key][inner_key]
+    cases.append((f"variant {i + 1}", variant))
+
+mismatches = 0
+for name, response in cases:
+    old, new = parse(old_parser, response), parse(SweetUser, response)
+    if old != new:
+        mismatches += 1
+        print(f"MISMATCH {name}: old {'raised ' + old[1] if old[0] == 'raised' else 'parsed'}, new {'raised ' + new[1] if new[0] == 'raised' else 'parsed'}")
+print(f"{'PASS' if mismatches == 0 else 'FAIL'} {len(cases) - mismatches}/{len(cases)} responses parse to the same user")
+
+repeats = 300
+for label, parser in (("old", old_parser), ("new", SweetUser)):
+    seconds = min(timeit.repeat(lambda: parser.from_api_response("sweet-id", sample), number=repeats, repeat=3))
+    print(f"{label} parser: {repeats / seconds:.0f} parses/s")
+
+sys.exit(1 if mismatches > 0 else 0)